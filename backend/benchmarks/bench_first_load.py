@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8
+#
+# Measures the time needed by a browser to load the client on a connection
+# with a round trip time typical of Tor when the resources /public and
+# /l10n/<lang> are requested only after the scripts of the client have been
+# loaded and executed, as it happened before the introduction of the Link
+# preload headers of index.html, and when they are requested in parallel to
+# the scripts as soon as the headers of index.html are received.
+#
+# The browser is simulated by fetching the resources from the real API in
+# waves, each one starting after the previous one is completed, using at most
+# CONNECTIONS parallel connections and adding RTT to every request.
+from __future__ import print_function
+
+import re
+import time
+
+import common
+
+from twisted.internet import defer, reactor, task
+from twisted.web import server
+from twisted.web.client import Agent, HTTPConnectionPool, readBody
+from twisted.python.threadpool import ThreadPool
+from twisted.web.http_headers import Headers
+
+from globaleaks.settings import GLSettings
+
+CONNECTIONS = 6
+RTT = 0.3
+ITERATIONS = 5
+
+
+class Browser(object):
+    def __init__(self, port):
+        self.pool = HTTPConnectionPool(reactor, persistent=True)
+        self.pool.maxPersistentPerHost = CONNECTIONS
+        self.agent = Agent(reactor, pool=self.pool)
+        self.base_url = b'http://127.0.0.1:%d/' % port
+        self.semaphore = defer.DeferredSemaphore(CONNECTIONS)
+        self.requests = 0
+        self.preloaded = {}
+
+    @defer.inlineCallbacks
+    def _fetch(self, path):
+        self.requests += 1
+        yield task.deferLater(reactor, RTT, lambda: None)
+        response = yield self.agent.request(b'GET', self.base_url + path,
+                                            Headers({b'accept-language': [b'en']}))
+        body = yield readBody(response)
+        defer.returnValue((response, body))
+
+    def fetch(self, path):
+        if path in self.preloaded:
+            return self.preloaded.pop(path)
+
+        return self.semaphore.run(self._fetch, path)
+
+    def preload(self, link):
+        for path in re.findall(r'<([^>]+)>; rel=preload', link):
+            self.preloaded[path] = self.semaphore.run(self._fetch, path)
+
+    @defer.inlineCallbacks
+    def load(self, use_preload):
+        response, body = yield self.fetch(b'')
+
+        links = response.headers.getRawHeaders(b'link', [])
+        if use_preload and links:
+            self.preload(links[0])
+
+        scripts = re.findall(br'<script src="([^"]+)"', body)
+        yield defer.gatherResults([self.fetch(path) for path in scripts])
+
+        # the client requests its localization only after having received
+        # the languages enabled and the default one from /public
+        yield self.fetch(b'public')
+        yield self.fetch(b'l10n/en')
+
+        yield self.pool.closeCachedConnections()
+
+
+@defer.inlineCallbacks
+def measure(title, port, use_preload):
+    durations = []
+    for _ in range(ITERATIONS):
+        browser = Browser(port)
+        start = time.time()
+        yield browser.load(use_preload)
+        durations.append((time.time() - start) * 1000)
+
+    print("%-40s %8d requests" % (title, browser.requests))
+    common.report(title, durations)
+
+
+@defer.inlineCallbacks
+def main():
+    # the routes of the api are defined with the paths of the environment
+    from globaleaks.rest.api import APIResourceWrapper
+
+    port = reactor.listenTCP(0, server.Site(APIResourceWrapper()), interface='127.0.0.1')
+
+    try:
+        yield measure('scripts then api', port.getHost().port, False)
+        yield measure('api preloaded with the scripts', port.getHost().port, True)
+    finally:
+        yield port.stopListening()
+        reactor.stop()
+
+
+if __name__ == '__main__':
+    common.setup_environment()
+
+    GLSettings.orm_tp = ThreadPool(1, 1)
+    GLSettings.orm_ro_tp = ThreadPool(1, GLSettings.orm_ro_threads)
+    GLSettings.orm_tp.start()
+    GLSettings.orm_ro_tp.start()
+    reactor.addSystemEventTrigger('before', 'shutdown', GLSettings.orm_tp.stop)
+    reactor.addSystemEventTrigger('before', 'shutdown', GLSettings.orm_ro_tp.stop)
+
+    reactor.callWhenRunning(main)
+    reactor.run()
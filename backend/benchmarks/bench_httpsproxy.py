@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8
+#
+# Measures the requests/s and the latency of the requests proxied by the
+# HTTPStreamFactory of the HTTPS workers to a local backend when a new
+# connection to the backend is opened for every request, as it happened
+# before the introduction of the connection pool, and when the connections
+# are kept alive in the pool; the requests sent directly to the backend are
+# measured as a reference.
+#
+# The backend runs in its own process as it happens in production while the
+# proxy listens on plain TCP so that only the cost of the proxy and not the
+# one of TLS is measured.
+from __future__ import print_function
+
+import subprocess
+import sys
+import time
+
+import common
+
+from twisted.internet import defer, reactor
+from twisted.web import resource, server
+from twisted.web.client import Agent, HTTPConnectionPool, readBody
+
+from globaleaks.utils.httpsproxy import HTTPStreamFactory
+
+CONCURRENCY = 20
+REQUESTS = 250
+
+
+class Backend(resource.Resource):
+    isLeaf = True
+
+    def render_GET(self, request):
+        return b'0123456789' * 100
+
+
+def run_backend():
+    port = reactor.listenTCP(0, server.Site(Backend()), interface='127.0.0.1')
+    print(port.getHost().port)
+    sys.stdout.flush()
+    reactor.run()
+
+
+@defer.inlineCallbacks
+def client(agent, url, latencies):
+    for _ in range(REQUESTS):
+        start = time.time()
+        response = yield agent.request(b'GET', url)
+        yield readBody(response)
+        latencies.append((time.time() - start) * 1000)
+
+
+@defer.inlineCallbacks
+def measure(title, port):
+    pool = HTTPConnectionPool(reactor, persistent=True)
+    pool.maxPersistentPerHost = CONCURRENCY
+    agent = Agent(reactor, pool=pool)
+    url = b'http://127.0.0.1:%d/' % port
+
+    latencies = []
+    start = time.time()
+    yield defer.DeferredList([client(agent, url, latencies) for _ in range(CONCURRENCY)], fireOnOneErrback=True)
+    duration = time.time() - start
+
+    yield pool.closeCachedConnections()
+
+    print("%-40s %8.1f requests/s" % (title, len(latencies) / duration))
+    common.report(title, latencies)
+
+
+@defer.inlineCallbacks
+def main(backend_port):
+    try:
+        proxy_url = 'http://127.0.0.1:%d' % backend_port
+
+        yield measure('backend', backend_port)
+
+        proxy_factory = HTTPStreamFactory(proxy_url)
+        proxy_port = reactor.listenTCP(0, proxy_factory, interface='127.0.0.1')
+
+        pooled_agent = proxy_factory.http_agent
+        proxy_factory.http_agent = Agent(reactor, connectTimeout=30)
+        yield measure('proxy (connection per request)', proxy_port.getHost().port)
+
+        proxy_factory.http_agent = pooled_agent
+        yield measure('proxy (connection pool)', proxy_port.getHost().port)
+
+        yield proxy_factory.pool.closeCachedConnections()
+    finally:
+        reactor.stop()
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] == ['backend']:
+        run_backend()
+        sys.exit(0)
+
+    backend = subprocess.Popen([sys.executable, __file__, 'backend'], stdout=subprocess.PIPE)
+
+    try:
+        reactor.callWhenRunning(main, int(backend.stdout.readline()))
+        reactor.run()
+    finally:
+        backend.terminate()
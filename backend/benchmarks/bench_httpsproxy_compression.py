@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8
+#
+# Measures the CPU time spent by the HTTPStreamFactory of the HTTPS workers
+# per GB of export downloaded by a client accepting gzip when every response
+# is compressed, as it happened before the compression was made aware of the
+# content type, and when only the responses worth compressing are; the
+# download of a JSON body is measured as a reference of the cost of the
+# compression of the textual responses.
+#
+# The backend and the proxy run each in their own process so that the CPU
+# time of the proxy, read from /proc, does not include the one of the client.
+from __future__ import print_function
+
+import os
+import subprocess
+import sys
+import time
+
+from twisted.internet import defer, reactor
+from twisted.web import resource, server
+from twisted.web.client import Agent, HTTPConnectionPool, readBody
+from twisted.web.http_headers import Headers
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from globaleaks.utils.httpsproxy import HTTPStreamFactory, HTTPStreamProxyRequest
+
+EXPORT_SIZE = 64 * 1024 * 1024
+EXPORT_DOWNLOAD_SIZE = 1024 * 1024 * 1024
+JSON_DOWNLOAD_SIZE = 128 * 1024 * 1024
+
+JSON_ITEM = b'{"id": "c5bbb2e5-7e2f-44d1-8b09-2fa4e3ba8b4e", "label": "antani", "value": 1}, '
+JSON = b'[' + JSON_ITEM * 1000 + b'{}]'
+
+CLK_TCK = os.sysconf('SC_CLK_TCK')
+
+
+class Backend(resource.Resource):
+    isLeaf = True
+
+    def __init__(self):
+        resource.Resource.__init__(self)
+        # the exports are zip archives of encrypted files and so incompressible
+        self.export = os.urandom(EXPORT_SIZE)
+
+    def render_GET(self, request):
+        if request.path == b'/json':
+            request.setHeader(b'content-type', b'application/json')
+            return JSON
+
+        request.setHeader(b'content-type', b'application/octet-stream')
+        return self.export
+
+
+def run_backend():
+    port = reactor.listenTCP(0, server.Site(Backend()), interface='127.0.0.1')
+    print(port.getHost().port)
+    sys.stdout.flush()
+    reactor.run()
+
+
+def run_proxy(backend_port, compress_all):
+    if compress_all:
+        HTTPStreamProxyRequest.should_compress = lambda self, response: self.accept_gzip
+
+    port = reactor.listenTCP(0, HTTPStreamFactory('http://127.0.0.1:%s' % backend_port), interface='127.0.0.1')
+    print(port.getHost().port)
+    sys.stdout.flush()
+    reactor.run()
+
+
+def spawn(*args):
+    p = subprocess.Popen([sys.executable, __file__] + list(args), stdout=subprocess.PIPE)
+    return p, int(p.stdout.readline())
+
+
+def get_cpu_time(pid):
+    with open('/proc/%d/stat' % pid) as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+
+    # utime and stime are the 14th and 15th fields of the stat file
+    return (int(fields[11]) + int(fields[12])) / float(CLK_TCK)
+
+
+@defer.inlineCallbacks
+def measure(title, proxy, proxy_port, path, size, download_size):
+    pool = HTTPConnectionPool(reactor, persistent=True)
+    agent = Agent(reactor, pool=pool)
+    url = b'http://127.0.0.1:%d%s' % (proxy_port, path)
+    headers = Headers({b'accept-encoding': [b'gzip']})
+
+    downloaded = 0
+    transferred = 0
+    cpu_start = get_cpu_time(proxy.pid)
+    start = time.time()
+
+    while downloaded < download_size:
+        response = yield agent.request(b'GET', url, headers)
+        body = yield readBody(response)
+        downloaded += size
+        transferred += len(body)
+
+    duration = time.time() - start
+    cpu = get_cpu_time(proxy.pid) - cpu_start
+
+    yield pool.closeCachedConnections()
+
+    print("%-40s %8.2f cpu s/GB %8.1f MB/s %6.1f%% transferred" %
+          (title, cpu * 1024 * 1024 * 1024 / downloaded,
+           downloaded / duration / 1024 / 1024,
+           transferred * 100.0 / downloaded))
+
+
+@defer.inlineCallbacks
+def main(backend_port):
+    processes = []
+
+    try:
+        for compress_all, title in [(True, 'gzip everything'), (False, 'content-type aware')]:
+            proxy, proxy_port = spawn('proxy', str(backend_port), str(int(compress_all)))
+            processes.append(proxy)
+
+            yield measure('%s (export)' % title, proxy, proxy_port, b'/export', EXPORT_SIZE, EXPORT_DOWNLOAD_SIZE)
+            yield measure('%s (json)' % title, proxy, proxy_port, b'/json', len(JSON), JSON_DOWNLOAD_SIZE)
+    finally:
+        for p in processes:
+            p.terminate()
+
+        reactor.stop()
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] == ['backend']:
+        run_backend()
+        sys.exit(0)
+
+    if sys.argv[1:2] == ['proxy']:
+        run_proxy(sys.argv[2], sys.argv[3] == '1')
+        sys.exit(0)
+
+    backend, port = spawn('backend')
+
+    try:
+        reactor.callWhenRunning(main, port)
+        reactor.run()
+    finally:
+        backend.terminate()
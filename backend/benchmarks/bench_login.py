@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8
+#
+# Measures the throughput of bursts of 50 concurrent logins when the scrypt
+# hash is computed inside the transaction, as it happened before the
+# introduction of the KDF pool, and when it is computed by a KDF pool with
+# an increasing number of processes up to the number of available cores;
+# for each burst it is reported also the latency of an unrelated transaction
+# issued while the logins are in progress.
+from __future__ import print_function
+
+import multiprocessing
+import time
+
+import common
+
+from twisted.internet import defer, reactor
+from twisted.python.threadpool import ThreadPool
+
+from globaleaks import models, security
+from globaleaks.handlers.admin.user import db_create_admin_user
+from globaleaks.handlers.authentication import login
+from globaleaks.orm import transact, transact_sync
+from globaleaks.settings import GLSettings
+from globaleaks.utils.utility import datetime_null
+from globaleaks.workers.supervisor import kdf_pool
+
+CONCURRENCY = 50
+PASSWORD = u'ACollectionOfDiplomaticHistorySince_1966_ToThe_Pr esentDay#'
+
+
+@transact_sync
+def create_user(store):
+    db_create_admin_user(store, {
+        'username': u'admin',
+        'password': PASSWORD,
+        'role': u'admin',
+        'state': u'enabled',
+        'deletable': False,
+        'name': u'Admin',
+        'public_name': u'Admin',
+        'description': u'',
+        'mail_address': u'admin@example.net',
+        'language': u'en',
+        'password_change_needed': False,
+        'pgp_key_remove': False,
+        'pgp_key_fingerprint': '',
+        'pgp_key_public': '',
+        'pgp_key_expiration': datetime_null()
+    }, u'en')
+
+
+@transact
+def login_in_transaction(store, username, password, client_using_tor):
+    user = store.find(models.User, models.User.username == username).one()
+    if not security.check_password(password, user.salt, user.password):
+        raise Exception
+
+    user.last_login = datetime_null()
+
+
+@transact
+def unrelated_transaction(store):
+    return store.find(models.Context).count()
+
+
+@defer.inlineCallbacks
+def measure(title, f):
+    start = time.time()
+    logins = defer.DeferredList([f(u'admin', PASSWORD, True) for _ in range(CONCURRENCY)],
+                                fireOnOneErrback=True)
+
+    yield unrelated_transaction()
+    unrelated_latency = (time.time() - start) * 1000
+
+    yield logins
+    duration = time.time() - start
+
+    print("%-40s %6.2fs %8.2f logins/s unrelated transaction=%8.2fms" %
+          (title, duration, CONCURRENCY / duration, unrelated_latency))
+
+
+@defer.inlineCallbacks
+def main():
+    try:
+        yield measure('hash inside the transaction', login_in_transaction)
+
+        processes = 1
+        while True:
+            yield kdf_pool.start(processes)
+            yield measure('KDF pool with %d process(es)' % processes, login)
+            yield kdf_pool.shutdown()
+
+            if processes == multiprocessing.cpu_count():
+                break
+
+            processes = min(processes * 2, multiprocessing.cpu_count())
+    finally:
+        reactor.stop()
+
+
+if __name__ == '__main__':
+    common.setup_environment()
+
+    create_user()
+
+    GLSettings.orm_tp = ThreadPool(1, 1)
+    GLSettings.orm_ro_tp = ThreadPool(1, GLSettings.orm_ro_threads)
+    GLSettings.orm_tp.start()
+    GLSettings.orm_ro_tp.start()
+    reactor.addSystemEventTrigger('before', 'shutdown', GLSettings.orm_tp.stop)
+    reactor.addSystemEventTrigger('before', 'shutdown', GLSettings.orm_ro_tp.stop)
+
+    reactor.callWhenRunning(main)
+    reactor.run()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8
+#
+# Measures the cost of routing a request across the full api_spec with the
+# linear evaluation of all the patterns and with the router of
+# APIResourceWrapper grouping the patterns by first path segment.
+from __future__ import print_function
+
+import re
+
+import common
+
+ITERATIONS = 2000
+
+UUID = '3a4e6f1b-6d2c-4e5a-9a0e-6f2c9f6a1b2c'
+
+PATHS = [
+    ('static asset', '/js/scripts.min.js'),
+    ('static index', '/index.html'),
+    ('/public', '/public'),
+    ('/l10n/<lang>', '/l10n/en'),
+    ('/s/<shorturl>', '/s/antani'),
+    ('/rtip/<id>/comments', '/rtip/' + UUID + '/comments'),
+    ('/wbtip/messages/<id>', '/wbtip/messages/' + UUID),
+    ('/admin/staticfiles/<name>', '/admin/staticfiles/antani.txt'),
+    ('/receiver/tips', '/receiver/tips')
+]
+
+
+def compile_linear_routes(api):
+    routes = []
+    for spec in api.api_spec:
+        pattern = spec[0]
+        if not pattern.startswith("^"):
+            pattern = "^" + pattern
+
+        if not pattern.endswith("$"):
+            pattern += "$"
+
+        routes.append((re.compile(pattern), spec[1]))
+
+    return routes
+
+
+def main():
+    # api_spec refers to the paths of GLSettings and is imported only once
+    # the environment is initialized
+    from globaleaks.rest import api
+
+    linear_routes = compile_linear_routes(api)
+    router = api.APIResourceWrapper()
+
+    def linear(path):
+        for regexp, handler in linear_routes:
+            match = regexp.match(path)
+            if match:
+                return match, handler
+
+    total_linear = total_router = 0
+    for title, path in PATHS:
+        before = common.timeit(lambda: linear(path), ITERATIONS) * 1000000
+        after = common.timeit(lambda: router.route(path), ITERATIONS) * 1000000
+        total_linear += before
+        total_router += after
+
+        print("%-40s linear=%8.2fus router=%8.2fus" % (title, before, after))
+
+    print("%-40s linear=%8.2fus router=%8.2fus" % ('mean', total_linear / len(PATHS), total_router / len(PATHS)))
+
+
+if __name__ == '__main__':
+    common.setup_environment()
+    main()
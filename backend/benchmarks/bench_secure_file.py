@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8
+#
+# Measures the MB/s of the encryption and of the decryption of the files
+# encrypted at rest by GLSecureTemporaryFile and GLSecureFile when the file
+# is a single AES-CTR stream, as it happened before the introduction of the
+# chunks encrypted with AES-GCM, and with the chunks; the chunks are also
+# decrypted in parallel by multiple threads and a range at the end of the
+# file is read, that in the single stream required the decryption of the
+# whole file preceding it.
+#
+# The files are written on the ramdisk in use so that the cost of the disk
+# is not measured.
+from __future__ import print_function
+
+import multiprocessing
+import os
+import time
+
+import common
+
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+from globaleaks.security import GLSecureFile, GLSecureTemporaryFile, crypto_backend
+from globaleaks.settings import GLSettings
+
+FILE_SIZE = 256 * 1024 * 1024
+BUFFER_SIZE = 1024 * 1024
+RANGE_SIZE = 1024 * 1024
+
+
+def report(title, size, duration):
+    print("%-40s %8.1f MB/s" % (title, size / duration / 1024 / 1024))
+
+
+def measure_ctr(data):
+    key, nonce = os.urandom(GLSettings.AES_key_size), os.urandom(16)
+    path = os.path.join(GLSettings.tmp_upload_path, 'ctr')
+
+    start = time.time()
+    encryptor = Cipher(algorithms.AES(key), modes.CTR(nonce), backend=crypto_backend).encryptor()
+    with open(path, 'wb') as f:
+        for i in range(0, FILE_SIZE, BUFFER_SIZE):
+            f.write(encryptor.update(data[i:i + BUFFER_SIZE]))
+    report('aes-ctr stream encrypt', FILE_SIZE, time.time() - start)
+
+    start = time.time()
+    decryptor = Cipher(algorithms.AES(key), modes.CTR(nonce), backend=crypto_backend).decryptor()
+    with open(path, 'rb') as f:
+        chunk = f.read(BUFFER_SIZE)
+        while chunk:
+            decryptor.update(chunk)
+            chunk = f.read(BUFFER_SIZE)
+    report('aes-ctr stream decrypt', FILE_SIZE, time.time() - start)
+
+    # the last MB can only be read decrypting the stream from the start
+    start = time.time()
+    decryptor = Cipher(algorithms.AES(key), modes.CTR(nonce), backend=crypto_backend).decryptor()
+    with open(path, 'rb') as f:
+        for _ in range(0, FILE_SIZE, BUFFER_SIZE):
+            decryptor.update(f.read(BUFFER_SIZE))
+    report('aes-ctr stream last range', RANGE_SIZE, time.time() - start)
+
+    os.remove(path)
+
+
+def measure_gcm(data):
+    start = time.time()
+    f = GLSecureTemporaryFile(GLSettings.tmp_upload_path)
+    f.avoid_delete()
+    for i in range(0, FILE_SIZE, BUFFER_SIZE):
+        f.write(data[i:i + BUFFER_SIZE])
+    f.close()
+    report('aes-gcm chunks encrypt', FILE_SIZE, time.time() - start)
+
+    f = GLSecureFile(f.filepath)
+
+    start = time.time()
+    while f.read(BUFFER_SIZE):
+        pass
+    report('aes-gcm chunks decrypt', FILE_SIZE, time.time() - start)
+
+    for threads in [1, max(2, multiprocessing.cpu_count())]:
+        start = time.time()
+        for i in range(0, FILE_SIZE, BUFFER_SIZE * threads):
+            f.read_at(i, BUFFER_SIZE * threads, threads)
+        report('aes-gcm chunks read_at (%d threads)' % threads, FILE_SIZE, time.time() - start)
+
+    start = time.time()
+    f.read_at(FILE_SIZE - RANGE_SIZE, RANGE_SIZE)
+    report('aes-gcm chunks last range', RANGE_SIZE, time.time() - start)
+
+    f.close()
+    os.remove(f.filepath)
+    os.remove(f.keypath)
+
+
+def main():
+    GLSettings.tmp_upload_path = GLSettings.ramdisk_path
+
+    data = os.urandom(FILE_SIZE)
+
+    measure_ctr(data)
+    measure_gcm(data)
+
+
+if __name__ == '__main__':
+    common.setup_environment()
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8
+#
+# Measures the MB/s of files securely deleted when each file is overwritten
+# in steps of 4KB with a pattern built by string concatenation, as it
+# happened before the introduction of the shredder, and by the Shredder
+# writing large buffers synced to the disk at the end of each pass, with one
+# and with multiple workers and with the default bandwidth budget, that is
+# consumed by each of the three passes.
+#
+# The files are written in the working directory so that the cost of the
+# disk is measured.
+from __future__ import print_function
+
+import os
+import random
+import time
+
+import common
+
+from globaleaks.settings import GLSettings
+from globaleaks.utils.shredder import Shredder
+
+FILE_SIZE = 128 * 1024 * 1024
+FILES = 4
+
+
+def legacy_overwrite(absolutefpath, pattern):
+    filesize = os.path.getsize(absolutefpath)
+    bytecnt = 0
+    with open(absolutefpath, 'w+') as f:
+        f.seek(0)
+        while bytecnt < filesize:
+            f.write(pattern)
+            bytecnt += len(pattern)
+
+
+def legacy_overwrite_and_remove(absolutefpath):
+    all_zeros = "\0\0\0\0" * 1024
+    all_ones = "FFFFFFFF".decode("hex") * 1024
+
+    random_pattern = ""
+    for _ in range(4096 + random.randint(1, 4096)):
+        random_pattern += str(random.randrange(256))
+
+    legacy_overwrite(absolutefpath, all_zeros)
+    legacy_overwrite(absolutefpath, all_ones)
+    legacy_overwrite(absolutefpath, random_pattern)
+
+    os.remove(absolutefpath)
+
+
+def create_files():
+    data = os.urandom(1024 * 1024)
+
+    paths = []
+    for i in range(FILES):
+        path = os.path.join(GLSettings.working_path, 'shred-%d' % i)
+        with open(path, 'wb') as f:
+            for _ in range(FILE_SIZE // len(data)):
+                f.write(data)
+
+            os.fsync(f.fileno())
+
+        paths.append(path)
+
+    return paths
+
+
+def measure(title, f):
+    paths = create_files()
+
+    start = time.time()
+    f(paths)
+    duration = time.time() - start
+
+    print("%-40s %8.1f MB/s" % (title, FILES * FILE_SIZE / duration / 1024 / 1024))
+
+
+def main():
+    measure('overwrite_and_remove (4KB steps)', lambda paths: [legacy_overwrite_and_remove(path) for path in paths])
+
+    for workers, bandwidth in [(1, 0), (GLSettings.shredder_workers, 0),
+                               (GLSettings.shredder_workers, GLSettings.shredder_bandwidth)]:
+        title = 'shredder (%d workers, %s)' % (workers, '%dMB/s' % (bandwidth / 1024 / 1024) if bandwidth else 'unlimited')
+        measure(title, lambda paths: Shredder(workers, bandwidth).shred([(path, 0, 0) for path in paths]))
+
+
+if __name__ == '__main__':
+    common.setup_environment()
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8
+#
+# Measures the requests/s served by StaticFileHandler for index.html and for
+# the javascript bundle of the client when the file is streamed from the
+# disk by StaticFileProducer, as it happened before the introduction of the
+# static cache, and when it is served from the static cache as it is or
+# gzip compressed.
+#
+# When the client in use is not built the bundle is simulated by the
+# concatenation of the javascript sources of the client.
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+
+import common
+
+from globaleaks.handlers.base import StaticFileHandler
+from globaleaks.rest.staticcache import GLStaticCache, normalize_root
+from globaleaks.security import directory_traversal_check
+from globaleaks.settings import GLSettings
+from globaleaks.tests.helpers import forge_request
+
+ITERATIONS = 2000
+
+BUNDLE = 'js/scripts.min.js'
+
+
+class UncachedStaticFileHandler(StaticFileHandler):
+    def get(self, path):
+        abspath = os.path.abspath(os.path.join(self.root, path))
+
+        directory_traversal_check(self.root, abspath)
+
+        return self.write_file(abspath)
+
+
+def prepare_client():
+    if os.path.exists(os.path.join(GLSettings.client_path, BUNDLE)):
+        return GLSettings.client_path
+
+    client_path = tempfile.mkdtemp(prefix='glbench-client-')
+    os.mkdir(os.path.join(client_path, 'js'))
+    shutil.copy(os.path.join(GLSettings.client_path, 'index.html'), client_path)
+
+    with open(os.path.join(client_path, BUNDLE), 'wb') as bundle:
+        for dirpath, _, filenames in os.walk(os.path.join(GLSettings.client_path, 'js')):
+            for filename in sorted(filenames):
+                if filename.endswith('.js'):
+                    with open(os.path.join(dirpath, filename), 'rb') as f:
+                        bundle.write(f.read())
+
+    return client_path
+
+
+def serve(handler_cls, client_path, path, headers):
+    request = forge_request(headers=headers)
+    handler_cls(request, client_path).get(path)
+    return request
+
+
+def main():
+    client_path = prepare_client()
+
+    root = normalize_root(client_path)
+    for relpath, entry in GLStaticCache.read_directory(root):
+        GLStaticCache.set(root, relpath, entry, GLStaticCache.generation)
+
+    for path in ['index.html', BUNDLE]:
+        size = os.stat(os.path.join(client_path, path)).st_size
+
+        for title, handler_cls, headers in [
+            ('disk', UncachedStaticFileHandler, {}),
+            ('cache', StaticFileHandler, {}),
+            ('cache gzip', StaticFileHandler, {'Accept-Encoding': 'gzip'})
+        ]:
+            request = serve(handler_cls, client_path, path, headers)
+            t = common.timeit(lambda: serve(handler_cls, client_path, path, headers), ITERATIONS)
+
+            print("%-40s %8d bytes written=%8d bytes %10.1f requests/s" %
+                  ('%s (%s)' % (path, title), size, len(request.getResponseBody()), 1 / t))
+
+    if client_path != GLSettings.client_path:
+        shutil.rmtree(client_path, True)
+
+
+if __name__ == '__main__':
+    common.setup_environment()
+    main()
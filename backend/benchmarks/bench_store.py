@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8
+#
+# Measures the overhead of a transaction, empty and performing a small read
+# like the lookup of a short url, when a new store and SQLite connection are
+# opened for every transaction and when the store of the thread is reused.
+from __future__ import print_function
+
+import common
+
+from globaleaks import models
+from globaleaks.orm import get_store, transact_sync
+
+ITERATIONS = 2000
+
+
+def empty(store):
+    pass
+
+
+def shorturl(store):
+    return store.find(models.ShortURL, models.ShortURL.shorturl == u'/s/antani').one()
+
+
+def per_transaction_store(function):
+    def wrapper():
+        store = get_store()
+        try:
+            function(store)
+            store.commit()
+        finally:
+            store.reset()
+            store.close()
+
+    return wrapper
+
+
+@transact_sync
+def add_shorturl(store):
+    store.add(models.ShortURL({'shorturl': u'/s/antani', 'longurl': u'/#/'}))
+
+
+def main():
+    add_shorturl()
+
+    for title, function in [('empty transaction', empty),
+                            ('shorturl lookup', shorturl)]:
+        before = common.timeit(per_transaction_store(function), ITERATIONS) * 1000
+        after = common.timeit(transact_sync(function), ITERATIONS) * 1000
+
+        print("%-40s new store=%8.3fms pooled store=%8.3fms speedup=%5.1fx" %
+              (title, before, after, before / after))
+
+
+if __name__ == '__main__':
+    common.setup_environment()
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8
+#
+# Measures the TLS handshakes/s of the contexts of the HTTPS workers: the
+# full handshakes, the ones resuming a session on the worker that started
+# it and the ones resuming it on another worker, the case of most of the
+# returning clients given that the connections are distributed among as
+# many workers as the cores.
+#
+# Before the introduction of the session tickets sharing the same keys the
+# sessions could not be resumed on another worker; the resumption across
+# the workers requires the bindings of pyOpenSSL to be linked dynamically
+# to the libssl of the system as otherwise the keys cannot be set.
+#
+# The handshakes are performed in memory so that only the cost of the
+# cryptography is measured.
+from __future__ import print_function
+
+import os
+import time
+
+import common
+
+from OpenSSL import SSL
+from OpenSSL._util import lib as _lib
+from OpenSSL.crypto import FILETYPE_PEM, load_certificate, load_privatekey
+
+from globaleaks.utils import tls
+
+DURATION = 5
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'globaleaks', 'tests', 'data', 'https', 'valid')
+
+
+def new_worker_context(keys=None):
+    ctx = tls.new_tls_server_context()
+
+    with open(os.path.join(DATA_DIR, 'cert.pem')) as f:
+        ctx.use_certificate(load_certificate(FILETYPE_PEM, f.read()))
+
+    with open(os.path.join(DATA_DIR, 'priv_key.pem')) as f:
+        ctx.use_privatekey(load_privatekey(FILETYPE_PEM, f.read()))
+
+    if keys is not None:
+        tls.set_tls_ticket_keys(ctx, keys)
+
+    return ctx
+
+
+def handshake(server_ctx, session=None):
+    client = SSL.Connection(tls.new_tls_client_context(), None)
+    client.set_connect_state()
+    if session is not None:
+        client.set_session(session)
+
+    server = SSL.Connection(server_ctx, None)
+    server.set_accept_state()
+
+    # the session tickets of TLS 1.3 are sent after the handshake
+    data = b''
+    while not data:
+        for conn in (client, server):
+            try:
+                conn.do_handshake()
+            except SSL.WantReadError:
+                pass
+
+        for src, dst in ((client, server), (server, client)):
+            try:
+                dst.bio_write(src.bio_read(65536))
+            except SSL.WantReadError:
+                pass
+
+        try:
+            server.send(b'x')
+            data = client.recv(1)
+        except SSL.WantReadError:
+            pass
+
+    # the sessions of the connections not shut down are removed from the cache
+    server.shutdown()
+
+    return client
+
+
+def measure(title, workers, resume):
+    """
+    Perform the handshakes distributing them round robin among the workers
+    """
+    session = None
+
+    handshakes = reused = 0
+    start = time.time()
+    while time.time() - start < DURATION:
+        client = handshake(workers[handshakes % len(workers)], session)
+        handshakes += 1
+        reused += _lib.SSL_session_reused(client._ssl)
+
+        # the clients resume the sessions with the last ticket received
+        if resume:
+            session = client.get_session()
+
+    duration = time.time() - start
+
+    print("%-40s %8.1f handshakes/s %6.1f%% resumed" %
+          (title, handshakes / duration, reused * 100.0 / handshakes))
+
+
+def main():
+    keys = os.urandom(tls.TLS_TICKET_KEYS_LENGTH)
+    shared = tls.get_libssl() is not None
+
+    print("%-40s %s" % ('ticket keys shared across workers', 'yes' if shared else 'no (static openssl)'))
+
+    worker1 = new_worker_context(keys)
+    worker2 = new_worker_context(keys)
+
+    measure('full handshake', [worker1], False)
+    measure('resumed on the same worker', [worker1], True)
+    measure('resumed on another worker', [worker1, worker2], True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8
+#
+# Measures the latency of /public cache misses (get_public_resources) while
+# a slow read-write transaction, like the serialization of a tip export,
+# keeps the writer busy; the same query is issued once as a read-write
+# transaction and once as a read-only transaction.
+from __future__ import print_function
+
+import time
+
+import common
+
+from twisted.internet import defer, reactor
+from twisted.python.threadpool import ThreadPool
+
+from globaleaks.handlers.public import get_public_resources, db_serialize_node
+from globaleaks.orm import transact
+from globaleaks.settings import GLSettings
+
+EXPORT_DURATION = 0.5  # seconds spent by each simulated export
+REQUESTS = 400
+CONCURRENCY = 8
+
+
+@transact
+def export(store):
+    # simulate the serialization of a large tip export
+    start = time.time()
+    while time.time() - start < EXPORT_DURATION:
+        db_serialize_node(store, u'en')
+
+
+get_public_resources_rw = transact(get_public_resources.method)
+
+
+@defer.inlineCallbacks
+def exporter(running):
+    while running[0]:
+        yield export()
+
+
+@defer.inlineCallbacks
+def client(f, latencies, n):
+    for _ in range(n):
+        start = time.time()
+        yield f(u'en')
+        latencies.append((time.time() - start) * 1000)
+
+
+@defer.inlineCallbacks
+def measure(title, f):
+    running = [True]
+    exporting = exporter(running)
+
+    latencies = []
+    yield defer.DeferredList([client(f, latencies, REQUESTS / CONCURRENCY) for _ in range(CONCURRENCY)])
+
+    running[0] = False
+    yield exporting
+
+    common.report(title, latencies)
+
+
+@defer.inlineCallbacks
+def main():
+    try:
+        yield measure('/public as read-write transaction', get_public_resources_rw)
+        yield measure('/public as read-only transaction', get_public_resources)
+    finally:
+        reactor.stop()
+
+
+if __name__ == '__main__':
+    common.setup_environment()
+
+    GLSettings.orm_tp = ThreadPool(1, 1)
+    GLSettings.orm_ro_tp = ThreadPool(1, GLSettings.orm_ro_threads)
+    GLSettings.orm_tp.start()
+    GLSettings.orm_ro_tp.start()
+    reactor.addSystemEventTrigger('before', 'shutdown', GLSettings.orm_tp.stop)
+    reactor.addSystemEventTrigger('before', 'shutdown', GLSettings.orm_ro_tp.stop)
+
+    reactor.callWhenRunning(main)
+    reactor.run()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8
+#
+# Measures the cost of the validation of the payloads sent by the client for
+# a submission, for a questionnaire and for the node settings with the walk
+# of the templates of rest/requests.py performed before the introduction of
+# the compiled validators and with the compiled validators.
+#
+# The payloads are recorded from the default questionnaire and node; the time
+# of json.loads, needed to get a fresh copy of the payload for every
+# validation, is subtracted from the times reported.
+from __future__ import print_function
+
+import collections
+import json
+import re
+import uuid
+
+import common
+
+from globaleaks.handlers.admin.node import db_admin_serialize_node
+from globaleaks.handlers.admin.questionnaire import db_get_questionnaire
+from globaleaks.handlers.base import BaseHandler
+from globaleaks.orm import transact_sync
+from globaleaks.rest import errors, requests
+
+ITERATIONS = 2000
+
+
+def validate_python_type(value, python_type):
+    if python_type == requests.SkipSpecificValidation:
+        return True
+
+    if python_type == int:
+        try:
+            int(value)
+            return True
+        except Exception:
+            return False
+
+    if python_type == bool:
+        if value == u'true' or value == u'false':
+            return True
+
+    return isinstance(value, python_type)
+
+
+def validate_type(value, type):
+    if value is None:
+        return False
+
+    elif callable(type):
+        return validate_python_type(value, type)
+
+    elif isinstance(type, collections.Mapping):
+        return validate_jmessage(value, type)
+
+    elif isinstance(type, str):
+        return bool(re.match(type, unicode(value)))
+
+    elif isinstance(type, collections.Iterable):
+        return not value or all(validate_type(x, type[0]) for x in value)
+
+    return False
+
+
+def validate_jmessage(jmessage, message_template):
+    """
+    The validation of the messages as implemented before the introduction of
+    the compiled validators
+    """
+    if isinstance(message_template, dict):
+        success_check = 0
+        keys_to_strip = []
+        for key, value in jmessage.items():
+            if key not in message_template:
+                keys_to_strip.append(key)
+                continue
+
+            if not validate_type(value, message_template[key]):
+                raise errors.InvalidInputFormat("Key (%s) type validation failure" % key)
+            success_check += 1
+
+        for key in keys_to_strip:
+            del jmessage[key]
+
+        for key, value in message_template.items():
+            if key not in jmessage:
+                raise errors.InvalidInputFormat("Missing key %s" % key)
+
+            if not validate_type(jmessage[key], value):
+                raise errors.InvalidInputFormat("Key (%s) double validation failure" % key)
+
+            if isinstance(message_template[key], dict) or isinstance(message_template[key], list):
+                if message_template[key]:
+                    validate_jmessage(jmessage[key], message_template[key])
+
+            success_check += 1
+
+        if success_check != len(message_template) * 2:
+            raise errors.InvalidInputFormat("Success counter double check failure")
+
+        return True
+
+    elif isinstance(message_template, list):
+        if not all(validate_type(x, message_template[0]) for x in jmessage):
+            raise errors.InvalidInputFormat("Not every element in %s is %s" %
+                                            (jmessage, message_template[0]))
+        return True
+
+    raise errors.InvalidInputFormat("invalid json massage: expected dict or list")
+
+
+def fill_answers(answers, field):
+    if field['type'] == 'fieldgroup':
+        value = {}
+        for child in field['children']:
+            fill_answers(value, child)
+    elif field['options']:
+        value = {'value': field['options'][0]['id']}
+    else:
+        value = {'value': u'Ѐ' * 200}
+
+    answers[field['id']] = [value]
+
+
+@transact_sync
+def record_payloads(store):
+    questionnaire = db_get_questionnaire(store, u'default', u'en')
+
+    answers = {}
+    for step in questionnaire['steps']:
+        for field in step['children']:
+            fill_answers(answers, field)
+
+    submission = {
+        'context_id': unicode(uuid.uuid4()),
+        'receivers': [unicode(uuid.uuid4()) for _ in range(10)],
+        'identity_provided': False,
+        'answers': answers,
+        'total_score': 0
+    }
+
+    return [
+        ('SubmissionDesc', submission, requests.SubmissionDesc),
+        ('AdminQuestionnaireDesc', questionnaire, requests.AdminQuestionnaireDesc),
+        ('AdminNodeDesc', db_admin_serialize_node(store, u'en'), requests.AdminNodeDesc)
+    ]
+
+
+def main():
+    for title, payload, template in record_payloads():
+        data = json.dumps(payload)
+
+        loads = common.timeit(lambda: json.loads(data), ITERATIONS)
+        before = common.timeit(lambda: validate_jmessage(json.loads(data), template), ITERATIONS) - loads
+        after = common.timeit(lambda: BaseHandler.validate_jmessage(json.loads(data), template), ITERATIONS) - loads
+
+        print("%-40s %6d bytes walk=%8.1fus compiled=%8.1fus speedup=%5.1fx" %
+              (title, len(data), before * 1000000, after * 1000000, before / after))
+
+
+if __name__ == '__main__':
+    common.setup_environment()
+    main()
@@ -0,0 +1,60 @@
+# -*- coding: UTF-8
+#   benchmarks common
+#   *****************
+#
+# Utilities shared by the benchmark scripts
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from globaleaks import db
+from globaleaks.settings import GLSettings
+from globaleaks.utils.utility import log
+
+
+def setup_environment():
+    """
+    Initialize a throwaway working directory with a fresh database
+    """
+    log.setloglevel(50)
+
+    GLSettings.testing = True
+    GLSettings.set_devel_mode()
+    GLSettings.working_path = tempfile.mkdtemp(prefix='glbench-')
+    atexit.register(shutil.rmtree, GLSettings.working_path, True)
+    GLSettings.eval_paths()
+    GLSettings.set_ramdisk_path()
+    GLSettings.ramdisk_path = os.path.join(GLSettings.working_path, 'ramdisk')
+    GLSettings.create_directories()
+
+    db.init_db()
+    db.sync_refresh_memory_variables()
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return 0
+
+    return values[min(len(values) - 1, int(len(values) * p / 100.0))]
+
+
+def report(title, values, unit='ms'):
+    print("%-40s n=%-6d p50=%8.2f%s p99=%8.2f%s max=%8.2f%s" %
+          (title, len(values),
+           percentile(values, 50), unit,
+           percentile(values, 99), unit,
+           max(values) if values else 0, unit))
+
+
+def timeit(f, n):
+    start = time.time()
+    for _ in range(n):
+        f()
+
+    return (time.time() - start) / n
@@ -10,7 +10,7 @@ __email__ = u'info@globaleaks.org'
 __version__ = u'2.72.5'
 __license__ = u'AGPL-3.0'
 
-DATABASE_VERSION = 38
+DATABASE_VERSION = 40
 FIRST_DATABASE_VERSION_SUPPORTED = 20
 
 # Add new languages as they are supported here! To do this retrieve the name of
@@ -318,7 +318,7 @@ class AlarmClass(object):
                      old_accept_submissions, accept_submissions)
 
             # Must invalidate the cache here becuase accept_subs served in /public has changed
-            GLApiCache.invalidate()
+            GLApiCache.invalidate('node')
 
 # Alarm is a singleton class exported once
 Alarm = AlarmClass()
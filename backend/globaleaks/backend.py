@@ -15,12 +15,15 @@ from twisted.web.server import Site
 
 from globaleaks.db import init_db, update_db, \
     sync_refresh_memory_variables, sync_clean_untracked_files
-from globaleaks.rest.api import APIResourceWrapper
+from globaleaks.rest.api import APIResourceWrapper, warmup_cache
+from globaleaks.rest.apicache import GLApiCache
+from globaleaks.rest.staticcache import GLStaticCache
 from globaleaks.settings import GLSettings
+from globaleaks.utils.multipart import MultipartRequest
 from globaleaks.utils.process import disable_swap
 from globaleaks.utils.sock import listen_tcp_on_sock, reserve_port_for_ip
 from globaleaks.utils.utility import log, timedelta_to_milliseconds, GLLogObserver
-from globaleaks.workers.supervisor import ProcessSupervisor
+from globaleaks.workers.supervisor import ProcessSupervisor, kdf_pool
 
 # this import seems unused but it is required in order to load the mocks
 import globaleaks.mocks.twisted_mocks # pylint: disable=W0611
@@ -91,7 +94,10 @@ class GLService(service.Service):
 
         yield GLSettings.stop_jobs()
 
+        yield kdf_pool.shutdown()
+
         GLSettings.orm_tp.stop()
+        GLSettings.orm_ro_tp.stop()
 
     @defer.inlineCallbacks
     def deferred_start(self):
@@ -113,12 +119,20 @@ class GLService(service.Service):
         sync_refresh_memory_variables()
 
         GLSettings.orm_tp.start()
+        GLSettings.orm_ro_tp.start()
 
         reactor.addSystemEventTrigger('before', 'shutdown', self.shutdown)
 
         arw = APIResourceWrapper()
 
+        GLStaticCache.preload(GLSettings.client_path)
+
+        if GLSettings.cache_warmup:
+            GLApiCache.warmup_functions.append(warmup_cache)
+            GLApiCache.schedule_warmup()
+
         GLSettings.api_factory = Site(arw, logFormatter=timedLogFormatter)
+        GLSettings.api_factory.requestFactory = MultipartRequest
 
         for sock in GLSettings.http_socks:
             listen_tcp_on_sock(reactor, sock.fileno(), GLSettings.api_factory)
@@ -129,6 +143,8 @@ class GLService(service.Service):
 
         GLSettings.appstate.process_supervisor.maybe_launch_https_workers()
 
+        kdf_pool.start(GLSettings.kdf_processes)
+
         GLSettings.start_jobs()
 
         GLSettings.print_listening_interfaces()
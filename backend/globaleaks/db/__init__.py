@@ -6,13 +6,14 @@ import sys
 import traceback
 from storm import exceptions
 
-from globaleaks import models, security, DATABASE_VERSION, FIRST_DATABASE_VERSION_SUPPORTED
+from globaleaks import models, DATABASE_VERSION, FIRST_DATABASE_VERSION_SUPPORTED
 from globaleaks.db.appdata import db_update_defaults, load_appdata
 from globaleaks.handlers.admin import files
 from globaleaks.handlers.base import GLSession
-from globaleaks.orm import transact, transact_sync
+from globaleaks.orm import store_pool, transact, transact_sync
 from globaleaks.settings import GLSettings
 from globaleaks.utils.objectdict import ObjectDict
+from globaleaks.utils.shredder import Shredder
 from globaleaks.utils.utility import log
 
 
@@ -61,6 +62,10 @@ def init_db(store):
         with open(os.path.join(GLSettings.client_path, file_desc[1]), 'r') as f:
             files.db_add_file(store, f.read(), file_desc[0])
 
+    # the stores opened on the empty database are discarded in order
+    # to apply to the new connections the settings like the journal mode
+    store_pool.reset()
+
 
 def update_db():
     """
@@ -111,14 +116,15 @@ def sync_clean_untracked_files(store):
     tracked by InternalFile/ReceiverFile.
     """
     tracked_files = db_get_tracked_files(store)
+
+    files_to_remove = []
     for filesystem_file in os.listdir(GLSettings.submission_path):
         if filesystem_file not in tracked_files:
             file_to_remove = os.path.join(GLSettings.submission_path, filesystem_file)
-            try:
-                log.debug("Removing untracked file: %s", file_to_remove)
-                security.overwrite_and_remove(file_to_remove)
-            except OSError:
-                log.err("Failed to remove untracked file", file_to_remove)
+            log.debug("Removing untracked file: %s", file_to_remove)
+            files_to_remove.append((file_to_remove, 0, 0))
+
+    Shredder().shred(files_to_remove)
 
 
 def db_refresh_exception_delivery_list(store):
@@ -141,6 +147,14 @@ def db_refresh_exception_delivery_list(store):
     GLSettings.memory_copy.notif.exception_delivery_list = trimmed
 
 
+def db_refresh_shorturls(store):
+    """
+    Loads in memory the table of the short urls used by translate_shorturl
+    """
+    GLSettings.memory_copy.shorturls = dict(store.find(models.ShortURL).values(models.ShortURL.shorturl,
+                                                                                models.ShortURL.longurl))
+
+
 def db_refresh_memory_variables(store):
     """
     This routine loads in memory few variables of node and notification tables
@@ -170,6 +184,8 @@ def db_refresh_memory_variables(store):
 
     db_refresh_exception_delivery_list(store)
 
+    db_refresh_shorturls(store)
+
     GLSettings.memory_copy.private = ObjectDict(models.config.PrivateFactory(store).mem_copy_export())
 
     if GLSettings.memory_copy.private.admin_api_token_digest:
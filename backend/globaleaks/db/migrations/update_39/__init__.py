@@ -0,0 +1,11 @@
+# -*- coding: UTF-8
+
+from globaleaks.db.migrations.update import MigrationBase
+
+
+class MigrationScript(MigrationBase):
+    """
+    The schema is unchanged; the migration recreates the database from
+    sqlite.sql in order to add the indexes introduced with this version.
+    """
+    pass
@@ -0,0 +1,15 @@
+# -*- coding: UTF-8
+
+from storm.locals import Unicode
+
+from globaleaks.db.migrations.update import MigrationBase
+from globaleaks.models import ModelWithID
+
+
+class SecureFileDelete_v_39(ModelWithID):
+    __storm_table__ = 'securefiledelete'
+    filepath = Unicode()
+
+
+class MigrationScript(MigrationBase):
+    pass
@@ -385,6 +385,8 @@ CREATE TABLE archivedschema (
 CREATE TABLE securefiledelete (
     id TEXT NOT NULL,
     filepath TEXT NOT NULL,
+    pass_number INTEGER DEFAULT 0 NOT NULL,
+    pass_offset INTEGER DEFAULT 0 NOT NULL,
     PRIMARY KEY (id)
 );
 
@@ -414,3 +416,23 @@ CREATE TABLE customtexts (
     texts BLOB NOT NULL,
     PRIMARY KEY (lang)
 );
+
+CREATE INDEX receivertip__receiver_id ON receivertip(receiver_id);
+CREATE INDEX receivertip__internaltip_id ON receivertip(internaltip_id);
+CREATE INDEX fieldanswer__internaltip_id ON fieldanswer(internaltip_id);
+CREATE INDEX fieldanswer__fieldanswergroup_id ON fieldanswer(fieldanswergroup_id);
+CREATE INDEX fieldanswergroup__fieldanswer_id ON fieldanswergroup(fieldanswer_id);
+CREATE INDEX internalfile__internaltip_id ON internalfile(internaltip_id);
+CREATE INDEX receiverfile__internalfile_id ON receiverfile(internalfile_id);
+CREATE INDEX receiverfile__receivertip_id ON receiverfile(receivertip_id);
+CREATE INDEX whistleblowerfile__receivertip_id ON whistleblowerfile(receivertip_id);
+CREATE INDEX comment__internaltip_id ON comment(internaltip_id);
+CREATE INDEX message__receivertip_id ON message(receivertip_id);
+CREATE INDEX identityaccessrequest__receivertip_id ON identityaccessrequest(receivertip_id);
+CREATE INDEX whistleblowertip__receipt_hash ON whistleblowertip(receipt_hash);
+
+CREATE INDEX receivertip__new ON receivertip(id) WHERE new = 1;
+CREATE INDEX comment__new ON comment(id) WHERE new = 1;
+CREATE INDEX message__new ON message(id) WHERE new = 1;
+CREATE INDEX internalfile__new ON internalfile(id) WHERE new = 1;
+CREATE INDEX receiverfile__new ON receiverfile(id) WHERE new = 1;
@@ -170,6 +170,8 @@ class ContextsCollection(BaseHandler):
     check_roles = 'admin'
     cache_resource = True
     invalidate_cache = True
+    cache_tags = ('contexts', 'receivers')
+    invalidate_cache_tags = ('contexts', 'receivers')
 
     def get(self):
         """
@@ -196,6 +198,7 @@ class ContextsCollection(BaseHandler):
 class ContextInstance(BaseHandler):
     check_roles = 'admin'
     invalidate_cache = True
+    invalidate_cache_tags = ('contexts', 'receivers')
 
     def put(self, context_id):
         """
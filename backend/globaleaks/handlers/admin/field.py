@@ -229,6 +229,8 @@ class FieldTemplatesCollection(BaseHandler):
     check_roles = 'admin'
     cache_resource = True
     invalidate_cache = True
+    cache_tags = ('questionnaires',)
+    invalidate_cache_tags = ('questionnaires',)
 
     def get(self):
         """
@@ -253,6 +255,7 @@ class FieldTemplatesCollection(BaseHandler):
 class FieldTemplateInstance(BaseHandler):
     check_roles = 'admin'
     invalidate_cache = True
+    invalidate_cache_tags = ('questionnaires',)
 
     def put(self, field_id):
         """
@@ -287,6 +290,7 @@ class FieldsCollection(BaseHandler):
     check_roles = 'admin'
     cache_resource = True
     invalidate_cache = True
+    invalidate_cache_tags = ('questionnaires',)
 
     def post(self):
         """
@@ -311,6 +315,7 @@ class FieldInstance(BaseHandler):
     """
     check_roles = 'admin'
     invalidate_cache = True
+    invalidate_cache_tags = ('questionnaires',)
 
     def put(self, field_id):
         """
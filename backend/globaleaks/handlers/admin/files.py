@@ -6,6 +6,8 @@
 # API handling db files upload/download/delete
 import base64
 
+from twisted.internet.defer import inlineCallbacks
+
 from globaleaks import models
 from globaleaks.handlers.base import BaseHandler
 from globaleaks.orm import transact
@@ -44,17 +46,20 @@ def get_file(store, key):
 class FileInstance(BaseHandler):
     check_roles = 'admin'
     invalidate_cache = True
+    invalidate_cache_tags = ('node',)
 
     key = None
 
+    @inlineCallbacks
     def post(self, key):
-        uploaded_file = self.get_file_upload()
+        uploaded_file = yield self.get_file_upload()
         if uploaded_file is None:
             return
 
-        d = add_file(uploaded_file['body'].read(), key)
-        d.addBoth(lambda ignore: uploaded_file['body'].close)
-        return d
+        try:
+            yield add_file(uploaded_file['body'].read(), key)
+        finally:
+            uploaded_file['body'].close()
 
     def delete(self, key):
         return models.delete(models.File, id=key)
@@ -98,7 +98,7 @@ class PrivKeyFileRes(FileResource):
 
         prv_fact = PrivateFactory(store)
         pkv = cls.validator()
-        ok, _ = pkv.validate(db_cfg)
+        ok, _ = pkv.validate(db_cfg, must_be_disabled=False)
         if ok:
             prv_fact.set_val(u'https_priv_key', raw_key)
             prv_fact.set_val(u'https_priv_gen', False)
@@ -152,7 +152,7 @@ class CertFileRes(FileResource):
         db_cfg['ssl_cert'] = raw_cert
 
         cv = cls.validator()
-        ok, _ = cv.validate(db_cfg)
+        ok, _ = cv.validate(db_cfg, must_be_disabled=False)
         if ok:
             prv_fact.set_val(u'https_cert', raw_cert)
             GLSettings.memory_copy.https_cert = raw_cert
@@ -202,7 +202,7 @@ class ChainFileRes(FileResource):
         db_cfg['ssl_intermediate'] = raw_chain
 
         cv = cls.validator()
-        ok, _ = cv.validate(db_cfg)
+        ok, _ = cv.validate(db_cfg, must_be_disabled=False)
         if ok:
             prv_fact.set_val(u'https_chain', raw_chain)
         else:
@@ -292,12 +292,28 @@ class FileHandler(BaseHandler):
 
         return self.mapped_file_resources[name]
 
+    @inlineCallbacks
+    def reload_https_workers(self):
+        """
+        Swap in the running https workers the TLS configuration changed while
+        HTTPS is enabled; the workers keep the previous configuration until
+        the changes leave a valid one, e.g. a new key is followed by its
+        certificate.
+        """
+        if not GLSettings.memory_copy.private.https_enabled:
+            return
+
+        try:
+            yield GLSettings.appstate.process_supervisor.maybe_reload_https_workers()
+        except Exception:
+            # the configurations not loaded are logged by the supervisor
+            pass
+
     @BaseHandler.https_disabled
     def delete(self, name):
         file_res_cls = self.get_file_res_or_raise(name)
         return file_res_cls.delete_file()
 
-    @BaseHandler.https_disabled
     @inlineCallbacks
     def post(self, name):
         req = self.validate_message(self.request.content.read(),
@@ -311,7 +327,8 @@ class FileHandler(BaseHandler):
         if not ok:
             raise errors.ValidationError()
 
-    @BaseHandler.https_disabled
+        yield self.reload_https_workers()
+
     @inlineCallbacks
     def put(self, name):
         file_res_cls = self.get_file_res_or_raise(name)
@@ -320,6 +337,8 @@ class FileHandler(BaseHandler):
 
         yield file_res_cls.perform_file_action()
 
+        yield self.reload_https_workers()
+
     @BaseHandler.https_disabled
     def get(self, name):
         file_res_cls = self.get_file_res_or_raise(name)
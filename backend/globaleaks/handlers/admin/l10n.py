@@ -32,6 +32,7 @@ def update(store, lang, request):
 class AdminL10NHandler(BaseHandler):
     check_roles = 'admin'
     invalidate_cache = True
+    invalidate_cache_tags = ('l10n:{lang}',)
 
     def get(self, lang):
         return get(lang)
@@ -6,6 +6,8 @@
 # API handling upload/delete of users/contexts picture
 import base64
 
+from twisted.internet.defer import inlineCallbacks
+
 from globaleaks import models
 from globaleaks.handlers.base import BaseHandler
 from globaleaks.orm import transact
@@ -53,18 +55,24 @@ def del_model_img(store, model, obj_id):
 class ModelImgInstance(BaseHandler):
     check_roles = 'admin'
     invalidate_cache = True
+    # obj_key is either 'users' or 'contexts'
+    invalidate_cache_tags = ('{obj_key}',)
 
     def post(self, obj_key, obj_id):
-        uploaded_file = self.get_file_upload()
+        # obj_key is needed by the invalidation of the cache and so it is
+        # kept in the signature of post
+        return self.upload_model_img(model_map[obj_key], obj_id)
+
+    @inlineCallbacks
+    def upload_model_img(self, model, obj_id):
+        uploaded_file = yield self.get_file_upload()
         if uploaded_file is None:
             return
 
-        # The error is suppressed here because add_model_img is wrapped with a
-        # transact returns a deferred which we attach events to.
-        # pylint: disable=assignment-from-no-return
-        d = add_model_img(model_map[obj_key], obj_id, uploaded_file['body'].read())
-        d.addBoth(lambda ignore: uploaded_file['body'].close)
-        return d
+        try:
+            yield add_model_img(model, obj_id, uploaded_file['body'].read())
+        finally:
+            uploaded_file['body'].close()
 
     def delete(self, obj_key, obj_id):
         return del_model_img(model_map[obj_key], obj_id)
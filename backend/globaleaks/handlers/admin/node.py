@@ -112,6 +112,7 @@ class NodeInstance(BaseHandler):
     check_roles = 'admin'
     cache_resource = True
     invalidate_cache = True
+    cache_tags = ('node',)
 
     def get(self):
         """
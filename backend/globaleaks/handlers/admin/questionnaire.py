@@ -111,6 +111,8 @@ class QuestionnairesCollection(BaseHandler):
     check_roles = 'admin'
     cache_resource = True
     invalidate_cache = True
+    cache_tags = ('questionnaires',)
+    invalidate_cache_tags = ('questionnaires',)
 
     def get(self):
         """
@@ -141,6 +143,7 @@ class QuestionnairesCollection(BaseHandler):
 class QuestionnaireInstance(BaseHandler):
     check_roles = 'admin'
     invalidate_cache = True
+    invalidate_cache_tags = ('questionnaires',)
 
     def put(self, questionnaire_id):
         """
@@ -59,6 +59,7 @@ def update_receiver(store, receiver_id, request, language):
 class ReceiversCollection(BaseHandler):
     check_roles = 'admin'
     cache_resource = True
+    cache_tags = ('receivers', 'users', 'contexts')
 
     def get(self):
         """
@@ -74,6 +75,7 @@ class ReceiversCollection(BaseHandler):
 class ReceiverInstance(BaseHandler):
     check_roles = 'admin'
     invalidate_cache = True
+    invalidate_cache_tags = ('receivers', 'contexts')
 
     def put(self, receiver_id):
         """
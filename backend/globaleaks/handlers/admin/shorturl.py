@@ -5,6 +5,7 @@
 # Implementation of the URL shortener handlers
 #
 from globaleaks import models
+from globaleaks.db import db_refresh_shorturls
 from globaleaks.handlers.base import BaseHandler
 from globaleaks.orm import transact
 from globaleaks.rest import requests
@@ -26,13 +27,25 @@ def get_shorturl_list(store):
 @transact
 def create_shorturl(store, request):
     shorturl = models.db_forge_obj(store, models.ShortURL, request)
+
+    db_refresh_shorturls(store)
+
     return serialize_shorturl(shorturl)
 
 
+@transact
+def delete_shorturl(store, shorturl_id):
+    models.db_delete(store, models.ShortURL, id=shorturl_id)
+
+    db_refresh_shorturls(store)
+
+
 class ShortURLCollection(BaseHandler):
     check_roles = 'admin'
     cache_resource = True
     invalidate_cache = True
+    cache_tags = ('shorturls',)
+    invalidate_cache_tags = ('shorturls',)
 
     def get(self):
         """
@@ -51,9 +64,11 @@ class ShortURLCollection(BaseHandler):
 
 class ShortURLInstance(BaseHandler):
     check_roles = 'admin'
+    invalidate_cache = True
+    invalidate_cache_tags = ('shorturls',)
 
     def delete(self, shorturl_id):
         """
         Delete the specified shorturl.
         """
-        return models.delete(models.ShortURL, id=shorturl_id)
+        return delete_shorturl(shorturl_id)
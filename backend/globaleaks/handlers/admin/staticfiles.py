@@ -7,9 +7,11 @@
 import os
 
 from twisted.internet import threads
+from twisted.internet.defer import inlineCallbacks
 
 from globaleaks.handlers.base import BaseHandler, write_upload_plaintext_to_disk
 from globaleaks.rest import errors
+from globaleaks.rest.staticcache import GLStaticCache
 from globaleaks.security import directory_traversal_check
 from globaleaks.settings import GLSettings
 
@@ -40,11 +42,12 @@ class StaticFileInstance(BaseHandler):
 
     handler_exec_time_threshold = 3600
 
+    @inlineCallbacks
     def post(self, filename):
         """
         Upload a new file
         """
-        uploaded_file = self.get_file_upload()
+        uploaded_file = yield self.get_file_upload()
         if uploaded_file is None:
             return
 
@@ -54,9 +57,11 @@ class StaticFileInstance(BaseHandler):
         path = os.path.join(GLSettings.static_path, filename)
         directory_traversal_check(GLSettings.static_path, path)
 
-        d = threads.deferToThread(write_upload_plaintext_to_disk, uploaded_file, path)
-        d.addBoth(lambda ignore: uploaded_file['body'].close)
-        return d
+        try:
+            yield threads.deferToThread(write_upload_plaintext_to_disk, uploaded_file, path)
+        finally:
+            uploaded_file['body'].close()
+            GLStaticCache.invalidate(GLSettings.static_path)
 
     def delete(self, filename):
         """
@@ -70,6 +75,8 @@ class StaticFileInstance(BaseHandler):
 
         os.remove(path)
 
+        GLStaticCache.invalidate(GLSettings.static_path)
+
 
 class StaticFileList(BaseHandler):
     check_roles = 'admin'
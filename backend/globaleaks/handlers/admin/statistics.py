@@ -12,7 +12,9 @@ from storm.expr import Desc, And
 from globaleaks.event import EventTrackQueue, events_monitored
 from globaleaks.handlers.base import BaseHandler
 from globaleaks.models import Stats, Anomalies
-from globaleaks.orm import transact
+from globaleaks.orm import transact_ro, transaction_stats
+from globaleaks.rest.apicache import GLApiCache
+from globaleaks.rest.staticcache import GLStaticCache
 from globaleaks.settings import GLSettings
 from globaleaks.utils.utility import datetime_to_ISO8601, datetime_now, \
     iso_to_gregorian, log
@@ -29,7 +31,7 @@ def weekmap_to_heatmap(week_map):
 
     return retlist
 
-@transact
+@transact_ro
 def get_stats(store, week_delta):
     """
     :param week_delta: commonly is 0, mean that you're taking this
@@ -113,7 +115,7 @@ def get_stats(store, week_delta):
     }
 
 
-@transact
+@transact_ro
 def get_anomaly_history(store, limit):
     anomalies = store.find(Anomalies).order_by(Desc(Anomalies.date))[:limit]
 
@@ -209,3 +211,26 @@ class JobsTiming(BaseHandler):
             })
 
         return response
+
+
+class TransactionsTiming(BaseHandler):
+    """
+    This handler return the statistics of the latest transactions executions
+    """
+    check_roles = 'admin'
+
+    def get(self):
+        return transaction_stats.serialize()
+
+
+class CacheStatistics(BaseHandler):
+    """
+    This handler return the statistics of the API cache and of the cache
+    of the static files
+    """
+    check_roles = 'admin'
+
+    def get(self):
+        ret = GLApiCache.get_stats()
+        ret['static'] = GLStaticCache.get_stats()
+        return ret
@@ -76,6 +76,7 @@ class StepCollection(BaseHandler):
     check_roles = 'admin'
     cache_resource = True
     invalidate_cache = True
+    invalidate_cache_tags = ('questionnaires',)
 
     def post(self):
         """
@@ -99,6 +100,7 @@ class StepInstance(BaseHandler):
     """
     check_roles = 'admin'
     invalidate_cache = True
+    invalidate_cache_tags = ('questionnaires',)
 
     def put(self, step_id):
         """
@@ -226,6 +226,8 @@ class UsersCollection(BaseHandler):
     check_roles = 'admin'
     cache_resource = True
     invalidate_cache = True
+    cache_tags = ('users',)
+    invalidate_cache_tags = ('users', 'receivers', 'contexts')
 
     def get(self):
         """
@@ -254,6 +256,7 @@ class UsersCollection(BaseHandler):
 class UserInstance(BaseHandler):
     check_roles = 'admin'
     invalidate_cache = True
+    invalidate_cache_tags = ('users', 'receivers', 'contexts')
 
     def put(self, user_id):
         """
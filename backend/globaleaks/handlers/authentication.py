@@ -13,10 +13,11 @@ from globaleaks import security
 from globaleaks.handlers.base import BaseHandler, GLSessions, new_session
 from globaleaks.models import User
 from globaleaks.models import WhistleblowerTip
-from globaleaks.orm import transact
+from globaleaks.orm import transact, transact_ro
 from globaleaks.rest import errors, requests
 from globaleaks.settings import GLSettings
 from globaleaks.utils.utility import datetime_now, deferred_sleep, log, randint
+from globaleaks.workers.supervisor import kdf_pool
 
 
 def random_login_delay():
@@ -55,11 +56,9 @@ def db_get_wbtip_by_receipt(store, receipt):
 
 
 @transact
-def login_whistleblower(store, receipt, client_using_tor):
-    """
-    login_whistleblower returns the WhistleblowerTip.id
-    """
-    wbtip = db_get_wbtip_by_receipt(store, receipt)
+def finalize_whistleblower_login(store, receipt_hash, client_using_tor):
+    wbtip = store.find(WhistleblowerTip,
+                       WhistleblowerTip.receipt_hash == unicode(receipt_hash)).one()
     if not wbtip:
         log.debug("Whistleblower login: Invalid receipt")
         GLSettings.failed_login_attempts += 1
@@ -74,17 +73,31 @@ def login_whistleblower(store, receipt, client_using_tor):
     return wbtip.id
 
 
-@transact
-def login(store, username, password, client_using_tor):
+@inlineCallbacks
+def login_whistleblower(receipt, client_using_tor):
     """
-    login returns a tuple (user_id, state, pcn)
+    login_whistleblower returns the WhistleblowerTip.id
     """
+    receipt_hash = yield kdf_pool.hash_password(receipt, GLSettings.memory_copy.private.receipt_salt)
+
+    wbtip_id = yield finalize_whistleblower_login(receipt_hash, client_using_tor)
+
+    returnValue(wbtip_id)
+
+
+@transact_ro
+def get_user_credentials(store, username):
     user = store.find(User, And(User.username == username,
                                 User.state != u'disabled')).one()
+    if user:
+        return user.id, user.salt, user.password
 
-    if not user or not security.check_password(password, user.salt, user.password):
-        log.debug("Login: Invalid credentials")
-        GLSettings.failed_login_attempts += 1
+
+@transact
+def finalize_login(store, user_id, client_using_tor):
+    user = store.find(User, And(User.id == user_id,
+                                User.state != u'disabled')).one()
+    if not user:
         raise errors.InvalidAuthentication
 
     if not client_using_tor and not GLSettings.memory_copy.accept_tor2web_access[user.role]:
@@ -96,6 +109,28 @@ def login(store, username, password, client_using_tor):
     return user.id, user.state, user.role, user.password_change_needed
 
 
+@inlineCallbacks
+def login(username, password, client_using_tor):
+    """
+    login returns a tuple (user_id, state, role, pcn)
+    """
+    user_id, valid = None, False
+
+    credentials = yield get_user_credentials(username)
+    if credentials:
+        user_id, salt, password_hash = credentials
+        valid = yield kdf_pool.check_password(password, salt, password_hash)
+
+    if not valid:
+        log.debug("Login: Invalid credentials")
+        GLSettings.failed_login_attempts += 1
+        raise errors.InvalidAuthentication
+
+    ret = yield finalize_login(user_id, client_using_tor)
+
+    returnValue(ret)
+
+
 class AuthenticationHandler(BaseHandler):
     """
     Login handler for admins and recipents and custodians
@@ -1,33 +1,34 @@
 # -*- encoding: utf-8 -*-
 import base64
-import collections
+import hashlib
+import io
 import json
 import mimetypes
 import os
 import re
 import shutil
+import time
 from datetime import datetime
 
 import types
 from cryptography.hazmat.primitives import constant_time
 
-from twisted.internet import defer
-from twisted.internet.defer import inlineCallbacks
+from twisted.internet import defer, threads
+from twisted.internet.defer import inlineCallbacks, returnValue
 
 from globaleaks.event import track_handler
-from globaleaks.rest import errors, requests
+from globaleaks.rest import apicache, errors, validators
+from globaleaks.rest.staticcache import GLStaticCache, normalize_root
 from globaleaks.security import GLSecureTemporaryFile, directory_traversal_check, generateRandomKey, sha512
 from globaleaks.settings import GLSettings
 from globaleaks.transactions import schedule_email_for_all_admins
 from globaleaks.utils.mailutils import schedule_exception_email
+from globaleaks.utils.multipart import MultipartStream
 from globaleaks.utils.tempdict import TempDict
 from globaleaks.utils.utility import log, deferred_sleep
 
 HANDLER_EXEC_TIME_THRESHOLD = 120
 
-GLUploads = {}
-
-
 class GLSessionsFactory(TempDict):
     """Extends TempDict to provide session management functions ontop of temp session keys"""
 
@@ -40,6 +41,63 @@ class GLSessionsFactory(TempDict):
 
 GLSessions = GLSessionsFactory(timeout=GLSettings.authentication_lifetime)
 
+
+class GLUpload(object):
+    """
+    File uploaded in chunks by flow.js; the chunks may be received in any
+    order and concurrently as each one is written at its own offset.
+
+    The owner is the session or the token that started the upload and is
+    the only one allowed to continue it.
+    """
+    expireCall = None # attached to object by tempDict
+
+    def __init__(self, owner, total_size, total_chunks):
+        self.file = GLSecureTemporaryFile(GLSettings.tmp_upload_path)
+        self.owner = owner
+        self.total_size = total_size
+        self.total_chunks = total_chunks
+        self.chunks = set()
+        self.pending_writes = 0
+
+    def write_chunk(self, chunk_number, offset, chunk):
+        def written(result):
+            self.pending_writes -= 1
+            return result
+
+        self.pending_writes += 1
+        d = threads.deferToThread(write_upload_chunk, self.file, offset, chunk)
+        d.addBoth(written)
+        d.addCallback(lambda _: self.chunks.add(chunk_number))
+        return d
+
+    def is_complete(self):
+        return len(self.chunks) == self.total_chunks
+
+
+class GLUploadsFactory(TempDict):
+    """Extends TempDict to discard the files of the uploads abandoned by the clients"""
+
+    def _expire(self, key):
+        upload = self[key] if key in self else None
+        if upload is not None and upload.pending_writes:
+            # the file of an upload is not discarded while a chunk is written
+            self.set(key, upload)
+        else:
+            TempDict._expire(self, key)
+
+    def expireCallback(self, upload):
+        log.debug("Discarding expired upload of %d bytes", upload.total_size)
+        upload.file.close()
+
+    def complete(self, flow_identifier):
+        upload = self.pop(flow_identifier)
+        upload.expireCall.cancel()
+        return upload
+
+
+GLUploads = GLUploadsFactory(timeout=GLSettings.upload_lifetime)
+
 # https://github.com/globaleaks/GlobaLeaks/issues/1601
 mimetypes.add_type('image/svg+xml', '.svg')
 mimetypes.add_type('application/vnd.ms-fontobject', '.eot')
@@ -48,6 +106,17 @@ mimetypes.add_type('application/woff', '.woff')
 mimetypes.add_type('application/woff2', '.woff2')
 
 
+def write_upload_chunk(upload, offset, chunk):
+    """
+    Write at its offset in the file of an upload the content of one of its
+    chunks
+    """
+    try:
+        upload.write_at(offset, chunk)
+    finally:
+        chunk.close()
+
+
 def write_upload_plaintext_to_disk(uploaded_file, destination):
     """
     @param uploaded_file: uploaded_file data struct
@@ -98,14 +167,18 @@ class StaticFileProducer(object):
 
     @ivar request: The L{IRequest} to write the contents of the file to.
     @ivar fileObject: The file the contents of which to write to the request.
+    @ivar finish: A deferred firing with True if all the bytes requested
+                  have been written and with False if the transfer has been
+                  interrupted.
     """
     bufferSize = GLSettings.file_chunk_size
 
-    def __init__(self, request, filePath):
+    def __init__(self, request, filePath, offset=0, length=None):
         self.finish = defer.Deferred()
         self.request = request
-        self.fileSize = os.stat(filePath).st_size
+        self.fileSize = os.stat(filePath).st_size - offset if length is None else length
         self.fileObject = open(filePath, "rb")
+        self.fileObject.seek(offset)
         self.bytesWritten = 0
 
     def start(self):
@@ -117,12 +190,12 @@ class StaticFileProducer(object):
             return
 
         try:
-            data = self.fileObject.read(self.bufferSize)
+            data = self.fileObject.read(min(self.bufferSize, self.fileSize - self.bytesWritten))
             if data:
                 self.bytesWritten += len(data)
                 self.request.write(data)
 
-            if self.bytesWritten == self.fileSize:
+            if not data or self.bytesWritten == self.fileSize:
                 self.stopProducing()
         except:
             self.stopProducing()
@@ -134,7 +207,45 @@ class StaticFileProducer(object):
             self.request.unregisterProducer()
             self.request.finish()
             self.request = None
-            self.finish.callback(None)
+            self.finish.callback(self.bytesWritten == self.fileSize)
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(value, size):
+    """
+    Parse the value of a Range header (RFC 7233) returning the first and
+    the last byte of the range requested; None is returned for the values
+    not specifying a single valid byte range, served as whole files.
+
+    Raise RangeNotSatisfiable if the range is out of the file.
+    """
+    if value is None or not value.startswith('bytes='):
+        return None
+
+    match = re.match(r'^\s*(\d*)-(\d*)\s*$', value[6:])
+    if match is None or not any(match.groups()):
+        return None
+
+    first, last = match.groups()
+
+    if not first:
+        # suffix range: the last bytes of the file
+        if size == 0 or int(last) == 0:
+            raise RangeNotSatisfiable
+
+        return max(size - int(last), 0), size - 1
+
+    first = int(first)
+    if last and int(last) < first:
+        return None
+
+    if first >= size:
+        raise RangeNotSatisfiable
+
+    return first, min(int(last), size - 1) if last else size - 1
 
 
 class GLSession(object):
@@ -166,18 +277,40 @@ class BaseHandler(object):
     cache_resource = False
     invalidate_cache = False
 
+    # tags of the data a cached resource depends on and of the data modified
+    # by the handler; a handler not specifying the tags invalidates the whole
+    # cache.
+    cache_tags = ()
+    invalidate_cache_tags = ()
+
     def __init__(self, request):
         self.name = type(self).__name__
         self.request = request
         self.request.start_time = datetime.now()
 
     def write(self, chunk):
+        start = time.time()
+
         if isinstance(chunk, (types.DictType, types.ListType)):
             chunk = json.dumps(chunk)
             self.request.setHeader(b'content-type', b'application/json')
 
+        trace = getattr(self.request, 'trace', None)
+        if trace is not None:
+            trace.add_span('serialize', start, time.time() - start)
+            self.set_server_timing()
+
         self.request.write(bytes(chunk))
 
+    def set_server_timing(self):
+        """
+        Send to the administrators the durations of the spans of the trace
+        of the request; it must be called before writing the response.
+        """
+        trace = getattr(self.request, 'trace', None)
+        if trace is not None and self.current_user is not None and self.current_user.user_role == 'admin':
+            self.request.setHeader(b'server-timing', bytes(trace.get_server_timing()))
+
     @staticmethod
     def authentication(f, roles):
         """
@@ -252,150 +385,20 @@ class BaseHandler(object):
             self.request.setHeader("WWW-Authenticate", "Basic realm=\"globaleaks\"")
             raise errors.HTTPAuthenticationRequired()
 
-    @staticmethod
-    def validate_python_type(value, python_type):
-        """
-        Return True if the python class instantiates the specified python_type.
-        """
-        if value is None:
-            return True
-
-        if python_type == requests.SkipSpecificValidation:
-            return True
-
-        if python_type == int:
-            try:
-                int(value)
-                return True
-            except Exception:
-                return False
-
-        if python_type == bool:
-            if value == u'true' or value == u'false':
-                return True
-
-        return isinstance(value, python_type)
-
-    @staticmethod
-    def validate_regexp(value, type):
-        """
-        Return True if the python class matches the given regexp.
-        """
-        try:
-            value = unicode(value)
-        except Exception:
-            return False
-
-        return bool(re.match(type, value))
-
-    @staticmethod
-    def validate_type(value, type):
-        retval = False
-
-        if value is None:
-            log.err("-- Invalid python_type, in [%s] expected %s", value, type)
-
-        # if it's callable, than assumes is a primitive class
-        elif callable(type):
-            retval = BaseHandler.validate_python_type(value, type)
-            if not retval:
-                log.err("-- Invalid python_type, in [%s] expected %s", value, type)
-
-        # value as "{foo:bar}"
-        elif isinstance(type, collections.Mapping):
-            retval = BaseHandler.validate_jmessage(value, type)
-            if not retval:
-                log.err("-- Invalid JSON/dict [%s] expected %s", value, type)
-
-        # regexp
-        elif isinstance(type, str):
-            retval = BaseHandler.validate_regexp(value, type)
-            if not retval:
-                log.err("-- Failed Match in regexp [%s] against %s", value, type)
-
-        # value as "[ type ]"
-        elif isinstance(type, collections.Iterable):
-            # empty list is ok
-            if not value:
-                retval = True
-
-            else:
-                retval = all(BaseHandler.validate_type(x, type[0]) for x in value)
-                if not retval:
-                    log.err("-- List validation failed [%s] of %s", value, type)
-
-        return retval
-
     @staticmethod
     def validate_jmessage(jmessage, message_template):
         """
         Takes a string that represents a JSON messages and checks to see if it
         conforms to the message type it is supposed to be.
 
-        This message must be either a dict or a list. This function may be called
-        recursively to validate sub-parameters that are also go GLType.
+        This message must be either a dict or a list; the template is compiled
+        once in a specialized validator (see rest/validators.py)
 
         message: the message string that should be validated
 
         message_type: the GLType class it should match.
         """
-        if isinstance(message_template, dict):
-            success_check = 0
-            keys_to_strip = []
-            for key, value in jmessage.items():
-                if key not in message_template:
-                    # strip whatever is not validated
-                    #
-                    # reminder: it's not possible to raise an exception for the
-                    # in case more values are present because it's normal that the
-                    # client will send automatically more data.
-                    #
-                    # e.g. the client will always send 'creation_date' attributes of
-                    #      objects and attributes like this are present generally only
-                    #      from the second request on.
-                    #
-                    keys_to_strip.append(key)
-                    continue
-
-                if not BaseHandler.validate_type(value, message_template[key]):
-                    log.err("Received key %s: type validation fail", key)
-                    raise errors.InvalidInputFormat("Key (%s) type validation failure" % key)
-                success_check += 1
-
-            for key in keys_to_strip:
-                del jmessage[key]
-
-            for key, value in message_template.items():
-                if key not in jmessage:
-                    log.debug("Key %s expected but missing!",  key)
-                    log.debug("Received schema %s - Expected %s",
-                              jmessage.keys(), message_template.keys())
-                    raise errors.InvalidInputFormat("Missing key %s" % key)
-
-                if not BaseHandler.validate_type(jmessage[key], value):
-                    log.err("Expected key: %s type validation failure", key)
-                    raise errors.InvalidInputFormat("Key (%s) double validation failure" % key)
-
-                if isinstance(message_template[key], dict) or isinstance(message_template[key], list):
-                    if message_template[key]:
-                        BaseHandler.validate_jmessage(jmessage[key], message_template[key])
-
-                success_check += 1
-
-            if success_check != len(message_template) * 2:
-                log.err("Success counter double check failure: %d", success_check)
-                raise errors.InvalidInputFormat("Success counter double check failure")
-
-            return True
-
-        elif isinstance(message_template, list):
-            if not all(BaseHandler.validate_type(x, message_template[0]) for x in jmessage):
-                raise errors.InvalidInputFormat("Not every element in %s is %s" %
-                                                (jmessage, message_template[0]))
-            return True
-
-        else:
-            raise errors.InvalidInputFormat("invalid json massage: expected dict or list")
+        return validators.get_validator(message_template)(jmessage)
 
     @staticmethod
     def validate_message(message, message_template):
@@ -422,7 +425,7 @@ class BaseHandler(object):
         if mime_type:
             self.request.setHeader("Content-Type", mime_type)
 
-        return StaticFileProducer(self.request, filepath).start()
+        return self.stream_file(filepath)
 
     def force_file_download(self, filename, filepath):
         if not os.path.exists(filepath) or not os.path.isfile(filepath):
@@ -432,7 +435,46 @@ class BaseHandler(object):
         self.request.setHeader('Content-Type', 'application/octet-stream')
         self.request.setHeader('Content-Disposition', 'attachment; filename=\"%s\"' % filename)
 
-        return StaticFileProducer(self.request, filepath).start()
+        return self.stream_file(filepath)
+
+    def stream_file(self, filepath):
+        """
+        Stream the file or the single byte range requested with the Range
+        header, if still valid according to If-Range.
+
+        Return a deferred firing with True if the transfer reaching the end
+        of the file has been completed.
+        """
+        stat = os.stat(filepath)
+        size = stat.st_size
+        etag = b'"%s"' % hashlib.sha256(b'%d-%d-%d' % (stat.st_ino, size, int(stat.st_mtime * 1000))).hexdigest()
+
+        self.request.setHeader(b'accept-ranges', b'bytes')
+        self.request.setHeader(b'etag', etag)
+
+        byte_range = None
+        if_range = self.request.headers.get('if-range')
+        if if_range is None or if_range.strip() == etag:
+            try:
+                byte_range = parse_range(self.request.headers.get('range'), size)
+            except RangeNotSatisfiable:
+                self.request.setResponseCode(416)
+                self.request.setHeader(b'content-range', b'bytes */%d' % size)
+                self.request.finish()
+                return defer.succeed(False)
+
+        if byte_range is None:
+            first, last = 0, size - 1
+        else:
+            first, last = byte_range
+            self.request.setResponseCode(206)
+            self.request.setHeader(b'content-range', b'bytes %d-%d/%d' % (first, last, size))
+
+        self.request.setHeader(b'content-length', b'%d' % (last - first + 1))
+
+        d = StaticFileProducer(self.request, filepath, first, last - first + 1).start()
+        d.addCallback(lambda completed: completed and last == size - 1)
+        return d
 
     @property
     def current_user(self):
@@ -468,40 +510,117 @@ class BaseHandler(object):
 
         return GLSessions.get(session_id)
 
-    def get_file_upload(self):
+    def get_flow_argument(self, name, default=None):
+        try:
+            return int(self.request.args[name][0])
+        except KeyError:
+            if default is not None:
+                return default
+        except ValueError:
+            pass
+
+        raise errors.InvalidInputFormat("invalid %s" % name)
+
+    def check_file_upload_chunk(self, owner=None):
+        """
+        Answer the requests of flow.js testing if a chunk has been already
+        received (testChunks) so that an interrupted upload can be resumed;
+        the uploads started by other sessions or tokens are reported as not
+        received
+        """
+        if owner is None:
+            owner = self.current_user.id
+
+        upload = GLUploads.get(self.request.args.get('flowIdentifier', [''])[0])
+
+        if upload is not None and upload.owner == owner and \
+           self.get_flow_argument('flowChunkNumber') in upload.chunks:
+            self.request.setResponseCode(200)
+        else:
+            self.request.setResponseCode(204)
+
+    @inlineCallbacks
+    def get_file_upload(self, owner=None):
+        """
+        Return the file uploaded when its last chunk is received; the upload
+        can be continued only by the owner that started it, by default the
+        session of the current user
+        """
         if 'flowFilename' not in self.request.args:
-            return None
+            returnValue(None)
+
+        if owner is None:
+            owner = self.current_user.id
 
-        total_file_size = int(self.request.args['flowTotalSize'][0])
+        total_file_size = self.get_flow_argument('flowTotalSize')
+        total_chunks = self.get_flow_argument('flowTotalChunks')
+        chunk_number = self.get_flow_argument('flowChunkNumber')
         flow_identifier = self.request.args['flowIdentifier'][0]
 
-        chunk_size = len(self.request.args['file'][0])
-        if ((chunk_size / (1024 * 1024)) > GLSettings.memory_copy.maximum_filesize or
-            (total_file_size / (1024 * 1024)) > GLSettings.memory_copy.maximum_filesize):
-            log.err("File upload request rejected: file too big")
-            raise errors.FileTooBig(GLSettings.memory_copy.maximum_filesize)
+        if isinstance(self.request.content, MultipartStream):
+            # the chunk has been already encrypted on disk while received
+            chunk = self.request.content.take_file()
+            if chunk is None:
+                raise errors.InvalidInputFormat("missing file")
+
+            chunk_size = self.request.content.file_size
+        else:
+            chunk = io.BytesIO(self.request.args['file'][0])
+            chunk_size = len(self.request.args['file'][0])
 
-        if flow_identifier not in GLUploads:
-            GLUploads[flow_identifier] = GLSecureTemporaryFile(GLSettings.tmp_upload_path)
+        try:
+            if ((chunk_size / (1024 * 1024)) > GLSettings.memory_copy.maximum_filesize or
+                (total_file_size / (1024 * 1024)) > GLSettings.memory_copy.maximum_filesize):
+                log.err("File upload request rejected: file too big")
+                raise errors.FileTooBig(GLSettings.memory_copy.maximum_filesize)
+
+            offset = (chunk_number - 1) * self.get_flow_argument('flowChunkSize', 0)
+            if not 0 < chunk_number <= total_chunks or \
+               (chunk_number > 1 and offset == 0) or \
+               offset + chunk_size > total_file_size:
+                raise errors.InvalidInputFormat("invalid chunk")
+        except:
+            chunk.close()
+            raise
 
-        f = GLUploads[flow_identifier]
-        f.write(self.request.args['file'][0])
+        if total_chunks == 1 and isinstance(chunk, GLSecureTemporaryFile):
+            # the file uploaded in a single chunk is used as it is
+            f = chunk
+        else:
+            upload = GLUploads.get(flow_identifier)
+            if upload is None:
+                upload = GLUpload(owner, total_file_size, total_chunks)
+                GLUploads.set(flow_identifier, upload)
+            elif upload.owner != owner:
+                chunk.close()
+                raise errors.ForbiddenOperation()
+            elif upload.total_size != total_file_size or upload.total_chunks != total_chunks:
+                chunk.close()
+                raise errors.InvalidInputFormat("invalid chunk")
 
-        if self.request.args['flowChunkNumber'][0] != self.request.args['flowTotalChunks'][0]:
-            return None
+            yield upload.write_chunk(chunk_number, offset, chunk)
+
+            if GLUploads.get(flow_identifier) is not upload:
+                raise errors.InvalidInputFormat("expired upload")
+
+            # the upload is completed by the last chunk written whatever its number
+            if not upload.is_complete():
+                returnValue(None)
+
+            f = GLUploads.complete(flow_identifier).file
 
         mime_type, encoding = mimetypes.guess_type(self.request.args['flowFilename'][0])
         if mime_type is None:
             mime_type = 'application/octet-stream'
 
-        return {
+        returnValue({
             'name': self.request.args['flowFilename'][0],
             'type': mime_type,
             'size': total_file_size,
             'path': f.filepath,
             'body': f,
             'description': self.request.args.get('description', [''])[0]
-        }
+        })
 
     @inlineCallbacks
     def execution_check(self):
@@ -518,8 +637,13 @@ class BaseHandler(object):
         if self.uniform_answer_time:
             needed_delay = (GLSettings.side_channels_guard - (self.request.execution_time.microseconds / 1000)) / 1000
             if needed_delay > 0:
+                start = time.time()
                 yield deferred_sleep(needed_delay)
 
+                trace = getattr(self.request, 'trace', None)
+                if trace is not None:
+                    trace.add_span('padding', start, time.time() - start)
+
 
 class StaticFileHandler(BaseHandler):
     check_roles = '*'
@@ -528,18 +652,52 @@ class StaticFileHandler(BaseHandler):
     def __init__(self, request, path):
         BaseHandler.__init__(self, request)
 
-        self.root = "%s%s" % (os.path.abspath(path), "/")
+        self.root = normalize_root(path)
 
     def get(self, path):
         if not path:
             path = 'index.html'
 
+        entry = GLStaticCache.get(self.root, path)
+        if entry is not None:
+            return self.write_cache_entry(entry)
+
         abspath = os.path.abspath(os.path.join(self.root, path))
 
         directory_traversal_check(self.root, abspath)
 
-        return self.write_file(abspath)
+        # the files too large to be cached are streamed from the disk
+        d = GLStaticCache.load(self.root, abspath)
+        d.addCallback(lambda entry: self.write_file(abspath) if entry is None else self.write_cache_entry(entry))
+        return d
+
+    def write_cache_entry(self, entry):
+        apicache.write_cache_entry(self.request, entry, '*' in self.check_roles)
 
 
 class AdminStaticFileHandler(StaticFileHandler):
     check_roles = 'admin'
+
+
+class ClientFileHandler(StaticFileHandler):
+    """
+    Handler of the files of the client announcing with the index the API
+    resources requested by the client at startup, so that the browser
+    preloads them in parallel with the scripts instead of requesting them
+    one after the other once the scripts are executed.
+    """
+    def get(self, path):
+        if path in ('', 'index.html'):
+            self.request.setHeader(b'link', self.get_preload_links())
+
+        return StaticFileHandler.get(self, path)
+
+    def get_preload_links(self):
+        # the client requests its translation once it has got the languages
+        # enabled from /public; the language is guessed as the client does
+        # from the language of the browser
+        paths = [b'public']
+        if self.request.language is not None:
+            paths.append(b'l10n/%s' % str(self.request.language))
+
+        return b', '.join(b'<%s>; rel=preload; as=fetch; crossorigin' % path for path in paths)
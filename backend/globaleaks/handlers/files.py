@@ -56,6 +56,14 @@ class FileAdd(BaseHandler):
     check_roles = 'whistleblower'
     handler_exec_time_threshold = 3600
 
+    def get(self):
+        """
+        Request: flow.js testChunks parameters
+        Response: None
+        Errors: InvalidInputFormat
+        """
+        self.check_file_upload_chunk()
+
     @inlineCallbacks
     def post(self):
         """
@@ -65,7 +73,7 @@ class FileAdd(BaseHandler):
         """
         itip_id = yield get_itip_id_by_wbtip_id(self.current_user.user_id)
 
-        uploaded_file = self.get_file_upload()
+        uploaded_file = yield self.get_file_upload()
         if uploaded_file is None:
             return
 
@@ -94,6 +102,16 @@ class FileInstance(BaseHandler):
     handler_exec_time_threshold = 3600
     check_roles = 'unauthenticated'
 
+    def get(self, token_id):
+        """
+        Request: flow.js testChunks parameters
+        Response: None
+        Errors: InvalidInputFormat, TokenFailure
+        """
+        TokenList.get(token_id)
+
+        self.check_file_upload_chunk(token_id)
+
     @inlineCallbacks
     def post(self, token_id):
         """
@@ -106,7 +124,7 @@ class FileInstance(BaseHandler):
 
         log.debug("file upload with token associated: %s" % token)
 
-        uploaded_file = self.get_file_upload()
+        uploaded_file = yield self.get_file_upload(token_id)
         if uploaded_file is None:
             return
 
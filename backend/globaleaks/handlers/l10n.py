@@ -7,7 +7,7 @@ import os
 
 from globaleaks import models
 from globaleaks.handlers.base import BaseHandler
-from globaleaks.orm import transact
+from globaleaks.orm import transact_ro
 from globaleaks.security import directory_traversal_check
 from globaleaks.settings import GLSettings
 from globaleaks.utils.utility import read_json_file
@@ -17,7 +17,7 @@ def langfile_path(lang):
     return os.path.abspath(os.path.join(GLSettings.client_path, 'l10n', '%s.json' % lang))
 
 
-@transact
+@transact_ro
 def get_l10n(store, lang):
     path = langfile_path(lang)
     directory_traversal_check(GLSettings.client_path, path)
@@ -39,6 +39,7 @@ class L10NHandler(BaseHandler):
     """
     check_roles = '*'
     cache_resource = True
+    cache_tags = ('l10n:{lang}',)
 
     def get(self, lang):
         return get_l10n(lang)
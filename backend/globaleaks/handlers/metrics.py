@@ -0,0 +1,81 @@
+# -*- coding: UTF-8
+#
+# metrics
+# *******
+#
+# Implementation of the /metrics handler exporting the metrics of the
+# application to Prometheus
+from twisted.internet.defer import inlineCallbacks, returnValue
+
+from globaleaks import models
+from globaleaks.handlers.base import BaseHandler, GLSessions, GLUploads
+from globaleaks.orm import transact_ro
+from globaleaks.rest import errors
+from globaleaks.settings import GLSettings
+from globaleaks.utils.metrics import Gauge, registry
+from globaleaks.utils.token import TokenList
+
+
+def get_queue_depth(threadpool):
+    # the thread pools executing the tasks synchronously have no queue
+    queue = getattr(threadpool, 'q', None)
+    return queue.qsize() if queue is not None else 0
+
+
+def get_https_workers():
+    supervisor = GLSettings.appstate.process_supervisor
+    return len(supervisor.tls_process_pool) if supervisor is not None else 0
+
+
+orm_queue_depth = registry.register(
+    Gauge('globaleaks_orm_queue_depth',
+          'Transactions waiting for a thread of their pool',
+          ('pool',),
+          lambda: {('rw',): get_queue_depth(GLSettings.orm_tp), ('ro',): get_queue_depth(GLSettings.orm_ro_tp)}))
+
+sessions = registry.register(
+    Gauge('globaleaks_sessions', 'Active sessions', function=lambda: len(GLSessions)))
+
+tokens = registry.register(
+    Gauge('globaleaks_tokens', 'Active submission tokens', function=lambda: len(TokenList)))
+
+uploads = registry.register(
+    Gauge('globaleaks_uploads', 'Uploads in progress', function=lambda: len(GLUploads)))
+
+https_workers = registry.register(
+    Gauge('globaleaks_https_workers', 'Running HTTPS workers', function=get_https_workers))
+
+mail_spool = registry.register(
+    Gauge('globaleaks_mail_spool', 'Mails waiting to be sent'))
+
+
+@transact_ro
+def get_mail_spool_length(store):
+    return store.find(models.Mail).count()
+
+
+class MetricsHandler(BaseHandler):
+    """
+    This handler exports the metrics in the text format of Prometheus to
+    the administrators, and so to the API token, and to the local clients
+    not connecting through Tor or the HTTPS workers
+    """
+    check_roles = '*'
+
+    def is_local_request(self):
+        return not self.request.client_using_tor and \
+               'gl-forwarded-for' not in self.request.headers and \
+               self.request.client_ip in GLSettings.local_hosts
+
+    @inlineCallbacks
+    def get(self):
+        if not self.is_local_request() and \
+           (self.current_user is None or self.current_user.user_role != 'admin'):
+            raise errors.InvalidAuthentication
+
+        mail_spool_length = yield get_mail_spool_length()
+        mail_spool.set(mail_spool_length)
+
+        self.request.setHeader(b'content-type', b'text/plain; version=0.0.4')
+
+        returnValue(registry.render())
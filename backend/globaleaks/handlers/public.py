@@ -13,7 +13,7 @@ from globaleaks.handlers.base import BaseHandler
 from globaleaks.models import l10n
 from globaleaks.models.config import NodeFactory
 from globaleaks.models.l10n import NodeL10NFactory
-from globaleaks.orm import transact
+from globaleaks.orm import transact, transact_ro
 from globaleaks.settings import GLSettings
 from globaleaks.utils.sets import merge_dicts
 from globaleaks.utils.structures import get_localized_values
@@ -388,7 +388,7 @@ def db_get_public_receiver_list(store, language):
     return [serialize_receiver(store, receiver, language, data) for receiver in receivers]
 
 
-@transact
+@transact_ro
 def get_public_resources(store, language):
     return {
         'node': db_serialize_node(store, language),
@@ -401,6 +401,7 @@ def get_public_resources(store, language):
 class PublicResource(BaseHandler):
     check_roles = '*'
     cache_resource = True
+    cache_tags = ('node', 'contexts', 'receivers', 'users', 'questionnaires')
 
     def get(self):
         """
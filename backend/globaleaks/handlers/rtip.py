@@ -19,7 +19,7 @@ from globaleaks.handlers.base import BaseHandler, \
 from globaleaks.handlers.custodian import serialize_identityaccessrequest
 from globaleaks.handlers.submission import serialize_usertip
 from globaleaks.models import serializers
-from globaleaks.orm import transact
+from globaleaks.orm import transact, transact_ro
 from globaleaks.rest import errors, requests
 from globaleaks.settings import GLSettings
 from globaleaks.utils.utility import log, get_expiration, datetime_now, datetime_never, \
@@ -486,12 +486,20 @@ class WhistleblowerFileHandler(BaseHandler):
         if not enable_rc_to_wb_files:
             raise errors.ForbiddenOperation()
 
+    def get(self, tip_id):
+        """
+        Request: flow.js testChunks parameters
+        Response: None
+        Errors: InvalidInputFormat
+        """
+        self.check_file_upload_chunk()
+
     @inlineCallbacks
     def post(self, tip_id):
         """
         Errors: ModelNotFound, ForbiddenOperation
         """
-        uploaded_file = self.get_file_upload()
+        uploaded_file = yield self.get_file_upload()
         if uploaded_file is None:
             return
 
@@ -528,7 +536,7 @@ class WhistleblowerFileInstanceHandler(BaseHandler):
     def access_wbfile(self, store, wbfile):
         pass
 
-    @transact
+    @transact_ro
     def download_wbfile(self, store, user_id, file_id):
         wbfile = store.find(models.WhistleblowerFile,
                             models.WhistleblowerFile.id == file_id).one()
@@ -536,10 +544,16 @@ class WhistleblowerFileInstanceHandler(BaseHandler):
         if wbfile is None or not self.user_can_access(store, wbfile):
             raise errors.FileIdNotFound
 
-        self.access_wbfile(store, wbfile)
-
         return serializers.serialize_wbfile(store, wbfile)
 
+    @transact
+    def register_wbfile_download(self, store, file_id):
+        wbfile = store.find(models.WhistleblowerFile,
+                            models.WhistleblowerFile.id == file_id).one()
+
+        if wbfile is not None:
+            self.access_wbfile(store, wbfile)
+
     @inlineCallbacks
     def get(self, wbfile_id):
         wbfile = yield self.download_wbfile(self.current_user.user_id, wbfile_id)
@@ -548,7 +562,10 @@ class WhistleblowerFileInstanceHandler(BaseHandler):
 
         directory_traversal_check(GLSettings.submission_path, filelocation)
 
-        yield self.force_file_download(wbfile['name'], filelocation)
+        # the download is accounted only once completed
+        completed = yield self.force_file_download(wbfile['name'], filelocation)
+        if completed:
+            yield self.register_wbfile_download(wbfile_id)
 
 
 class RTipWBFileInstanceHandler(WhistleblowerFileInstanceHandler):
@@ -578,7 +595,7 @@ class ReceiverFileDownload(BaseHandler):
     """
     check_roles = 'receiver'
 
-    @transact
+    @transact_ro
     def download_rfile(self, store, user_id, file_id):
         rfile, receiver_id = store.find((models.ReceiverFile, models.ReceiverTip.receiver_id),
                                         models.ReceiverFile.id == file_id,
@@ -588,13 +605,19 @@ class ReceiverFileDownload(BaseHandler):
         if not rfile:
             raise errors.FileIdNotFound
 
+        return serializers.serialize_rfile(store, rfile)
+
+    @transact
+    def register_rfile_download(self, store, user_id, file_id):
+        rfile = store.find(models.ReceiverFile, models.ReceiverFile.id == file_id).one()
+        if rfile is None:
+            return
+
         log.debug("Download of file %s by receiver %s (%d)" %
-                  (rfile.internalfile_id, receiver_id, rfile.downloads))
+                  (rfile.internalfile_id, user_id, rfile.downloads))
 
         rfile.downloads += 1
 
-        return serializers.serialize_rfile(store, rfile)
-
     @inlineCallbacks
     def get(self, rfile_id):
         rfile = yield self.download_rfile(self.current_user.user_id, rfile_id)
@@ -603,7 +626,10 @@ class ReceiverFileDownload(BaseHandler):
 
         directory_traversal_check(GLSettings.submission_path, filelocation)
 
-        yield self.force_file_download(rfile['name'], filelocation)
+        # the download is accounted only once completed
+        completed = yield self.force_file_download(rfile['name'], filelocation)
+        if completed:
+            yield self.register_rfile_download(self.current_user.user_id, rfile_id)
 
 
 class IdentityAccessRequestsCollection(BaseHandler):
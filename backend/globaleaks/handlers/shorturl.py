@@ -1,17 +1,10 @@
 # -*- coding: UTF-8
-from globaleaks import models
 from globaleaks.handlers.base import BaseHandler
-from globaleaks.orm import transact
-from twisted.internet.defer import inlineCallbacks
+from globaleaks.settings import GLSettings
 
 
-@transact
-def translate_shorturl(store, shorturl):
-    shorturl = store.find(models.ShortURL, models.ShortURL.shorturl == shorturl).one()
-    if not shorturl:
-        return '/'
-
-    return shorturl.longurl
+def translate_shorturl(shorturl):
+    return GLSettings.memory_copy.shorturls.get(shorturl, '/')
 
 
 class ShortUrlInstance(BaseHandler):
@@ -20,7 +13,5 @@ class ShortUrlInstance(BaseHandler):
     """
     check_roles = '*'
 
-    @inlineCallbacks
     def get(self, shorturl):
-        longurl = yield translate_shorturl(shorturl)
-        self.redirect(longurl)
+        self.redirect(translate_shorturl(shorturl))
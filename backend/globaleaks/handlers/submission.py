@@ -9,18 +9,20 @@
 import copy
 import json
 from storm.expr import In
+from twisted.internet.defer import inlineCallbacks, returnValue
 
 from globaleaks import models
 from globaleaks.handlers.admin.questionnaire import db_get_questionnaire
 from globaleaks.handlers.base import BaseHandler
 from globaleaks.orm import transact
 from globaleaks.rest import errors, requests
-from globaleaks.security import hash_password, sha256, generateRandomReceipt
+from globaleaks.security import sha256, generateRandomReceipt
 from globaleaks.settings import GLSettings
 from globaleaks.utils.structures import get_localized_values
 from globaleaks.utils.token import TokenList
 from globaleaks.utils.utility import log, get_expiration, \
     datetime_now, datetime_never, datetime_to_ISO8601
+from globaleaks.workers.supervisor import kdf_pool
 
 
 def get_submission_sequence_number(itip):
@@ -261,29 +263,20 @@ def db_create_receivertip(store, receiver, internaltip):
 
     return receivertip.id
 
-def db_create_whistleblowertip(store, internaltip):
+def db_create_whistleblowertip(store, internaltip, receipt_hash):
     """
-    The plaintext receipt is returned only now, and then is
-    stored hashed in the WBtip table
+    The receipt is stored hashed in the WBtip table; the hash is
+    computed before entering the transaction
     """
     log.debug("Creating whistleblowertip")
 
-    receipt = unicode(generateRandomReceipt())
-
     wbtip = models.WhistleblowerTip()
     wbtip.id = internaltip.id
-    wbtip.receipt_hash = hash_password(receipt, GLSettings.memory_copy.private.receipt_salt)
+    wbtip.receipt_hash = unicode(receipt_hash)
     store.add(wbtip)
 
-    return receipt
-
 
-@transact
-def create_whistleblowertip(*args):
-    return db_create_whistleblowertip(*args)[0] # here is exported only the receipt
-
-
-def db_create_submission(store, request, uploaded_files, client_using_tor):
+def db_create_submission(store, request, uploaded_files, client_using_tor, receipt_hash):
     answers = request['answers']
 
     context, questionnaire = store.find((models.Context, models.Questionnaire),
@@ -344,7 +337,7 @@ def db_create_submission(store, request, uploaded_files, client_using_tor):
         log.debug("=> file associated %s|%s (%d bytes)",
                   new_file.name, new_file.content_type, new_file.size)
 
-    receipt = db_create_whistleblowertip(store, submission)
+    db_create_whistleblowertip(store, submission, receipt_hash)
 
     if context.maximum_selectable_receivers > 0 and \
                     len(request['receivers']) > context.maximum_selectable_receivers:
@@ -365,12 +358,25 @@ def db_create_submission(store, request, uploaded_files, client_using_tor):
 
     log.debug("The finalized submission had created %d models.ReceiverTip(s)", rtips_count)
 
-    return {'receipt': receipt}
-
 
 @transact
-def create_submission(store, request, uploaded_files, client_using_tor):
-    return db_create_submission(store, request, uploaded_files, client_using_tor)
+def save_submission(store, request, uploaded_files, client_using_tor, receipt_hash):
+    db_create_submission(store, request, uploaded_files, client_using_tor, receipt_hash)
+
+
+@inlineCallbacks
+def create_submission(request, uploaded_files, client_using_tor):
+    """
+    The plaintext receipt is returned only now, and then is
+    stored hashed in the WBtip table
+    """
+    receipt = unicode(generateRandomReceipt())
+
+    receipt_hash = yield kdf_pool.hash_password(receipt, GLSettings.memory_copy.private.receipt_salt)
+
+    yield save_submission(request, uploaded_files, client_using_tor, receipt_hash)
+
+    returnValue({'receipt': receipt})
 
 
 class SubmissionInstance(BaseHandler):
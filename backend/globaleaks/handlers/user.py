@@ -135,6 +135,7 @@ class UserInstance(BaseHandler):
     """
     check_roles = {'admin', 'receiver', 'custodian'}
     invalidate_cache = True
+    invalidate_cache_tags = ('users', 'receivers')
 
     def get(self):
         """
@@ -6,6 +6,7 @@ from twisted.internet.error import ConnectionRefusedError, DNSLookupError
 from txsocksx.errors import TTLExpired
 
 from globaleaks.settings import GLSettings
+from globaleaks.utils.metrics import job_duration
 from globaleaks.utils.mailutils import schedule_exception_email, extract_exception_traceback_and_send_email
 from globaleaks.utils.utility import log
 
@@ -73,6 +74,8 @@ class BaseJob(task.LoopingCall):
 
         current_run_time = self.end_time - self.start_time
 
+        job_duration.observe(current_run_time / 1000.0, (self.name,))
+
         # discard empty cycles from stats
         if self.mean_time == -1:
             self.mean_time = current_run_time
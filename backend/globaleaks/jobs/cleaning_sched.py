@@ -9,8 +9,8 @@ from globaleaks.handlers.admin.receiver import admin_serialize_receiver
 from globaleaks.handlers.rtip import db_delete_itips, serialize_rtip
 from globaleaks.jobs.base import LoopingJob
 from globaleaks.orm import transact_sync
-from globaleaks.security import overwrite_and_remove
 from globaleaks.settings import GLSettings
+from globaleaks.utils.shredder import Shredder
 from globaleaks.utils.templating import Templating
 from globaleaks.utils.utility import datetime_now, datetime_never, \
     datetime_to_ISO8601
@@ -116,7 +116,19 @@ class CleaningSchedule(LoopingJob):
 
     @transact_sync
     def get_files_to_secure_delete(self, store):
-        return [file_to_delete.filepath for file_to_delete in store.find(models.SecureFileDelete)]
+        files_to_delete = {}
+        for file_to_delete in store.find(models.SecureFileDelete):
+            files_to_delete[file_to_delete.filepath] = (file_to_delete.filepath,
+                                                        file_to_delete.pass_number,
+                                                        file_to_delete.pass_offset)
+
+        return files_to_delete.values()
+
+    @transact_sync
+    def update_file_deletion_progress(self, store, filepath, pass_number, pass_offset):
+        store.find(models.SecureFileDelete,
+                   models.SecureFileDelete.filepath == filepath).set(pass_number=pass_number,
+                                                                     pass_offset=pass_offset)
 
     @transact_sync
     def commit_file_deletion(self, store, filepath):
@@ -125,9 +137,7 @@ class CleaningSchedule(LoopingJob):
     def perform_secure_deletion_of_files(self):
         files_to_delete = self.get_files_to_secure_delete()
 
-        for file_to_delete in files_to_delete:
-            overwrite_and_remove(file_to_delete)
-            self.commit_file_deletion(file_to_delete)
+        Shredder().shred(files_to_delete, self.update_file_deletion_progress, self.commit_file_deletion)
 
     def operation(self):
         self.clean_expired_wbtips()
@@ -8,6 +8,8 @@
 
 import os
 
+from storm.expr import Eq, SQLRaw
+
 from globaleaks import models
 from globaleaks.handlers.admin.receiver import admin_serialize_receiver
 from globaleaks.jobs.base import LoopingJob
@@ -31,7 +33,10 @@ def receiverfile_planning(store):
     """
     receiverfiles_maps = {}
 
-    for ifile in store.find(models.InternalFile, new=True):
+    # the literal allows the use of the partial index on new = 1;
+    # the results are fetched upfront because the index is
+    # updated while the files are processed
+    for ifile in list(store.find(models.InternalFile, Eq(models.InternalFile.new, SQLRaw('1')))):
         if ifile.processing_attempts >= INTERNALFILES_HANDLE_RETRY_MAX:
             ifile.new = False
             log.err("Failed to handle receiverfiles creation for ifile %s (%d retries)",
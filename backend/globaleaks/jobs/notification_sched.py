@@ -3,6 +3,8 @@
 
 import copy
 
+from storm.expr import Eq, SQLRaw
+
 from globaleaks import models
 from globaleaks.handlers.admin.context import admin_serialize_context
 from globaleaks.handlers.admin.node import db_admin_serialize_node
@@ -204,7 +206,10 @@ class MailGenerator(object):
         for trigger in ['ReceiverTip', 'Comment', 'Message', 'ReceiverFile']:
             model = trigger_model_map[trigger]
 
-            elements = store.find(model, new=True)
+            # the literal allows the use of the partial index on new = 1;
+            # the results are fetched upfront because the index is
+            # updated while the elements are processed
+            elements = list(store.find(model, Eq(model.new, SQLRaw('1'))))
             for element in elements:
                 element.new = False
 
@@ -217,7 +222,7 @@ class MailGenerator(object):
 
                 getattr(self, 'process_%s' % trigger)(store, element, data)
 
-            count = elements.count()
+            count = len(elements)
             if count > 0:
                 log.debug("Notification: generated %d notifications of type %s",
                           count, trigger)
@@ -44,7 +44,14 @@ def set_onion_service_info(store, hostname, key):
     priv_fact = PrivateFactory(store)
     priv_fact.set_val(u'tor_onion_key', key)
 
-    GLApiCache.invalidate()
+
+@inlineCallbacks
+def update_onion_service_info(hostname, key):
+    yield set_onion_service_info(hostname, key)
+    yield refresh_memory_variables()
+
+    # the cache is invalidated when the change has been committed
+    GLApiCache.invalidate('node')
 
 
 class OnionService(BaseJob):
@@ -78,8 +85,7 @@ class OnionService(BaseJob):
             def initialization_callback(ret):
                 log.info('Initialization of hidden-service %s completed.', ephs.hostname)
                 if not hostname and not key:
-                    yield set_onion_service_info(ephs.hostname, ephs.private_key)
-                    yield refresh_memory_variables()
+                    yield update_onion_service_info(ephs.hostname, ephs.private_key)
 
             d = ephs.add_to_tor(self.tor_conn.protocol)
             d.addCallback(initialization_callback) # pylint: disable=no-member
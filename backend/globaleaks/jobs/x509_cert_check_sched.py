@@ -28,7 +28,7 @@ class X509CertCheckSchedule(LoopingJob):
     notify_expr_within = 15
     acme_try_renewal = 30
     acme_failures = 0
-    should_restart_https = False
+    should_reload_https = False
 
     def certificate_mail_creation(self, store, expiration_date):
         for user_desc in db_get_admin_users(store):
@@ -72,7 +72,7 @@ class X509CertCheckSchedule(LoopingJob):
                 log.err('ACME certificate renewal failed with: %s', excep)
                 raise
 
-            self.should_restart_https = True
+            self.should_reload_https = True
             self.acme_failures = 0
 
         # Regular certificates expiration checks
@@ -85,7 +85,6 @@ class X509CertCheckSchedule(LoopingJob):
     def operation(self):
         yield self.cert_expiration_checks()
 
-        if self.should_restart_https:
-            self.should_restart_https = False
-            yield GLSettings.appstate.process_supervisor.shutdown()
-            yield GLSettings.appstate.process_supervisor.maybe_launch_https_workers()
+        if self.should_reload_https:
+            self.should_reload_https = False
+            yield GLSettings.appstate.process_supervisor.maybe_reload_https_workers()
@@ -658,6 +658,8 @@ class Anomalies(ModelWithID):
 
 class SecureFileDelete(ModelWithID):
     filepath = Unicode()
+    pass_number = Int(default=0)
+    pass_offset = Int(default=0)
 
 
 # Follow classes used for Many to Many references
@@ -1,22 +1,26 @@
 # -*- coding: UTF-8
 # orm: contains main hooks to storm ORM
 # ******
+import collections
 import sys
 import threading
-
-from datetime import datetime
+import time
 
 from storm import tracer
 from storm.database import create_database
 from storm.databases import sqlite
 from storm.store import Store
 
-from twisted.internet import reactor
+from twisted.internet import defer, reactor
 from twisted.internet.threads import deferToThreadPool
 
 from globaleaks.settings import GLSettings
+from globaleaks.utils import metrics
 from globaleaks.utils.mailutils import schedule_exception_email
-from globaleaks.utils.utility import log, timedelta_to_milliseconds
+from globaleaks.utils.tracing import call_with_trace, get_current_trace, propagate_trace
+from globaleaks.utils.utility import log
+
+TRACK_LAST_N_TRANSACTIONS = 100
 
 
 def get_store():
@@ -30,6 +34,7 @@ class SQLite(sqlite.Database):
         self._filename = uri.database or ":memory:"
         self._timeout = float(uri.options.get("timeout", 30))
         self._foreign_keys = uri.options.get("foreign_keys")
+        self._journal_mode = uri.options.get("journal_mode")
 
     def raw_connect(self):
         raw_connection = sqlite.sqlite.connect(self._filename,
@@ -40,6 +45,13 @@ class SQLite(sqlite.Database):
             raw_connection.execute("PRAGMA foreign_keys = %s" %
                                    (self._foreign_keys,))
 
+        # the journal mode is persistent and is applied only to initialized
+        # databases in order to not interfere with the setup of auto_vacuum
+        if self._journal_mode is not None and \
+           raw_connection.execute("PRAGMA page_count").fetchone()[0]:
+            raw_connection.execute("PRAGMA journal_mode = %s" %
+                                   (self._journal_mode,))
+
         raw_connection.execute("PRAGMA secure_delete = ON")
 
         return raw_connection
@@ -49,6 +61,184 @@ sqlite.SQLite = SQLite
 sqlite.create_from_uri = SQLite
 
 
+class TransactionTracer(object):
+    """
+    Storm tracer counting the statements executed and the time spent
+    in SQL by the transactions running on the current thread; the
+    statements of a nested transaction are accounted also to the outer one.
+    """
+    def __init__(self):
+        self.local = threading.local()
+
+    def records(self):
+        if not hasattr(self.local, 'records'):
+            self.local.records = []
+
+        return self.local.records
+
+    def begin(self):
+        self.records().append({'queries': 0, 'sql_time': 0.0})
+
+    def end(self):
+        return self.records().pop()
+
+    def connection_raw_execute(self, connection, raw_cursor, statement, params):
+        for record in self.records():
+            record['queries'] += 1
+
+        self.local.start_time = time.time()
+
+    def connection_raw_execute_success(self, connection, raw_cursor, statement, params):
+        sql_time = time.time() - self.local.start_time
+        for record in self.records():
+            record['sql_time'] += sql_time
+
+    def connection_raw_execute_error(self, connection, raw_cursor, statement, params, error):
+        self.connection_raw_execute_success(connection, raw_cursor, statement, params)
+
+
+class TransactionStats(object):
+    """
+    Rolling statistics of the transactions executed, kept per transaction
+    over the last TRACK_LAST_N_TRANSACTIONS executions.
+
+    Times are expressed in milliseconds.
+    """
+    metrics = ['queries', 'sql_time', 'lock_wait', 'queue_time', 'duration']
+
+    buckets = {
+        'queries': [1, 2, 5, 10, 20, 50, 100, 500],
+        'time': [1, 5, 10, 50, 100, 500, 1000, 5000, 30000]
+    }
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stats = {}
+
+    def clear(self):
+        with self.lock: # pylint: disable=not-context-manager
+            self.stats = {}
+
+    def add(self, name, sample):
+        with self.lock: # pylint: disable=not-context-manager
+            if name not in self.stats:
+                self.stats[name] = {
+                    'count': 0,
+                    'samples': collections.deque(maxlen=TRACK_LAST_N_TRANSACTIONS)
+                }
+
+            self.stats[name]['count'] += 1
+            self.stats[name]['samples'].append(sample)
+
+    def histogram(self, values, buckets):
+        counts = [0] * (len(buckets) + 1)
+        for value in values:
+            i = 0
+            while i < len(buckets) and value > buckets[i]:
+                i += 1
+            counts[i] += 1
+
+        return [[bucket, count] for bucket, count in zip(buckets + [None], counts)]
+
+    def serialize(self):
+        with self.lock: # pylint: disable=not-context-manager
+            stats = [(name, x['count'], list(x['samples'])) for name, x in self.stats.items()]
+
+        ret = []
+        for name, count, samples in sorted(stats):
+            entry = {
+                'name': name,
+                'count': count
+            }
+
+            for metric in self.metrics:
+                values = [sample[metric] for sample in samples]
+                entry[metric] = {
+                    'mean': float(sum(values)) / len(values),
+                    'max': max(values),
+                    'histogram': self.histogram(values, self.buckets['queries' if metric == 'queries' else 'time'])
+                }
+
+            ret.append(entry)
+
+        return ret
+
+
+class StorePool(object):
+    """
+    Pool of the stores used by the transactions.
+
+    Every thread keeps its own store, and so its own SQLite connection
+    and page cache, for read-write and for read-only transactions; the
+    stores are reused across transactions and discarded whenever a
+    transaction fails. Nested transactions use a dedicated store.
+
+    reset() causes all the threads to reopen their stores on the next
+    transaction and is meant to be used when the database is replaced.
+    """
+    def __init__(self):
+        self.local = threading.local()
+        self.generation = 0
+
+    def reset(self):
+        self.generation += 1
+
+    def stores(self):
+        if getattr(self.local, 'generation', None) != self.generation:
+            for store in getattr(self.local, 'stores', {}).values():
+                store.close()
+
+            self.local.generation = self.generation
+            self.local.stores = {}
+            self.local.busy = set()
+
+        return self.local.stores
+
+    def acquire(self, readonly):
+        stores = self.stores()
+
+        key = (GLSettings.db_uri, readonly)
+        if key in self.local.busy:
+            store = get_store()
+            if readonly:
+                store.execute("PRAGMA query_only = ON")
+
+            return store
+
+        if key not in stores:
+            store = get_store()
+            if readonly:
+                store.execute("PRAGMA query_only = ON")
+                store.commit()
+
+            stores[key] = store
+
+        self.local.busy.add(key)
+
+        return stores[key]
+
+    def release(self, store, readonly, discard=False):
+        key = (GLSettings.db_uri, readonly)
+        pooled = self.local.stores.get(key) is store
+
+        if pooled:
+            self.local.busy.discard(key)
+
+        if discard or not pooled:
+            if pooled:
+                del self.local.stores[key]
+
+            store.close()
+        else:
+            store.reset()
+
+
+store_pool = StorePool()
+transaction_tracer = TransactionTracer()
+transaction_stats = TransactionStats()
+
+tracer.install_tracer(transaction_tracer)
+
 transact_lock = threading.Lock()
 
 
@@ -56,8 +246,12 @@ class transact(object):
     """
     Class decorator for managing transactions.
     Because Storm sucks.
+
+    Read-write transactions are executed one at a time on GLSettings.orm_tp
+    while holding the transact_lock.
     """
     timelimit = 30000
+    readonly = False
 
     def __init__(self, method):
         self.method = method
@@ -71,7 +265,15 @@ class transact(object):
         return self
 
     def __call__(self, *args, **kwargs):
-        return self.run(self._wrap, self.method, *args, **kwargs)
+        trace = get_current_trace()
+        if trace is None:
+            return self.run(self._wrap, time.time(), self.method, *args, **kwargs)
+
+        d = self.run(call_with_trace, trace, self._wrap, time.time(), self.method, *args, **kwargs)
+        if not isinstance(d, defer.Deferred):
+            return d
+
+        return propagate_trace(d, trace)
 
     def run(self, function, *args, **kwargs):
         return deferToThreadPool(reactor,
@@ -80,38 +282,96 @@ class transact(object):
                                  *args,
                                  **kwargs)
 
-    def _wrap(self, function, *args, **kwargs):
+    def _wrap(self, submission_time, function, *args, **kwargs):
         """
         Wrap provided function calling it inside a thread and
         passing the store to it.
         """
+        wait_time = time.time()
         with transact_lock: # pylint: disable=not-context-manager
-            start_time = datetime.now()
-            store = get_store()
+            return self._execute(submission_time, wait_time, function, *args, **kwargs)
 
-            try:
-                if self.instance:
-                    result = function(self.instance, store, *args, **kwargs)
-                else:
-                    result = function(store, *args, **kwargs)
+    def _execute(self, submission_time, wait_time, function, *args, **kwargs):
+        start_time = time.time()
+        transaction_tracer.begin()
+        store = store_pool.acquire(self.readonly)
+        failed = False
 
-                store.commit()
-            except:
+        try:
+            if self.instance:
+                result = function(self.instance, store, *args, **kwargs)
+            else:
+                result = function(store, *args, **kwargs)
+
+            if self.readonly:
+                # flush in order to detect any attempt to write
+                store.flush()
                 store.rollback()
-                raise
             else:
-                return result
-            finally:
-                store.reset()
-                store.close()
+                store.commit()
+        except:
+            failed = True
+            store.rollback()
+            raise
+        else:
+            return result
+        finally:
+            store_pool.release(store, self.readonly, failed)
+
+            record = transaction_tracer.end()
+            duration = (time.time() - start_time) * 1000
+
+            pool = ('ro' if self.readonly else 'rw',)
+            metrics.transaction_queue_time.observe(wait_time - submission_time, pool)
+            metrics.transaction_duration.observe(duration / 1000, pool)
+            if not self.readonly:
+                metrics.transaction_lock_wait.observe(start_time - wait_time)
+
+            trace = get_current_trace()
+            if trace is not None:
+                name = self.method.__name__
+                trace.add_span('queue', submission_time, wait_time - submission_time, name)
+                if not self.readonly:
+                    trace.add_span('lock', wait_time, start_time - wait_time, name)
+                trace.add_span('transaction', start_time, duration / 1000, name)
+                trace.add_span('sql', start_time, record['sql_time'], name)
+
+            transaction_stats.add('%s.%s' % (self.method.__module__, self.method.__name__), {
+                'queries': record['queries'],
+                'sql_time': record['sql_time'] * 1000,
+                'lock_wait': (start_time - wait_time) * 1000,
+                'queue_time': (wait_time - submission_time) * 1000,
+                'duration': duration
+            })
+
+            err_tup = "Query [%s] executed in %.1fms", self.method.__name__, duration
+            if duration > self.timelimit:
+                log.err(*err_tup)
+                schedule_exception_email(*err_tup)
+            else:
+                log.debug(*err_tup)
+
+
+class transact_ro(transact):
+    """
+    Class decorator for managing read-only transactions.
+
+    Read-only transactions are executed concurrently on GLSettings.orm_ro_tp
+    without taking the transact_lock; with the database in WAL mode readers
+    do not wait for the writer and see the last committed snapshot.
+    Any attempt to write from inside a read-only transaction fails.
+    """
+    readonly = True
+
+    def run(self, function, *args, **kwargs):
+        return deferToThreadPool(reactor,
+                                 GLSettings.orm_ro_tp,
+                                 function,
+                                 *args,
+                                 **kwargs)
 
-                duration = timedelta_to_milliseconds(datetime.now() - start_time)
-                err_tup = "Query [%s] executed in %.1fms", self.method.__name__, duration
-                if duration > self.timelimit:
-                    log.err(*err_tup)
-                    schedule_exception_email(*err_tup)
-                else:
-                    log.debug(*err_tup)
+    def _wrap(self, submission_time, function, *args, **kwargs):
+        return self._execute(submission_time, time.time(), function, *args, **kwargs)
 
 
 class transact_sync(transact):
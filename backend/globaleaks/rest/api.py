@@ -6,6 +6,7 @@
 
 import json
 import re
+import time
 import urlparse
 
 from globaleaks import LANGUAGES_SUPPORTED_CODES
@@ -17,7 +18,7 @@ from globaleaks.handlers import exception, \
     files, authentication, token, \
     export, l10n, wizard, \
     base, user, shorturl, \
-    robots
+    robots, metrics
 from globaleaks.handlers.admin import context as admin_context
 from globaleaks.handlers.admin import field as admin_field
 from globaleaks.handlers.admin import files as admin_files
@@ -37,6 +38,10 @@ from globaleaks.handlers.admin import user as admin_user
 from globaleaks.rest import apicache, requests, errors
 from globaleaks.settings import GLSettings
 from globaleaks.utils.mailutils import extract_exception_traceback_and_send_email
+from globaleaks.utils.metrics import track_request
+from globaleaks.utils.tracing import Trace, call_with_trace, save_trace
+from globaleaks.utils.multipart import MultipartStream
+from globaleaks.utils.utility import log
 from twisted.internet import defer
 from twisted.web.resource import Resource
 from twisted.web.server import NOT_DONE_YET
@@ -120,6 +125,8 @@ api_spec = [
     (r'/admin/activities/(summary|details)', admin_statistics.RecentEventsCollection),
     (r'/admin/anomalies', admin_statistics.AnomalyCollection),
     (r'/admin/jobs', admin_statistics.JobsTiming),
+    (r'/admin/transactions', admin_statistics.TransactionsTiming),
+    (r'/admin/cache', admin_statistics.CacheStatistics),
     (r'/admin/l10n/(' + '|'.join(LANGUAGES_SUPPORTED_CODES) + ')', admin_l10n.AdminL10NHandler),
     (r'/admin/files/(logo|favicon|css|homepage|script)', admin_files.FileInstance),
     (r'/admin/config/tls', https.ConfigHandler),
@@ -139,15 +146,57 @@ api_spec = [
 
     ## Special Files Handlers##
     (r'/robots.txt', robots.RobotstxtHandler),
+    (r'/metrics', metrics.MetricsHandler),
     (r'/sitemap.xml', robots.SitemapHandler),
     (r'/s/(.+)', base.StaticFileHandler, {'path': GLSettings.static_path}),
     (r'/l10n/(' + '|'.join(LANGUAGES_SUPPORTED_CODES) + ')', l10n.L10NHandler),
 
     ## This handler attempts to route all non routed get requests
-    (r'/([a-zA-Z0-9_\-\/\.]*)', base.StaticFileHandler, {'path': GLSettings.client_path})
+    (r'/([a-zA-Z0-9_\-\/\.]*)', base.ClientFileHandler, {'path': GLSettings.client_path})
 ]
 
 
+def get_first_path_segment(pattern):
+    """
+    Return the literal first path segment that an URI pattern requires
+    or None if the pattern could match any first path segment
+    """
+    match = re.match(r'^\^?/([a-zA-Z0-9_\-]+)(/|\$|$)', pattern)
+    if match is None:
+        return None
+
+    depth = 0
+    for c in pattern:
+        if c == '(':
+            depth += 1
+        elif c == ')':
+            depth -= 1
+        elif c == '|' and depth == 0:
+            return None
+
+    return match.group(1)
+
+
+@defer.inlineCallbacks
+def warmup_cache():
+    """
+    Precompute /public and /l10n/<lang> for every enabled language
+    """
+    for lang in GLSettings.memory_copy.languages_enabled:
+        resources = [
+            ('/public', public.PublicResource, public.get_public_resources),
+            ('/l10n/' + lang, l10n.L10NHandler, l10n.get_l10n)
+        ]
+
+        for resource, handler, f in resources:
+            tags = [tag.format(lang=lang) for tag in handler.cache_tags]
+
+            try:
+                yield apicache.cache_resource(resource, lang, tags, f, lang)
+            except Exception as excep:
+                log.err("Unable to precompute %s for language %s: %s" % (resource, lang, excep))
+
+
 def decorate_method(h, method):
     decorator_authentication = getattr(h, 'authentication')
     value = getattr(h, 'check_roles')
@@ -170,13 +219,23 @@ def decorate_method(h, method):
 
 
 class APIResourceWrapper(Resource):
+    """
+    The patterns of api_spec are evaluated in order and the first matching
+    one is used; in order to not evaluate all the patterns for each request
+    the patterns are grouped by the literal first path segment they require,
+    so that a request is matched only against the patterns of its first path
+    segment and the patterns that could match any path.
+    """
     _registry = None
+    _default_routes = None
     isLeaf = True
     method_map = {'get': 200, 'post': 201, 'put': 202, 'delete': 200}
 
     def __init__(self):
         Resource.__init__(self)
-        self._registry = []
+        self._registry = {}
+
+        routes = []
 
         for tup in api_spec:
             args = {}
@@ -197,7 +256,27 @@ class APIResourceWrapper(Resource):
                     if hasattr(handler, m):
                         decorate_method(handler, m)
 
-            self._registry.append((re.compile(pattern), handler, args))
+            routes.append((get_first_path_segment(pattern), (re.compile(pattern), handler, args)))
+
+        self._default_routes = [route for segment, route in routes if segment is None]
+
+        for segment, _ in routes:
+            if segment is not None and segment not in self._registry:
+                self._registry[segment] = [route for x, route in routes if x in (None, segment)]
+
+    def route(self, path):
+        """
+        Return the match, the handler and the handler arguments for a path
+        """
+        segments = path.split('/', 2)
+        segment = segments[1] if len(segments) > 1 and not segments[0] else None
+
+        for regexp, handler, args in self._registry.get(segment, self._default_routes):
+            match = regexp.match(path)
+            if match:
+                return match, handler, args
+
+        return None, None, None
 
     def should_redirect_tor(self, request):
         if request.client_using_tor and \
@@ -264,6 +343,8 @@ class APIResourceWrapper(Resource):
     def preprocess(self, request):
         request.headers = request.getAllHeaders()
 
+        request.trace = None
+
         request.client_ip = request.headers.get('gl-forwarded-for', None)
         request.client_proto = 'https'
         if request.client_ip is None:
@@ -282,6 +363,9 @@ class APIResourceWrapper(Resource):
 
         self.set_headers(request)
 
+        if isinstance(request.content, MultipartStream):
+            request.args.update(request.content.fields)
+
         if 'multilang' in request.args:
             request.language = None
 
@@ -308,12 +392,7 @@ class APIResourceWrapper(Resource):
             self.redirect_https(request)
             return b''
 
-        match = None
-        for regexp, handler, args in self._registry:
-            match = regexp.match(request.path)
-            if match:
-                break
-
+        match, handler, args = self.route(request.path)
         if match is None:
             self.handle_exception(errors.ResourceNotFound(), request)
             return b''
@@ -330,12 +409,33 @@ class APIResourceWrapper(Resource):
         groups = [unicode(g) for g in match.groups()]
         h = handler(request, **args)
 
-        d = defer.maybeDeferred(f, h, *groups)
+        request.notifyFinish().addBoth(lambda _: track_request(h))
+
+        if GLSettings.tracing:
+            request.trace = Trace(h.name, request.method)
+            request.notifyFinish().addBoth(lambda _: save_trace(request.trace, request.code))
+
+        start_time = time.time()
+
+        if isinstance(request.content, MultipartStream):
+            # the handler is executed once the uploaded file has been written
+            d = request.content.flush()
+            d.addCallback(lambda _: self.call_handler(request, f, h, *groups))
+        else:
+            d = self.call_handler(request, f, h, *groups)
+
+        def trace_handler():
+            if request.trace is not None:
+                request.trace.add_span('handler', start_time, time.time() - start_time)
 
         @defer.inlineCallbacks
         def concludeHandlerFailure(err):
+            trace_handler()
+
             yield h.execution_check()
 
+            h.set_server_timing()
+
             self.handle_exception(err, request)
 
             if not request_finished[0]:
@@ -348,11 +448,18 @@ class APIResourceWrapper(Resource):
 
             @param ret: A `dict`, `list`, `str`, `None` or something unexpected
             """
+            trace_handler()
+
             yield h.execution_check()
 
             if not request_finished[0]:
-                if not ret is None:
+                if isinstance(ret, apicache.GLApiCacheEntry):
+                    h.set_server_timing()
+                    self.write_cache_entry(request, h, ret)
+                elif not ret is None:
                     h.write(ret)
+                else:
+                    h.set_server_timing()
 
                 request.finish()
 
@@ -361,6 +468,17 @@ class APIResourceWrapper(Resource):
 
         return NOT_DONE_YET
 
+    @staticmethod
+    def call_handler(request, f, h, *groups):
+        if request.trace is None:
+            return defer.maybeDeferred(f, h, *groups)
+
+        return call_with_trace(request.trace, defer.maybeDeferred, f, h, *groups)
+
+    @staticmethod
+    def write_cache_entry(request, handler, entry):
+        apicache.write_cache_entry(request, entry, '*' in handler.check_roles)
+
     @staticmethod
     def set_headers(request):
         # to avoid version attacks
@@ -1,51 +1,281 @@
 # -*- encoding: utf-8 -*-
-from twisted.internet import defer
+import hashlib
+import inspect
+import json
+import time
+import zlib
+
+from twisted.internet import defer, reactor
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from globaleaks.utils.utility import log
+
+
+class GLApiCacheEntry(object):
+    """
+    The serialization of a cached resource, ready to be written as it is
+    or compressed, together with its strong ETag
+    """
+    __slots__ = ('data', 'gzip_data', 'br_data', 'etag', 'content_type')
+
+    def __init__(self, value):
+        self.prepare(bytes(json.dumps(value)), b'application/json')
+
+    def prepare(self, data, content_type, gzip=True, br=False):
+        self.data = data
+        self.content_type = content_type
+        self.gzip_data = self.br_data = None
+
+        if gzip:
+            compressor = zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            self.gzip_data = compressor.compress(data) + compressor.flush()
+
+        if br and brotli is not None:
+            self.br_data = brotli.compress(data)
+
+        self.etag = b'"%s"' % hashlib.sha256(data).hexdigest()
 
 
 class GLApiCache(object):
+    """
+    Cache of the resources served by the handlers with cache_resource set.
+
+    Every entry is tagged with the data it depends on (e.g. 'node',
+    'contexts', 'l10n:en') so that a write invalidates only the entries
+    depending on the data it modified.
+    """
     memory_cache_dict = {}
+    memory_cache_tags = {}
+    generation = 0
+
+    # the lists of the requests waiting for a resource being computed
+    inflight = {}
+
+    # the functions precomputing the most requested resources
+    warmup_functions = []
+    warmup_scheduled = False
+
+    stats = {
+        'hits': 0,
+        'misses': 0,
+        'coalesced': 0,
+        'evictions': 0,
+        'warmups': 0,
+        'warmup_time': 0
+    }
 
     @classmethod
     def get(cls, resource, language):
         if resource in cls.memory_cache_dict \
                 and language in cls.memory_cache_dict[resource]:
+            cls.stats['hits'] += 1
             return cls.memory_cache_dict[resource][language]
 
+        cls.stats['misses'] += 1
+
     @classmethod
-    def set(cls, resource, language, value):
+    def set(cls, resource, language, value, tags=()):
         if resource not in GLApiCache.memory_cache_dict:
             cls.memory_cache_dict[resource] = {}
 
         cls.memory_cache_dict[resource][language] = value
 
+        for tag in tags:
+            cls.memory_cache_tags.setdefault(tag, set()).add((resource, language))
+
     @classmethod
-    def invalidate(cls):
-        cls.memory_cache_dict.clear()
+    def invalidate(cls, *tags):
+        """
+        Invalidate the entries depending on any of the tags specified or
+        the whole cache if no tag is specified
+        """
+        cls.generation += 1
 
+        # the resources being computed may be stale and so the requests
+        # arriving from now on should not wait for them
+        cls.inflight.clear()
 
-def decorator_cache_get(f):
-    def decorator_cache_get_wrapper(self, *args, **kwargs):
-        c = GLApiCache.get(self.request.path, self.request.language)
-        if c is None:
-            c = f(self, *args, **kwargs)
-            if isinstance(c, defer.Deferred):
-                def callback(data):
-                    GLApiCache.set(self.request.path, self.request.language, data)
+        cls.schedule_warmup()
+
+        if not tags:
+            cls.stats['evictions'] += sum(len(x) for x in cls.memory_cache_dict.values())
+            cls.memory_cache_dict.clear()
+            cls.memory_cache_tags.clear()
+            return
+
+        for tag in tags:
+            for resource, language in cls.memory_cache_tags.pop(tag, ()):
+                if language in cls.memory_cache_dict.get(resource, {}):
+                    del cls.memory_cache_dict[resource][language]
+                    cls.stats['evictions'] += 1
+
+                    if not cls.memory_cache_dict[resource]:
+                        del cls.memory_cache_dict[resource]
+
+    @classmethod
+    def schedule_warmup(cls):
+        if not cls.warmup_functions or cls.warmup_scheduled:
+            return
+
+        # the invalidation may happen within a transaction thread
+        cls.warmup_scheduled = True
+        reactor.callFromThread(cls.warmup)
+
+    @classmethod
+    @defer.inlineCallbacks
+    def warmup(cls):
+        cls.warmup_scheduled = False
+
+        start = time.time()
+
+        for f in cls.warmup_functions:
+            yield f()
+
+        cls.stats['warmups'] += 1
+        cls.stats['warmup_time'] = int((time.time() - start) * 1000)
+
+        log.info("API cache warm-up completed in %d ms" % cls.stats['warmup_time'])
+
+    @classmethod
+    def get_stats(cls):
+        ret = dict(cls.stats)
+        ret['entries'] = sum(len(x) for x in cls.memory_cache_dict.values())
+        ret['tags'] = sorted(cls.memory_cache_tags.keys())
 
-                    return data
+        return ret
 
-                c.addCallback(callback)
-            else:
-                GLApiCache.set(self.request.path, self.request.language, c)
 
-        return c
+def format_tags(argnames, tags, args, kwargs):
+    """
+    Tags may refer to the arguments of the handler method (e.g. 'l10n:{lang}')
+    """
+    values = dict(zip(argnames, args))
+    values.update(kwargs)
+
+    return [tag.format(**values) for tag in tags]
+
+
+def cache_resource(resource, language, tags, f, *args, **kwargs):
+    """
+    Return the cached serialization of a resource computing it with f if
+    missing; the requests arriving while the resource is being computed
+    wait for the same result.
+    """
+    key = (resource, language)
+
+    c = GLApiCache.get(resource, language)
+    if c is None and key in GLApiCache.inflight:
+        c = defer.Deferred()
+        GLApiCache.inflight[key].append(c)
+        GLApiCache.stats['coalesced'] += 1
+
+    elif c is None:
+        # a resource computed while an invalidation happens may be stale
+        # and so it is returned but not cached
+        generation = GLApiCache.generation
+
+        def set_cache(data):
+            entry = GLApiCacheEntry(data)
+
+            if GLApiCache.generation == generation:
+                GLApiCache.set(resource, language, entry, tags)
+
+            return entry
+
+        c = f(*args, **kwargs)
+        if isinstance(c, defer.Deferred):
+            waiting = GLApiCache.inflight[key] = []
+
+            def notify(result):
+                if GLApiCache.inflight.get(key) is waiting:
+                    del GLApiCache.inflight[key]
+
+                for d in waiting:
+                    d.callback(result)
+
+                return result
+
+            c.addCallback(set_cache)
+            c.addBoth(notify)
+        else:
+            c = set_cache(c)
+
+    return c
+
+
+def decorator_cache_get(f):
+    argnames = inspect.getargspec(f).args[1:]
+
+    def decorator_cache_get_wrapper(self, *args, **kwargs):
+        return cache_resource(self.request.path,
+                              self.request.language,
+                              format_tags(argnames, self.cache_tags, args, kwargs),
+                              f, self, *args, **kwargs)
 
     return decorator_cache_get_wrapper
 
 
 def decorator_cache_invalidate(f):
+    argnames = inspect.getargspec(f).args[1:]
+
     def decorator_cache_invalidate_wrapper(self, *args, **kwargs):
-        GLApiCache.invalidate()
-        return f(self, *args, **kwargs)
+        # the cache is invalidated when the change has been committed
+        tags = format_tags(argnames, self.invalidate_cache_tags, args, kwargs)
+
+        def invalidate(result):
+            GLApiCache.invalidate(*tags)
+            return result
+
+        try:
+            ret = f(self, *args, **kwargs)
+        except:
+            GLApiCache.invalidate(*tags)
+            raise
+
+        if isinstance(ret, defer.Deferred):
+            return ret.addBoth(invalidate)
+
+        return invalidate(ret)
 
     return decorator_cache_invalidate_wrapper
+
+
+def accepted_encodings(request):
+    return [x.split(';')[0].strip() for x in request.headers.get('accept-encoding', '').split(',')]
+
+
+def write_cache_entry(request, entry, public=False):
+    """
+    Write a cached resource answering with 304 when the client already
+    has the current version and preferring the smallest compressed
+    representation accepted by the client.
+    """
+    if public:
+        # public resources may be stored by the client if revalidated
+        request.setHeader(b'cache-control', b'no-cache')
+
+    request.setHeader(b'etag', entry.etag)
+    request.setHeader(b'vary', b'accept-encoding')
+
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        etags = [x.strip() for x in if_none_match.split(',')]
+        if '*' in etags or entry.etag in [x[2:] if x.startswith('W/') else x for x in etags]:
+            request.setResponseCode(304)
+            return
+
+    data = entry.data
+    encodings = accepted_encodings(request)
+    for encoding, encoded_data in [(b'br', entry.br_data), (b'gzip', entry.gzip_data)]:
+        if encoding in encodings and encoded_data is not None and len(encoded_data) < len(data):
+            data = encoded_data
+            request.setHeader(b'content-encoding', encoding)
+            break
+
+    request.setHeader(b'content-type', entry.content_type)
+    request.setHeader(b'content-length', bytes(len(data)))
+    request.write(data)
@@ -0,0 +1,133 @@
+# -*- encoding: utf-8 -*-
+#   staticcache
+#   ***********
+#
+# In-memory cache of the static files served by StaticFileHandler.
+#
+# The files of the client are loaded at startup together with their
+# compressed representations so that they are served without any access to
+# the filesystem; the files exceeding max_file_size are not cached and are
+# streamed from the disk by StaticFileProducer.
+import mimetypes
+import os
+
+from twisted.internet import defer, threads
+
+from globaleaks.rest.apicache import GLApiCacheEntry
+from globaleaks.utils.utility import is_compressible, log
+
+
+def normalize_root(path):
+    return "%s%s" % (os.path.abspath(path), "/")
+
+
+class GLStaticCacheEntry(GLApiCacheEntry):
+    __slots__ = ()
+
+    def __init__(self, data, content_type):
+        compressible = is_compressible(content_type)
+        self.prepare(data, content_type, gzip=compressible, br=compressible)
+
+
+class GLStaticCache(object):
+    """
+    Cache of the static files indexed by the root directory and the path
+    requested; the entries of a root directory are invalidated when its
+    files are modified.
+    """
+    memory_cache_dict = {}
+    generation = 0
+
+    max_file_size = 4 * 1024 * 1024
+
+    @classmethod
+    def get(cls, root, path):
+        return cls.memory_cache_dict.get((root, path))
+
+    @classmethod
+    def set(cls, root, path, entry, generation):
+        # an entry loaded while an invalidation happens may be stale
+        if entry is not None and generation == cls.generation:
+            cls.memory_cache_dict[(root, path)] = entry
+
+        return entry
+
+    @classmethod
+    def invalidate(cls, path=None):
+        """
+        Invalidate the entries of the root directory specified or the whole
+        cache if no directory is specified
+        """
+        cls.generation += 1
+
+        if path is None:
+            cls.memory_cache_dict.clear()
+            return
+
+        root = normalize_root(path)
+        for key in [x for x in cls.memory_cache_dict if x[0] == root]:
+            del cls.memory_cache_dict[key]
+
+    @classmethod
+    def read_file(cls, abspath):
+        """
+        Return the entry for the file or None if the file does not exist or
+        it is too large to be cached
+        """
+        if not os.path.isfile(abspath) or os.stat(abspath).st_size > cls.max_file_size:
+            return None
+
+        with open(abspath, 'rb') as f:
+            data = f.read()
+
+        content_type, _ = mimetypes.guess_type(abspath)
+
+        return GLStaticCacheEntry(data, content_type or 'application/octet-stream')
+
+    @classmethod
+    def read_directory(cls, root):
+        entries = []
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                abspath = os.path.join(dirpath, filename)
+                entry = cls.read_file(abspath)
+                if entry is not None:
+                    entries.append((os.path.relpath(abspath, root), entry))
+
+        return entries
+
+    @classmethod
+    def load(cls, root, abspath):
+        """
+        Load in a thread the file returning a deferred firing with its entry
+        or None; the entry is cached only for the normalized path so that
+        the variants of the same path do not grow the cache.
+        """
+        generation = cls.generation
+
+        d = threads.deferToThread(cls.read_file, abspath)
+        d.addCallback(lambda entry: cls.set(root, os.path.relpath(abspath, root), entry, generation))
+        return d
+
+    @classmethod
+    @defer.inlineCallbacks
+    def preload(cls, path):
+        root = normalize_root(path)
+        generation = cls.generation
+
+        entries = yield threads.deferToThread(cls.read_directory, root)
+
+        for relpath, entry in entries:
+            cls.set(root, relpath, entry, generation)
+
+        log.info("Static cache loaded %d files (%d bytes) from %s" %
+                 (len(entries), sum(len(entry.data) for _, entry in entries), root))
+
+    @classmethod
+    def get_stats(cls):
+        return {
+            'entries': len(cls.memory_cache_dict),
+            'size': sum(len(x.data) +
+                        len(x.gzip_data or b'') +
+                        len(x.br_data or b'') for x in cls.memory_cache_dict.values())
+        }
@@ -0,0 +1,181 @@
+# -*- coding: UTF-8
+#   validators
+#   **********
+#
+# The templates of rest/requests.py compiled into specialized validators.
+#
+# The dispatch on the type of each key of a template and the compilation of
+# its regexps happen once, when the template is compiled, instead of at every
+# validation of a message.
+import collections
+import re
+
+from globaleaks.rest import errors, requests
+from globaleaks.utils.utility import log
+
+
+def compile_python_type(python_type):
+    if python_type == requests.SkipSpecificValidation:
+        return lambda value: True
+
+    if python_type == int:
+        def validate_int(value):
+            try:
+                int(value)
+                return True
+            except Exception:
+                return False
+
+        return validate_int
+
+    if python_type == bool:
+        return lambda value: value == u'true' or value == u'false' or isinstance(value, bool)
+
+    return lambda value: isinstance(value, python_type)
+
+
+def compile_type(template):
+    """
+    Return a function checking that a value matches the template
+    """
+    if callable(template):
+        check = compile_python_type(template)
+
+        def validate_python_type(value):
+            if value is None or not check(value):
+                log.err("-- Invalid python_type, in [%s] expected %s", value, template)
+                return False
+
+            return True
+
+        return validate_python_type
+
+    if isinstance(template, collections.Mapping):
+        validate_message = compile_message(template)
+
+        def validate_mapping(value):
+            if value is None or not isinstance(value, dict):
+                log.err("-- Invalid JSON/dict [%s] expected %s", value, template)
+                return False
+
+            return validate_message(value)
+
+        return validate_mapping
+
+    if isinstance(template, str):
+        regexp = re.compile(template)
+
+        def validate_regexp(value):
+            if value is None:
+                log.err("-- Invalid python_type, in [%s] expected %s", value, template)
+                return False
+
+            try:
+                text = unicode(value)
+            except Exception:
+                text = None
+
+            if text is None or regexp.match(text) is None:
+                log.err("-- Failed Match in regexp [%s] against %s", value, template)
+                return False
+
+            return True
+
+        return validate_regexp
+
+    if isinstance(template, collections.Iterable):
+        validate_item = compile_type(template[0])
+
+        def validate_list(value):
+            if value is None:
+                log.err("-- Invalid python_type, in [%s] expected %s", value, template)
+                return False
+
+            # empty list is ok
+            if value and not all(validate_item(x) for x in value):
+                log.err("-- List validation failed [%s] of %s", value, template)
+                return False
+
+            return True
+
+        return validate_list
+
+    def validate_unknown(value):
+        if value is None:
+            log.err("-- Invalid python_type, in [%s] expected %s", value, template)
+
+        return False
+
+    return validate_unknown
+
+
+def compile_message(template):
+    """
+    Return a function checking that a message matches the template and
+    stripping the keys not present in the template
+    """
+    if isinstance(template, dict):
+        validators = dict((key, compile_type(value)) for key, value in template.items())
+        keys = template.keys()
+
+        def validate_dict(jmessage):
+            if not isinstance(jmessage, dict):
+                raise errors.InvalidInputFormat("invalid json message: expected dict")
+
+            for key, value in jmessage.items():
+                validate = validators.get(key)
+                if validate is None:
+                    # strip whatever is not validated
+                    del jmessage[key]
+                    continue
+
+                if not validate(value):
+                    log.err("Received key %s: type validation fail", key)
+                    raise errors.InvalidInputFormat("Key (%s) type validation failure" % key)
+
+            for key in keys:
+                if key not in jmessage:
+                    log.debug("Key %s expected but missing!", key)
+                    log.debug("Received schema %s - Expected %s", jmessage.keys(), keys)
+                    raise errors.InvalidInputFormat("Missing key %s" % key)
+
+            return True
+
+        return validate_dict
+
+    if isinstance(template, list):
+        validate_item = compile_type(template[0])
+
+        def validate_list(jmessage):
+            if not all(validate_item(x) for x in jmessage):
+                raise errors.InvalidInputFormat("Not every element in %s is %s" %
+                                                (jmessage, template[0]))
+            return True
+
+        return validate_list
+
+    def validate_invalid(jmessage):
+        raise errors.InvalidInputFormat("invalid json massage: expected dict or list")
+
+    return validate_invalid
+
+
+# the compiled validators indexed by the id of their template
+compiled_validators = {}
+
+
+def get_validator(template):
+    entry = compiled_validators.get(id(template))
+    if entry is None or entry[0] is not template:
+        entry = compiled_validators[id(template)] = (template, compile_message(template))
+
+    return entry[1]
+
+
+def compile_requests():
+    for template in vars(requests).values():
+        if isinstance(template, (dict, list)):
+            get_validator(template)
+
+
+compile_requests()
@@ -13,16 +13,21 @@ import random
 import scrypt
 import shutil
 import string
+import struct
+import threading
 import time
 from datetime import datetime
 from gnupg import GPG
 from tempfile import _TemporaryFileWrapper
 
+from cryptography.exceptions import InvalidTag
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import constant_time, hashes
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from globaleaks.rest import errors
 from globaleaks.settings import GLSettings
+from globaleaks.utils.shredder import Shredder
 from globaleaks.utils.utility import log
 
 crypto_backend = default_backend()
@@ -71,59 +76,75 @@ def generate_api_token():
     return token, token_hash
 
 
-def _overwrite(absolutefpath, pattern):
-    filesize = os.path.getsize(absolutefpath)
-    bytecnt = 0
-    with open(absolutefpath, 'w+') as f:
-        f.seek(0)
-        while bytecnt < filesize:
-            f.write(pattern)
-            bytecnt += len(pattern)
-
-
-def overwrite_and_remove(absolutefpath, iterations_number=1):
+def overwrite_and_remove(absolutefpath):
+    """
+    Overwrite the file with all_zeros, all_ones, random patterns and remove it
     """
-    Overwrite the file with all_zeros, all_ones, random patterns
+    Shredder(workers=1, bandwidth=0).shred_file(absolutefpath)
 
-    Note: At each iteration the original size of the file is altered.
+
+class AESGCMChunkCipher(object):
     """
+    Cipher of the files encrypted at rest.
 
-    if random.randint(1, 5) == 3:
-        iterations_number += 1
+    The files are made of a header followed by the plaintext split in chunks
+    of the same size, the last one possibly shorter, each one encrypted with
+    AES-GCM and stored as its own random nonce, the ciphertext and the tag so
+    that any chunk can be decrypted independently of the others.
 
-    log.debug("Starting secure deletion of file %s", absolutefpath)
+    The header, the index of the chunk and whether it is the last one are
+    authenticated with each chunk so that the chunks cannot be reordered nor
+    the file truncated without being detected.
+    """
+    magic = b'GLAESGCM'
+    version = 1
+    header_struct = struct.Struct('>8sBI')
+    chunk_struct = struct.Struct('>QB')
+    nonce_size = 12
+    tag_size = 16
+
+    def __init__(self, key, chunk_size):
+        self.aead = AESGCM(key)
+        self.chunk_size = chunk_size
+        self.encrypted_chunk_size = self.nonce_size + chunk_size + self.tag_size
+        self.header = self.header_struct.pack(self.magic, self.version, chunk_size)
+
+    @classmethod
+    def from_header(cls, key, header):
+        try:
+            magic, version, chunk_size = cls.header_struct.unpack(header)
+        except struct.error:
+            raise IOError("Invalid header of encrypted file")
 
-    try:
-        # in the following loop, the file is open and closed on purpose, to trigger flush operations
-        all_zeros = "\0\0\0\0" * 1024               # 4kb of zeros
-        all_ones = "FFFFFFFF".decode("hex") * 1024  # 4kb of ones
+        if magic != cls.magic or version != cls.version or chunk_size == 0:
+            raise IOError("Invalid header of encrypted file")
 
-        for iteration in range(iterations_number):
-            OPTIMIZATION_RANDOM_BLOCK = 4096 + random.randint(1, 4096)
+        return cls(key, chunk_size)
 
-            random_pattern = ""
-            for _ in range(OPTIMIZATION_RANDOM_BLOCK):
-                random_pattern += str(random.randrange(256))
+    def get_offset(self, index):
+        return self.header_struct.size + index * self.encrypted_chunk_size
 
-            log.debug("Excecuting rewrite iteration (%d out of %d)",
-                      iteration, iterations_number)
+    def get_layout(self, file_size):
+        """
+        Return the number of chunks and the size of the plaintext of a file
+        """
+        data_size = file_size - self.header_struct.size
+        chunks = -(-data_size // self.encrypted_chunk_size)
+        if chunks == 0:
+            raise IOError("Truncated encrypted file")
 
-            _overwrite(absolutefpath, all_zeros)
-            _overwrite(absolutefpath, all_ones)
-            _overwrite(absolutefpath, random_pattern)
+        return chunks, data_size - chunks * (self.nonce_size + self.tag_size)
 
-    except Exception as excep:
-        log.err("Unable to perform secure overwrite for file %s: %s",
-                absolutefpath, excep)
+    def encrypt(self, index, data, last):
+        nonce = os.urandom(self.nonce_size)
+        return nonce + self.aead.encrypt(nonce, data, self.header + self.chunk_struct.pack(index, last))
 
-    finally:
+    def decrypt(self, index, data, last):
         try:
-            os.remove(absolutefpath)
-        except OSError as excep:
-            log.err("Unable to perform unlink operation on file %s: %s",
-                    absolutefpath, excep)
-
-    log.debug("Performed deletion of file: %s", absolutefpath)
+            return self.aead.decrypt(data[:self.nonce_size], data[self.nonce_size:],
+                                     self.header + self.chunk_struct.pack(index, last))
+        except InvalidTag:
+            raise IOError("Integrity error on chunk %d of encrypted file" % index)
 
 
 class GLSecureTemporaryFile(_TemporaryFileWrapper):
@@ -141,7 +162,6 @@ class GLSecureTemporaryFile(_TemporaryFileWrapper):
         self.creation_date = time.time()
 
         self.create_key()
-        self.encryptor_finalized = False
 
         # XXX remind enhance file name with incremental number
         self.filepath = os.path.join(filedir, "%s.aes" % self.key_id)
@@ -149,14 +169,23 @@ class GLSecureTemporaryFile(_TemporaryFileWrapper):
         log.debug("++ Creating %s filetmp", self.filepath)
 
         self.file = open(self.filepath, 'w+b')
+        self.file.write(self.cipher.header)
+        self.file.flush()
 
         # last argument is 'True' because the file has to be deleted on .close()
         _TemporaryFileWrapper.__init__(self, self.file, self.filepath, True)
 
+        self.lock = threading.Lock()
+        self.finalized = False
+        self.buffer = b''
+        self.chunks = 0
+        self.written_chunks = set()
+        self.size = 0
+        self.position = 0
+        self.current_chunk = None
+
     def initialize_cipher(self):
-        self.cipher = Cipher(algorithms.AES(self.key), modes.CTR(self.key_counter_nonce), backend=crypto_backend)
-        self.encryptor = self.cipher.encryptor()
-        self.decryptor = self.cipher.decryptor()
+        self.cipher = AESGCMChunkCipher(self.key, GLSettings.AES_file_chunk_size)
 
     def create_key(self):
         """
@@ -173,18 +202,11 @@ class GLSecureTemporaryFile(_TemporaryFileWrapper):
             self.keypath = os.path.join(GLSettings.ramdisk_path, "%s%s" %
                                         (GLSettings.AES_keyfile_prefix, self.key_id))
 
-        self.key_counter_nonce = os.urandom(GLSettings.AES_counter_nonce)
         self.initialize_cipher()
 
-        key_json = {
-            'key': base64.b64encode(self.key),
-            'key_counter_nonce': base64.b64encode(self.key_counter_nonce)
-        }
-
         log.debug("Key initialization at %s", self.keypath)
 
-        with open(self.keypath, 'w') as kf:
-            json.dump(key_json, kf)
+        write_keyfile(self.keypath, self.key)
 
         if not os.path.isfile(self.keypath):
             log.err("Unable to write keyfile %s", self.keypath)
@@ -194,26 +216,112 @@ class GLSecureTemporaryFile(_TemporaryFileWrapper):
         log.debug("Avoid delete on: %s", self.filepath)
         self.delete = False
 
+    def write_chunk(self, f, index, data, last=False):
+        f.seek(self.cipher.get_offset(index))
+        f.write(self.cipher.encrypt(index, data, last))
+
+    def read_chunk(self, f, index, last=None):
+        """
+        Read and decrypt a chunk; if not specified whether it is the last one
+        the layout of the finalized file is used.
+        """
+        if last is None:
+            last = index == self.chunks - 1
+
+        f.seek(self.cipher.get_offset(index))
+        return self.cipher.decrypt(index, f.read(self.cipher.encrypted_chunk_size), last)
+
+    def write_at(self, offset, chunk):
+        """
+        Encrypt and write at the given offset the content of a file-like
+        object; a new file descriptor is used so that different portions of
+        the file can be written concurrently by different threads.
+
+        The chunks of the cipher only partially covered by the portion are
+        read, updated and encrypted again while holding the lock of the file;
+        until the file is finalized every chunk is stored padded to the size
+        of the chunks. The file descriptor is unbuffered so that a chunk is
+        on disk when the lock is released and the other threads read it.
+        """
+        chunk_size = self.cipher.chunk_size
+        index, skip = divmod(offset, chunk_size)
+
+        with open(self.filepath, 'r+b', 0) as f:
+            data = chunk.read(chunk_size - skip)
+            while data:
+                if skip == 0 and len(data) == chunk_size:
+                    self.write_chunk(f, index, data)
+                    with self.lock:
+                        self.written_chunks.add(index)
+                        self.size = max(self.size, (index + 1) * chunk_size)
+                else:
+                    with self.lock:
+                        if index in self.written_chunks:
+                            plaintext = self.read_chunk(f, index, False)
+                        else:
+                            plaintext = b'\0' * chunk_size
+
+                        self.write_chunk(f, index, plaintext[:skip] + data + plaintext[skip + len(data):])
+                        self.written_chunks.add(index)
+                        self.size = max(self.size, index * chunk_size + skip + len(data))
+
+                index, skip = index + 1, 0
+                data = chunk.read(chunk_size)
+
     def write(self, data):
         """
         The last action is kept track because the internal status
         need to track them. read below read()
         """
-        if self.last_action == 'read':
+        if self.last_action == 'read' or self.finalized:
             raise Exception("Error: Write call performed after read")
 
         self.last_action = 'write'
         if isinstance(data, unicode):
             data = data.encode('utf-8')
 
-        self.file.write(self.encryptor.update(data))
+        buf = self.buffer + data
+        self.size += len(data)
+
+        # the last chunk is kept in the buffer until the file is finalized
+        chunk_size = self.cipher.chunk_size
+        offset = 0
+        while len(buf) - offset > chunk_size:
+            self.write_chunk(self.file, self.chunks, buf[offset:offset + chunk_size])
+            offset += chunk_size
+            self.chunks += 1
+
+        self.buffer = buf[offset:]
+
+    def finalize(self):
+        """
+        Encrypt the last chunk marking it as such and truncate the file to
+        its final size
+        """
+        with self.lock:
+            if self.finalized:
+                return
+
+            self.finalized = True
+
+            index = max(self.size - 1, 0) // self.cipher.chunk_size
+            if index in self.written_chunks:
+                self.file.flush()
+                data = self.read_chunk(self.file, index, False)[:self.size - index * self.cipher.chunk_size]
+            else:
+                data = self.buffer
+
+            self.write_chunk(self.file, index, data, True)
+            self.file.truncate()
+            self.file.flush()
+
+            self.buffer = b''
+            self.chunks = index + 1
 
     def close(self):
         if not self.close_called:
             try:
-                if any(x in self.file.mode for x in 'wa') and not self.encryptor_finalized:
-                    self.encryptor_finalized = True
-                    self.file.write(self.encryptor.finalize())
+                self.finalize()
 
             except Exception:
                 pass
@@ -227,29 +335,94 @@ class GLSecureTemporaryFile(_TemporaryFileWrapper):
         except Exception:
             pass
 
+    def seek(self, offset, whence=0):
+        """
+        Set the position in the plaintext of the next read
+        """
+        if whence == 1:
+            offset += self.position
+        elif whence == 2:
+            offset += self.size
+
+        self.position = max(offset, 0)
+
+    def tell(self):
+        return self.position
+
     def read(self, c=None):
         """
         The first time 'read' is called after a write, seek(0) is performed
         """
         if self.last_action == 'write':
-            if any(x in self.file.mode for x in 'wa') and not self.encryptor_finalized:
-                self.encryptor_finalized = True
-                self.file.write(self.encryptor.finalize())
-
             self.seek(0, 0)  # this is a trick just to misc write and read
-            self.initialize_cipher()
-            self.last_action = 'read'
             log.debug("First seek on %s", self.filepath)
 
-        if c is None:
-            data = self.file.read()
-        else:
-            data = self.file.read(c)
+        self.finalize()
+        self.last_action = 'read'
 
-        if data:
-            return self.decryptor.update(data)
+        remaining = self.size - self.position
+        if c is not None:
+            remaining = min(c, remaining)
 
-        return self.decryptor.finalize()
+        # the chunk being read is kept decrypted as the reads are usually
+        # smaller than the chunks
+        ret = []
+        while remaining > 0:
+            index, skip = divmod(self.position, self.cipher.chunk_size)
+            if self.current_chunk is None or self.current_chunk[0] != index:
+                self.current_chunk = (index, self.read_chunk(self.file, index))
+
+            data = self.current_chunk[1][skip:skip + remaining]
+            ret.append(data)
+            self.position += len(data)
+            remaining -= len(data)
+
+        return b''.join(ret)
+
+    def read_at(self, offset, length, threads=1):
+        """
+        Decrypt the given range of the file; new file descriptors are used so
+        that different ranges can be read concurrently and the chunks of the
+        range are split among the number of threads specified.
+        """
+        self.finalize()
+
+        end = min(offset + length, self.size)
+        if offset >= end:
+            return b''
+
+        first = offset // self.cipher.chunk_size
+        indexes = range(first, (end - 1) // self.cipher.chunk_size + 1)
+        threads = max(1, min(threads, len(indexes)))
+        step = -(-len(indexes) // threads)
+
+        groups = [indexes[i:i + step] for i in range(0, len(indexes), step)]
+        results = [None] * len(groups)
+
+        def read_chunks(i):
+            try:
+                with open(self.filepath, 'rb') as f:
+                    results[i] = b''.join(self.read_chunk(f, index) for index in groups[i])
+            except Exception as excep:
+                results[i] = excep
+
+        workers = [threading.Thread(target=read_chunks, args=(i,)) for i in range(1, len(groups))]
+        for worker in workers:
+            worker.start()
+
+        read_chunks(0)
+
+        for worker in workers:
+            worker.join()
+
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+
+        data = b''.join(results)
+
+        skip = offset - first * self.cipher.chunk_size
+        return data[skip:skip + end - offset]
 
 
 class GLSecureFile(GLSecureTemporaryFile):
@@ -267,6 +440,13 @@ class GLSecureFile(GLSecureTemporaryFile):
 
         self.load_key()
 
+        self.lock = threading.Lock()
+        self.finalized = True
+        self.position = 0
+        self.current_chunk = None
+
+        self.initialize_cipher_from_header()
+
     def load_key(self):
         """
         Load the AES Key to decrypt uploaded file.
@@ -274,18 +454,91 @@ class GLSecureFile(GLSecureTemporaryFile):
         self.keypath = os.path.join(GLSettings.ramdisk_path, ("%s%s" % (GLSettings.AES_keyfile_prefix, self.key_id)))
 
         try:
-            with open(self.keypath, 'r') as kf:
-                key_json = json.load(kf)
+            key_json = read_keyfile(self.keypath)
+            if 'key_counter_nonce' in key_json:
+                migrate_encrypted_file(self.filepath)
+                key_json = read_keyfile(self.keypath)
+
+                # the migrated file replaces the one opened
+                self.file.close()
+                self.file = open(self.filepath, 'r+b')
 
             self.key = base64.b64decode(key_json['key'])
-            self.key_counter_nonce = base64.b64decode(key_json['key_counter_nonce'])
-            self.initialize_cipher()
 
         except Exception as excep:
             # I'm sorry, that file is a dead file!
             log.err("The file %s has been encrypted with a lost/invalid key (%s)", self.keypath, excep.message)
             raise
 
+    def initialize_cipher_from_header(self):
+        self.file.seek(0)
+        self.cipher = AESGCMChunkCipher.from_header(self.key, self.file.read(AESGCMChunkCipher.header_struct.size))
+        self.chunks, self.size = self.cipher.get_layout(os.fstat(self.file.fileno()).st_size)
+
+
+def read_keyfile(keypath):
+    with open(keypath, 'r') as kf:
+        return json.load(kf)
+
+
+def write_keyfile(keypath, key):
+    with open(keypath, 'w') as kf:
+        json.dump({'key': base64.b64encode(key)}, kf)
+
+
+def migrate_encrypted_file(filepath):
+    """
+    Encrypt again in chunks a file encrypted as a single AES-CTR stream, the
+    format used before the introduction of AESGCMChunkCipher.
+
+    The file is encrypted with a new key in a temporary file that replaces
+    the original one only after that the new key has replaced the previous
+    one; a migration interrupted after the replacement of the key is
+    completed by the next one.
+
+    Return True if the file has been migrated.
+    """
+    key_id = os.path.basename(filepath).split('.')[0]
+    keypath = os.path.join(GLSettings.ramdisk_path, "%s%s" % (GLSettings.AES_keyfile_prefix, key_id))
+    tmppath = filepath + '.migrating'
+
+    key_json = read_keyfile(keypath)
+    if 'key_counter_nonce' not in key_json:
+        if not os.path.exists(tmppath):
+            return False
+
+        os.rename(tmppath, filepath)
+        return True
+
+    log.debug("Migrating encrypted file %s", filepath)
+
+    decryptor = Cipher(algorithms.AES(base64.b64decode(key_json['key'])),
+                       modes.CTR(base64.b64decode(key_json['key_counter_nonce'])),
+                       backend=crypto_backend).decryptor()
+
+    key = os.urandom(GLSettings.AES_key_size)
+    cipher = AESGCMChunkCipher(key, GLSettings.AES_file_chunk_size)
+
+    with open(filepath, 'rb') as src, open(tmppath, 'wb') as dst:
+        dst.write(cipher.header)
+
+        index = 0
+        data = decryptor.update(src.read(cipher.chunk_size))
+        while True:
+            next_data = decryptor.update(src.read(cipher.chunk_size))
+            dst.write(cipher.encrypt(index, data, not next_data))
+            if not next_data:
+                break
+
+            data = next_data
+            index += 1
+
+    write_keyfile(keypath + '.migrating', key)
+    os.rename(keypath + '.migrating', keypath)
+    os.rename(tmppath, filepath)
+
+    return True
+
 
 def directory_traversal_check(trusted_absolute_prefix, untrusted_path):
     """
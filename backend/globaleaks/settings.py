@@ -7,6 +7,7 @@ import getpass
 import glob
 import grp
 import logging
+import multiprocessing
 import os
 import pwd
 import re
@@ -70,13 +71,40 @@ class GLSettingsClass(object):
         # daemonize the process
         self.nodaemon = False
 
-        # thread pool size of 1
+        # thread pool size of 1 used by read-write transactions
         self.orm_tp = ThreadPool(1, 1)
 
+        # thread pool used by read-only transactions
+        self.orm_ro_threads = 4
+        self.orm_ro_tp = ThreadPool(1, self.orm_ro_threads, 'orm_ro')
+
+        # number of processes used to compute the scrypt hashes
+        self.kdf_processes = multiprocessing.cpu_count()
+
+        # precompute the public resources after startup and invalidations
+        self.cache_warmup = False
+
         self.bind_address = '0.0.0.0'
         self.bind_remote_ports = [80, 443]
         self.bind_local_ports = [8082, 8083]
 
+        # gzip level of the responses compressed by the HTTPS workers (0 disables the compression)
+        self.https_compression_level = 6
+
+        # seconds after which the keys of the TLS session tickets are rotated
+        self.https_ticket_key_lifetime = 3600
+
+        # number of https workers scaled according to their load between the
+        # minimum and the maximum every https_workers_scaling_interval seconds
+        self.https_workers_min = 1
+        self.https_workers_max = multiprocessing.cpu_count()
+        self.https_workers_scaling_interval = 10
+
+        # load handled by every https worker: open connections and new
+        # connections, and so TLS handshakes, per second
+        self.https_worker_target_connections = 100
+        self.https_worker_target_handshake_rate = 50
+
         # store name
         self.store_name = 'main_store'
 
@@ -85,6 +113,10 @@ class GLSettingsClass(object):
         # debug defaults
         self.orm_debug = False
 
+        # tracing of the requests and fraction of the traces written to the tracefile
+        self.tracing = False
+        self.trace_sample_rate = 0.0
+
         # files and paths
         self.root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
         self.pid_path = '/var/run/globaleaks'
@@ -102,6 +134,9 @@ class GLSettingsClass(object):
 
         self.authentication_lifetime = 3600
 
+        # the uploads not receiving any chunk for this time are discarded
+        self.upload_lifetime = 3600
+
         self.jobs = []
         self.jobs_monitor = None
 
@@ -190,11 +225,17 @@ class GLSettingsClass(object):
 
         self.AES_key_size = 32
         self.AES_key_id_regexp = u'[A-Za-z0-9]{16}'
-        self.AES_counter_nonce = 128 / 8
+        self.AES_file_chunk_size = 64 * 1024
         self.AES_file_regexp = r'(.*)\.aes'
         self.AES_file_regexp_comp = re.compile(self.AES_file_regexp)
         self.AES_keyfile_prefix = "aeskey-"
 
+        # secure deletion of the files
+        self.shredder_workers = 2
+        self.shredder_bandwidth = 64 * 1024 * 1024 # 64MB/s, 0 to disable the limit
+        self.shredder_buffer_size = 1024 * 1024 # 1MB
+        self.shredder_checkpoint_size = 64 * 1024 * 1024 # 64MB
+
         self.exceptions = {}
         self.exceptions_email_count = 0
         self.exceptions_email_hourly_limit = 20
@@ -259,6 +300,7 @@ class GLSettingsClass(object):
 
         self.logfile = os.path.abspath(os.path.join(self.log_path, 'globaleaks.log'))
         self.httplogfile = os.path.abspath(os.path.join(self.log_path, "http.log"))
+        self.tracefile = os.path.abspath(os.path.join(self.log_path, "trace.log"))
 
         # gnupg path is used by PGP as temporary directory with keyring and files encryption.
         self.pgproot = os.path.abspath(os.path.join(self.ramdisk_path, 'gnupg'))
@@ -366,6 +408,11 @@ class GLSettingsClass(object):
 
         self.api_prefix = self.cmdline_options.api_prefix
 
+        self.cache_warmup = self.cmdline_options.cache_warmup
+
+        self.tracing = self.cmdline_options.tracing
+        self.trace_sample_rate = self.cmdline_options.trace_sample_rate
+
         if self.cmdline_options.client_path:
             self.set_client_path(self.cmdline_options.client_path)
 
@@ -524,9 +571,20 @@ class GLSettingsClass(object):
             except Exception as excep:
                 self.print_msg("Error while evaluating removal for %s: %s" % (path, excep))
 
+        # the encrypted files with a valid key are migrated to the current format
+        from globaleaks.security import migrate_encrypted_file
+
+        for f in os.listdir(GLSettings.submission_path):
+            path = os.path.join(GLSettings.submission_path, f)
+            try:
+                if f.endswith('.aes') and migrate_encrypted_file(path):
+                    self.print_msg("Migrated encrypted file: %s" % path)
+            except Exception as excep:
+                self.print_msg("Error while migrating encrypted file %s: %s" % (path, excep))
+
     @staticmethod
     def make_db_uri(db_file_path):
-        return 'sqlite:' + db_file_path + '?foreign_keys=ON'
+        return 'sqlite:' + db_file_path + '?foreign_keys=ON&journal_mode=WAL'
 
     def start_jobs(self):
         from globaleaks.jobs import jobs_list, services_list
@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import json
 import copy
 
 from globaleaks import models
@@ -174,6 +175,7 @@ class TestFieldTemplatesCollection(helpers.TestHandlerWithPopulatedDB):
 
         handler = self.request(role='admin')
         fields = yield handler.get()
+        fields = json.loads(fields.data)
 
         check_ids = [field.get('id') for field in fields]
         self.assertGreater(len(fields), n)
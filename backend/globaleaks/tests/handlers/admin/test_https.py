@@ -10,7 +10,7 @@ from globaleaks.tests import helpers
 from globaleaks.tests.utils import test_tls
 from globaleaks.utils.letsencrypt import ChallTok
 from twisted.internet import reactor
-from twisted.internet.defer import inlineCallbacks, returnValue
+from twisted.internet.defer import inlineCallbacks, returnValue, succeed
 
 
 @transact
@@ -139,11 +139,33 @@ class TestFileHandler(helpers.TestHandler):
         handler = self.request(role='admin')
         for n in ['priv_key', 'cert', 'chain', 'csr']:
             self.assertRaises(errors.FailedSanityCheck, handler.delete, n)
-            self.assertRaises(errors.FailedSanityCheck, handler.put, n)
-            handler = self.request({'name': n, 'content':''}, role='admin')
-            self.assertRaises(errors.FailedSanityCheck, handler.post, n)
             self.assertRaises(errors.FailedSanityCheck, handler.get, n)
 
+    @inlineCallbacks
+    def test_file_res_reload(self):
+        reloads = []
+
+        def maybe_reload_https_workers():
+            reloads.append(True)
+            return succeed(None)
+
+        self.patch(GLSettings.appstate.process_supervisor, 'maybe_reload_https_workers', maybe_reload_https_workers)
+
+        yield https.PrivKeyFileRes.create_file(self.valid_setup['key'])
+        yield self.set_enabled()
+
+        # the changes rejected are not loaded in the https workers
+        handler = self.request({'name': 'cert', 'content': 'bonk bonk bonk'}, role='admin')
+        yield self.assertFailure(handler.post('cert'), errors.ValidationError)
+        self.assertEqual(len(reloads), 0)
+
+        # while the ones accepted are loaded without disabling https
+        for n in ['cert', 'chain']:
+            handler = self.request({'name': n, 'content': self.valid_setup[n]}, role='admin')
+            yield handler.post(n)
+
+        self.assertEqual(len(reloads), 2)
+
 
 class TestConfigHandler(helpers.TestHandler):
     _handler = https.ConfigHandler
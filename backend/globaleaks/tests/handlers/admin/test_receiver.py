@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import json
 import sqlite3
 
 from globaleaks.handlers.admin import receiver
@@ -14,7 +15,7 @@ class TestReceiversCollection(helpers.TestHandlerWithPopulatedDB):
     def test_get(self):
         handler = self.request(role='admin')
         response = yield handler.get()
-        self.assertEqual(len(response), 2)
+        self.assertEqual(len(json.loads(response.data)), 2)
 
 
 class TestReceiverInstance(helpers.TestHandlerWithPopulatedDB):
@@ -3,7 +3,8 @@ from globaleaks import anomaly
 from globaleaks.handlers.admin import statistics
 from globaleaks.jobs.statistics_sched import AnomaliesSchedule, StatisticsSchedule
 from globaleaks.models import Stats
-from globaleaks.orm import transact
+from globaleaks.orm import TransactionStats, transact
+from globaleaks.rest.apicache import GLApiCache
 from globaleaks.tests import helpers
 from twisted.internet.defer import inlineCallbacks
 
@@ -88,3 +89,64 @@ class TestJobsTiming(helpers.TestHandler):
         handler = self.request({}, role='admin')
 
         yield handler.get()
+
+
+class TestTransactionsTiming(helpers.TestHandler):
+    _handler = statistics.TransactionsTiming
+
+    @transact
+    def count_stats_once(self, store):
+        store.find(Stats).count()
+
+    @transact
+    def count_stats_twice(self, store):
+        store.find(Stats).count()
+        store.find(Stats).count()
+
+    @inlineCallbacks
+    def test_get(self):
+        yield self.count_stats_once()
+        yield self.count_stats_twice()
+
+        handler = self.request({}, role='admin')
+
+        response = yield handler.get()
+
+        stats = dict((x['name'].split('.')[-1], x) for x in response)
+        self.assertEqual(stats['count_stats_twice']['queries']['max'],
+                         stats['count_stats_once']['queries']['max'] + 1)
+
+        for k in ['queries', 'sql_time', 'lock_wait', 'queue_time', 'duration']:
+            histogram = stats['count_stats_once'][k]['histogram']
+            self.assertEqual(sum(x[1] for x in histogram), stats['count_stats_once']['count'])
+
+    def test_mean(self):
+        transaction_stats = TransactionStats()
+        for queries in [1, 2]:
+            transaction_stats.add('antani', dict((metric, queries) for metric in TransactionStats.metrics))
+
+        self.assertEqual(transaction_stats.serialize()[0]['queries']['mean'], 1.5)
+
+
+class TestCacheStatistics(helpers.TestHandler):
+    _handler = statistics.CacheStatistics
+
+    @inlineCallbacks
+    def test_get(self):
+        GLApiCache.set('/public', 'en', {}, ['node'])
+        GLApiCache.get('/public', 'en')
+        GLApiCache.get('/public', 'it')
+
+        handler = self.request({}, role='admin')
+        before = yield handler.get()
+
+        GLApiCache.invalidate('node')
+
+        after = yield handler.get()
+
+        self.assertEqual(before['entries'], 1)
+        self.assertEqual(before['tags'], ['node'])
+        self.assertEqual(after['entries'], 0)
+        self.assertEqual(after['evictions'], before['evictions'] + 1)
+        self.assertTrue(before['hits'] >= 1)
+        self.assertTrue(before['misses'] >= 1)
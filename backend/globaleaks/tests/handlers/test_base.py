@@ -1,21 +1,43 @@
 # -*- coding: utf-8 -*-
+import io
 import json
+import os
+import zlib
 
-from globaleaks.handlers.base import BaseHandler, StaticFileHandler
-from globaleaks.rest.errors import InvalidInputFormat, ResourceNotFound
+from globaleaks.handlers.base import BaseHandler, ClientFileHandler, StaticFileHandler, GLUpload, GLUploads, \
+    RangeNotSatisfiable, parse_range
+from globaleaks.rest import validators
+from globaleaks.rest.errors import ForbiddenOperation, InvalidInputFormat, ResourceNotFound
+from globaleaks.rest.staticcache import GLStaticCache
 from globaleaks.settings import GLSettings
 from globaleaks.tests import helpers
-from twisted.internet.defer import inlineCallbacks
+from globaleaks.utils.tracing import Trace
+from twisted.internet import threads
+from twisted.internet.defer import Deferred, gatherResults, inlineCallbacks, returnValue
 
 FUTURE = 100
 
 
+def validate_type(value, type):
+    try:
+        return validators.get_validator({'key': type})({'key': value})
+    except InvalidInputFormat:
+        return False
+
+
 class BaseHandlerMock(BaseHandler):
     check_roles = 'unauthenticated'
 
     def get(self):
         return
 
+class FileDownloadHandlerMock(BaseHandler):
+    check_roles = '*'
+
+    def get(self, path):
+        return self.force_file_download('antani.txt', path)
+
+
 class TestBaseHandler(helpers.TestHandlerWithPopulatedDB):
     _handler = BaseHandlerMock
 
@@ -32,6 +54,22 @@ class TestBaseHandler(helpers.TestHandlerWithPopulatedDB):
         self.assertRaises(InvalidInputFormat,
                           BaseHandler.validate_jmessage, dummy_message, dummy_message_template)
 
+    def test_validate_jmessage_nested(self):
+        template = {'a': {'b': r'^[a-z]+$', 'c': [{'d': int}]}, 'e': bool}
+
+        message = {'a': {'b': 'abc', 'c': [{'d': '1', 'x': 1}], 'y': 1}, 'e': u'true', 'z': 1}
+        self.assertTrue(BaseHandler.validate_jmessage(message, template))
+        self.assertEqual(message, {'a': {'b': 'abc', 'c': [{'d': '1'}]}, 'e': u'true'})
+
+        for message, error in [({'a': {'b': 'ABC', 'c': []}, 'e': True}, 'Key (b) type validation failure'),
+                               ({'a': {'b': 'abc', 'c': [{}]}, 'e': True}, 'Missing key d'),
+                               ({'a': 'abc', 'e': True}, 'Key (a) type validation failure'),
+                               ({'a': {'b': 'abc', 'c': []}, 'e': None}, 'Key (e) type validation failure'),
+                               ({'a': {'b': 'abc', 'c': []}}, 'Missing key e'),
+                               (['a'], 'invalid json message: expected dict')]:
+            e = self.assertRaises(InvalidInputFormat, BaseHandler.validate_jmessage, message, template)
+            self.assertEqual(e.arguments, [error])
+
     def test_validate_message_valid(self):
         dummy_json = json.dumps({'spam': 'ham'})
         dummy_message_template = {'spam': unicode}
@@ -46,30 +84,211 @@ class TestBaseHandler(helpers.TestHandlerWithPopulatedDB):
                           BaseHandler.validate_message, dummy_json, dummy_message_template)
 
     def test_validate_type_valid(self):
-        self.assertTrue(BaseHandler.validate_type('foca', str))
-        self.assertTrue(BaseHandler.validate_type(True, bool))
-        self.assertTrue(BaseHandler.validate_type(4, int))
-        self.assertTrue(BaseHandler.validate_type(u'foca', unicode))
-        self.assertTrue(BaseHandler.validate_type(['foca', 'fessa'], list))
-        self.assertTrue(BaseHandler.validate_type({'foca': 1}, dict))
+        self.assertTrue(validate_type('foca', str))
+        self.assertTrue(validate_type(True, bool))
+        self.assertTrue(validate_type(u'true', bool))
+        self.assertTrue(validate_type(4, int))
+        self.assertTrue(validate_type(u'4', int))
+        self.assertTrue(validate_type(u'foca', unicode))
+        self.assertTrue(validate_type(['foca', 'fessa'], list))
+        self.assertTrue(validate_type({'foca': 1}, dict))
+        self.assertTrue(validate_type([], [int]))
+        self.assertTrue(validate_type([1, 2], [int]))
 
     def test_validate_type_invalid(self):
-        self.assertFalse(BaseHandler.validate_type(1, str))
-        self.assertFalse(BaseHandler.validate_type(1, unicode))
-        self.assertFalse(BaseHandler.validate_type(False, unicode))
-        self.assertFalse(BaseHandler.validate_type({}, list))
-        self.assertFalse(BaseHandler.validate_type(True, dict))
+        self.assertFalse(validate_type(None, dict))
+        self.assertFalse(validate_type(1, str))
+        self.assertFalse(validate_type(1, unicode))
+        self.assertFalse(validate_type(False, unicode))
+        self.assertFalse(validate_type({}, list))
+        self.assertFalse(validate_type(True, dict))
+        self.assertFalse(validate_type(u'foca', int))
+        self.assertFalse(validate_type([1, u'foca'], [int]))
+
+    def test_validate_regexp(self):
+        self.assertTrue(validate_type('Foca', r'\w+'))
+        self.assertFalse(validate_type('Foca', r'\d+'))
+        self.assertFalse(validate_type(None, r'\w+'))
+
+    def test_server_timing(self):
+        for role, expected in [('admin', True), ('receiver', False)]:
+            handler = self.request(role=role)
+            handler.request.trace = Trace('BaseHandlerMock', 'GET')
+            handler.write({'antani': 1})
+
+            self.assertEqual(handler.request.responseHeaders.hasHeader(b'server-timing'), expected)
+
+
+class TestFileUpload(helpers.TestHandler):
+    _handler = BaseHandlerMock
+
+    def start_upload(self, flow_identifier, data, chunk_size, owner='owner'):
+        upload = GLUpload(owner, len(data), (len(data) + chunk_size - 1) / chunk_size)
+        GLUploads.set(flow_identifier, upload)
+        return upload
+
+    def write_chunks(self, upload, data, chunk_size, chunk_numbers):
+        return gatherResults([upload.write_chunk(n, (n - 1) * chunk_size,
+                                                 io.BytesIO(data[(n - 1) * chunk_size:n * chunk_size]))
+                              for n in chunk_numbers])
+
+    @inlineCallbacks
+    def test_write_chunks_out_of_order(self):
+        data = os.urandom(100000)
+        upload = self.start_upload('antani', data, 30000)
+
+        yield self.write_chunks(upload, data, 30000, [4, 2])
+        self.assertFalse(upload.is_complete())
+
+        yield self.write_chunks(upload, data, 30000, [3, 1])
+        self.assertTrue(upload.is_complete())
+
+        f = GLUploads.complete('antani').file
+        self.assertNotIn('antani', GLUploads)
+        self.assertEqual(f.read(), data)
+        f.close()
+
+    def test_expire(self):
+        upload = self.start_upload('antani', b'0123456789', 5)
+
+        self.test_reactor.advance(GLSettings.upload_lifetime)
+
+        self.assertNotIn('antani', GLUploads)
+        self.assertFalse(os.path.exists(upload.file.filepath))
+
+    @inlineCallbacks
+    def test_expire_while_writing(self):
+        data = b'0123456789'
+        upload = self.start_upload('antani', data, 5)
+
+        written = Deferred()
+        self.patch(threads, 'deferToThread', lambda *args: written)
+
+        d = self.write_chunks(upload, data, 5, [1])
+        self.test_reactor.advance(GLSettings.upload_lifetime)
+        self.assertIs(GLUploads['antani'], upload)
+
+        written.callback(None)
+        yield d
+        self.assertEqual(upload.pending_writes, 0)
+
+        self.test_reactor.advance(GLSettings.upload_lifetime)
+        self.assertNotIn('antani', GLUploads)
+        self.assertFalse(os.path.exists(upload.file.filepath))
+
+    @inlineCallbacks
+    def test_check_file_upload_chunk(self):
+        data = b'0123456789'
+        upload = self.start_upload('antani', data, 5)
+        yield self.write_chunks(upload, data, 5, [2])
+
+        for owner, chunk_number, code in [('owner', '1', 204),
+                                          ('owner', '2', 200),
+                                          ('other', '2', 204)]:
+            handler = self.request()
+            handler.request.args = {'flowIdentifier': ['antani'], 'flowChunkNumber': [chunk_number]}
+            handler.check_file_upload_chunk(owner)
+            self.assertEqual(handler.request.responseCode, code)
+
+        GLUploads.delete('antani')
+
+    def post_chunk(self, owner, data, chunk_number):
+        handler = self.request()
+        handler.request.args = {
+            'flowFilename': ['antani.txt'],
+            'flowIdentifier': ['antani'],
+            'flowTotalSize': [str(len(data))],
+            'flowTotalChunks': ['2'],
+            'flowChunkSize': ['5'],
+            'flowChunkNumber': [str(chunk_number)],
+            'file': [data[(chunk_number - 1) * 5:chunk_number * 5]]
+        }
+
+        return helpers.get_file_upload_chunks(handler, owner)
+
+    @inlineCallbacks
+    def test_get_file_upload_of_another_owner(self):
+        data = b'0123456789'
+
+        uploaded_file = yield self.post_chunk('owner', data, 2)
+        self.assertIsNone(uploaded_file)
+        self.assertEqual(GLUploads['antani'].owner, 'owner')
+
+        yield self.assertFailure(self.post_chunk('other', data, 1), ForbiddenOperation)
+
+        uploaded_file = yield self.post_chunk('owner', data, 1)
+        self.assertEqual(uploaded_file['body'].read(), data)
+        uploaded_file['body'].close()
 
-    def test_validate_python_type_valid(self):
-        self.assertTrue(BaseHandler.validate_python_type('foca', str))
-        self.assertTrue(BaseHandler.validate_python_type(True, bool))
-        self.assertTrue(BaseHandler.validate_python_type(4, int))
-        self.assertTrue(BaseHandler.validate_python_type(u'foca', unicode))
-        self.assertTrue(BaseHandler.validate_python_type(None, dict))
 
-    def test_validate_regexp_valid(self):
-        self.assertTrue(BaseHandler.validate_regexp('Foca', '\w+'))
-        self.assertFalse(BaseHandler.validate_regexp('Foca', '\d+'))
+class TestFileDownload(helpers.TestHandler):
+    _handler = FileDownloadHandlerMock
+
+    def setUp(self):
+        helpers.TestHandler.setUp(self)
+
+        self.path = os.path.join(GLSettings.static_path, 'antani.txt')
+        with open(self.path, 'wb') as f:
+            f.write('0123456789')
+
+    def test_parse_range(self):
+        for value, expected in [(None, None),
+                                ('bytes=0-4', (0, 4)),
+                                ('bytes=5-', (5, 9)),
+                                ('bytes=5-100', (5, 9)),
+                                ('bytes=-3', (7, 9)),
+                                ('bytes=-100', (0, 9)),
+                                ('bytes=4-2', None),
+                                ('bytes=0-1,5-6', None),
+                                ('bytes=-', None),
+                                ('items=0-4', None)]:
+            self.assertEqual(parse_range(value, 10), expected)
+
+        for value in ['bytes=10-', 'bytes=-0']:
+            self.assertRaises(RangeNotSatisfiable, parse_range, value, 10)
+
+    @inlineCallbacks
+    def download(self, headers=None):
+        handler = self.request(headers=headers)
+        handler.request.setResponseCode(200)
+        completed = yield handler.get(self.path)
+        returnValue((handler.request, completed))
+
+    @inlineCallbacks
+    def test_get(self):
+        request, completed = yield self.download()
+        self.assertTrue(completed)
+        self.assertEqual(request.responseCode, 200)
+        self.assertEqual(request.getResponseBody(), '0123456789')
+        self.assertEqual(request.responseHeaders.getRawHeaders(b'accept-ranges'), [b'bytes'])
+        self.assertEqual(request.responseHeaders.getRawHeaders(b'content-length'), [b'10'])
+
+    @inlineCallbacks
+    def test_get_range(self):
+        request, completed = yield self.download()
+        etag = request.responseHeaders.getRawHeaders(b'etag')[-1]
+
+        for headers, body, content_range, tail in [
+            ({'Range': 'bytes=0-4'}, '01234', 'bytes 0-4/10', False),
+            ({'Range': 'bytes=5-'}, '56789', 'bytes 5-9/10', True),
+            ({'Range': 'bytes=-3', 'If-Range': etag}, '789', 'bytes 7-9/10', True)
+        ]:
+            request, completed = yield self.download(headers)
+            self.assertEqual(completed, tail)
+            self.assertEqual(request.responseCode, 206)
+            self.assertEqual(request.getResponseBody(), body)
+            self.assertEqual(request.responseHeaders.getRawHeaders(b'content-range'), [content_range])
+
+        # a range of a modified file is not served
+        request, completed = yield self.download({'Range': 'bytes=5-', 'If-Range': '"xxx"'})
+        self.assertTrue(completed)
+        self.assertEqual(request.responseCode, 200)
+        self.assertEqual(request.getResponseBody(), '0123456789')
+
+        request, completed = yield self.download({'Range': 'bytes=10-'})
+        self.assertFalse(completed)
+        self.assertEqual(request.responseCode, 416)
+        self.assertEqual(request.responseHeaders.getRawHeaders(b'content-range'), [b'bytes */10'])
 
 
 class TestStaticFileHandler(helpers.TestHandler):
@@ -91,3 +310,71 @@ class TestStaticFileHandler(helpers.TestHandler):
             return
 
         self.fail('should throw resource not found error')
+
+    @inlineCallbacks
+    def test_get_cached(self):
+        with open(os.path.join(GLSettings.client_path, 'index.html'), 'rb') as f:
+            data = f.read()
+
+        yield GLStaticCache.preload(GLSettings.client_path)
+
+        handler = self.request(kwargs={'path': GLSettings.client_path},
+                               headers={'Accept-Encoding': 'gzip'})
+        yield handler.get('index.html')
+
+        etag = handler.request.responseHeaders.getRawHeaders(b'etag')[-1]
+        self.assertEqual(handler.request.responseHeaders.getRawHeaders(b'content-encoding'), [b'gzip'])
+        self.assertEqual(zlib.decompress(handler.request.getResponseBody(), 16 + zlib.MAX_WBITS), data)
+
+        handler = self.request(kwargs={'path': GLSettings.client_path},
+                               headers={'If-None-Match': etag})
+        yield handler.get('')
+        self.assertEqual(handler.request.responseCode, 304)
+        self.assertEqual(handler.request.getResponseBody(), '')
+
+    @inlineCallbacks
+    def test_get_large_file(self):
+        self.patch(GLStaticCache, 'max_file_size', 0)
+
+        handler = self.request(kwargs={'path': GLSettings.client_path})
+        yield handler.get('index.html')
+        self.assertTrue(handler.request.getResponseBody().startswith('<!doctype html>'))
+        self.assertEqual(handler.request.responseHeaders.getRawHeaders(b'accept-ranges'), [b'bytes'])
+        self.assertEqual(GLStaticCache.get_stats()['entries'], 0)
+
+    @inlineCallbacks
+    def test_invalidate(self):
+        path = os.path.join(GLSettings.static_path, 'antani.txt')
+
+        for content in ['antani', 'sbiriguda']:
+            with open(path, 'wb') as f:
+                f.write(content)
+
+            GLStaticCache.invalidate(GLSettings.static_path)
+
+            for _ in range(2):
+                handler = self.request(kwargs={'path': GLSettings.static_path})
+                yield handler.get('antani.txt')
+                self.assertEqual(handler.request.getResponseBody(), content)
+
+
+class TestClientFileHandler(helpers.TestHandler):
+    _handler = ClientFileHandler
+
+    @inlineCallbacks
+    def test_get_index_preload_links(self):
+        handler = self.request(kwargs={'path': GLSettings.client_path},
+                               headers={'Accept-Language': 'it-IT,it;q=0.8,en;q=0.6'})
+        yield handler.get('')
+
+        self.assertTrue(handler.request.getResponseBody().startswith('<!doctype html>'))
+        self.assertEqual(handler.request.responseHeaders.getRawHeaders(b'link'),
+                         [b'<public>; rel=preload; as=fetch; crossorigin, '
+                          b'<l10n/it>; rel=preload; as=fetch; crossorigin'])
+
+    @inlineCallbacks
+    def test_get_other_files(self):
+        handler = self.request(kwargs={'path': GLSettings.client_path})
+        yield handler.get('js/app.js')
+
+        self.assertFalse(handler.request.responseHeaders.hasHeader(b'link'))
@@ -1,9 +1,14 @@
 # -*- coding: utf-8 -*-
+import json
+
 from globaleaks import handlers
-from globaleaks.handlers import public
+from globaleaks.handlers import l10n, public
+from globaleaks.handlers.admin import l10n as admin_l10n, modelimgs
+from globaleaks.orm import transaction_stats
 from globaleaks.rest.apicache import GLApiCache, decorator_cache_get
+from globaleaks.settings import GLSettings
 from globaleaks.tests import helpers
-from twisted.internet.defer import inlineCallbacks
+from twisted.internet.defer import Deferred, DeferredList, inlineCallbacks
 
 
 class TestGLApiCache(helpers.TestGL):
@@ -27,6 +32,21 @@ class TestGLApiCache(helpers.TestGL):
         GLApiCache.invalidate()
         self.assertEqual(GLApiCache.memory_cache_dict, {})
 
+    def test_invalidate_tags(self):
+        GLApiCache.set("/public", "en", 'public', ['node', 'contexts'])
+        GLApiCache.set("/l10n/en", "en", 'l10n_en', ['l10n:en'])
+        GLApiCache.set("/l10n/it", "en", 'l10n_it', ['l10n:it'])
+
+        GLApiCache.invalidate('contexts')
+        self.assertIsNone(GLApiCache.get("/public", "en"))
+        self.assertEqual(GLApiCache.get("/l10n/en", "en"), 'l10n_en')
+        self.assertEqual(GLApiCache.get("/l10n/it", "en"), 'l10n_it')
+
+        GLApiCache.invalidate('node', 'l10n:it')
+        self.assertEqual(GLApiCache.get("/l10n/en", "en"), 'l10n_en')
+        self.assertIsNone(GLApiCache.get("/l10n/it", "en"))
+        self.assertEqual(GLApiCache.memory_cache_tags.keys(), ['l10n:en'])
+
 
 class TestCacheWithHandlers(helpers.TestHandler):
     _handler = public.PublicResource
@@ -59,6 +79,59 @@ class TestCacheWithHandlers(helpers.TestHandler):
         self.assertEqual(s, 2)
         self.assertNotEqual(resp_fr, cached_resp)
 
+    @inlineCallbacks
+    def test_concurrent_misses_are_coalesced(self):
+        def count():
+            return transaction_stats.stats.get('globaleaks.handlers.public.get_public_resources', {}).get('count', 0)
+
+        yield self.request(uri='https://www.globaleaks.org/public').get()
+
+        GLApiCache.invalidate()
+
+        before = count()
+
+        responses = yield DeferredList([self.request(uri='https://www.globaleaks.org/public').get() for _ in range(200)],
+                                       fireOnOneErrback=True)
+
+        self.assertEqual(count() - before, 1)
+        self.assertEqual(len(set(id(x[1]) for x in responses)), 1)
+        self.assertEqual(GLApiCache.inflight, {})
+
+    @inlineCallbacks
+    def test_warmup(self):
+        from globaleaks.rest import api
+
+        GLApiCache.warmup_functions.append(api.warmup_cache)
+        self.addCleanup(GLApiCache.warmup_functions.remove, api.warmup_cache)
+
+        warmups = GLApiCache.get_stats()['warmups']
+
+        yield GLApiCache.warmup()
+
+        for lang in GLSettings.memory_copy.languages_enabled:
+            self.assertIsNotNone(GLApiCache.get('/public', lang))
+            self.assertIsNotNone(GLApiCache.get('/l10n/' + lang, lang))
+
+        self.assertEqual(GLApiCache.get_stats()['warmups'], warmups + 1)
+
+    @inlineCallbacks
+    def test_warmup_after_invalidation(self):
+        d = Deferred()
+
+        def warmup():
+            d.callback(None)
+
+        GLApiCache.warmup_functions.append(warmup)
+        self.addCleanup(GLApiCache.warmup_functions.remove, warmup)
+
+        GLApiCache.invalidate('node')
+        GLApiCache.invalidate('contexts')
+        self.assertTrue(GLApiCache.warmup_scheduled)
+
+        yield d
+
+        self.assertFalse(GLApiCache.warmup_scheduled)
+
     def test_handler_sync_cache_miss(self):
         # Asserts that the cases where the result of f returns immediately,
         # the caching implementation does not fall over and die.
@@ -76,6 +149,59 @@ class TestCacheWithHandlers(helpers.TestHandler):
         self.assertEqual(resp, second_resp)
 
 
+class TestCacheInvalidationWithHandlers(helpers.TestHandlerWithPopulatedDB):
+    _handler = public.PublicResource
+
+    @inlineCallbacks
+    def fill_cache(self):
+        yield self.request(uri='https://www.globaleaks.org/public').get()
+
+        for lang in [u'en', u'it']:
+            yield self.request(uri='https://www.globaleaks.org/l10n/' + lang,
+                               handler_cls=l10n.L10NHandler).get(lang=lang)
+
+        self.assertIsNotNone(GLApiCache.get('/public', 'en'))
+        self.assertIsNotNone(GLApiCache.get('/l10n/en', 'en'))
+        self.assertIsNotNone(GLApiCache.get('/l10n/it', 'en'))
+
+    @inlineCallbacks
+    def test_picture_upload_keeps_l10n(self):
+        yield self.fill_cache()
+
+        handler = self.request({}, role='admin', handler_cls=modelimgs.ModelImgInstance)
+        yield handler.post('users', self.dummyReceiverUser_1['id'])
+
+        self.assertIsNone(GLApiCache.get('/public', 'en'))
+        self.assertIsNotNone(GLApiCache.get('/l10n/en', 'en'))
+        self.assertIsNotNone(GLApiCache.get('/l10n/it', 'en'))
+
+    @inlineCallbacks
+    def test_custom_texts_update_invalidates_only_its_language(self):
+        yield self.fill_cache()
+
+        handler = self.request({'12345': '54321'}, role='admin', handler_cls=admin_l10n.AdminL10NHandler)
+        yield handler.put(lang=u'it')
+
+        self.assertIsNotNone(GLApiCache.get('/public', 'en'))
+        self.assertIsNotNone(GLApiCache.get('/l10n/en', 'en'))
+        self.assertIsNone(GLApiCache.get('/l10n/it', 'en'))
+
+        response = yield self.request(uri='https://www.globaleaks.org/l10n/it',
+                                      handler_cls=l10n.L10NHandler).get(lang=u'it')
+        self.assertEqual(json.loads(response.data)['12345'], '54321')
+
+    def test_stale_resource_is_not_cached(self):
+        def get(handler):
+            # an invalidation happening while the resource is computed
+            GLApiCache.invalidate('node')
+            return {}
+
+        handler = self.request(uri='https://www.globaleaks.org/xxx', handler_cls=FakeSyncHandler)
+        decorator_cache_get(get)(handler)
+
+        self.assertIsNone(GLApiCache.get('/xxx', 'en'))
+
+
 class FakeSyncHandler(handlers.base.BaseHandler):
     check_roles='*'
 
@@ -1,4 +1,6 @@
 # -*- coding: utf-8 -*-
+import json
+
 from globaleaks.handlers import l10n
 from globaleaks.handlers.admin import l10n as admin_l10n
 from globaleaks.tests import helpers
@@ -16,6 +18,7 @@ class TestL10NHandler(helpers.TestHandler):
     def test_get(self):
         handler = self.request()
         response = yield handler.get(lang=u'en')
+        response = json.loads(response.data)
         self.assertNotIn('12345', response)
 
         self._handler = admin_l10n.AdminL10NHandler
@@ -25,5 +28,6 @@ class TestL10NHandler(helpers.TestHandler):
         self._handler = l10n.L10NHandler
         handler = self.request()
         response = yield handler.get(lang=u'en')
+        response = json.loads(response.data)
         self.assertIn('12345', response)
         self.assertEqual('54321', response['12345'])
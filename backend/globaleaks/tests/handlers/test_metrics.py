@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+from twisted.internet.address import IPv4Address
+from twisted.internet.defer import inlineCallbacks
+
+from globaleaks.handlers import metrics
+from globaleaks.rest import errors
+from globaleaks.tests import helpers
+
+
+class TestMetricsHandler(helpers.TestHandlerWithPopulatedDB):
+    _handler = metrics.MetricsHandler
+
+    @inlineCallbacks
+    def test_get_from_localhost(self):
+        handler = self.request(client_addr=IPv4Address('TCP', '127.0.0.1', 12345))
+
+        response = yield handler.get()
+
+        self.assertIn('# TYPE globaleaks_http_request_duration_seconds histogram\n', response)
+        self.assertIn('globaleaks_orm_queue_depth{pool="rw"} 0.0\n', response)
+        self.assertIn('globaleaks_mail_spool ', response)
+
+    @inlineCallbacks
+    def test_get_as_admin(self):
+        handler = self.request(role='admin')
+
+        response = yield handler.get()
+
+        self.assertIn('globaleaks_sessions ', response)
+
+    @inlineCallbacks
+    def test_get_from_remote_host(self):
+        for role in [None, 'receiver']:
+            handler = self.request(role=role)
+            yield self.assertFailure(handler.get(), errors.InvalidAuthentication)
+
+        # the requests proxied by the HTTPS workers are not local
+        handler = self.request(client_addr=IPv4Address('TCP', '127.0.0.1', 12345),
+                               headers={'gl-forwarded-for': '127.0.0.1'})
+        yield self.assertFailure(handler.get(), errors.InvalidAuthentication)
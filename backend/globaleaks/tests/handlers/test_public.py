@@ -15,4 +15,4 @@ class TestPublicResource(helpers.TestHandlerWithPopulatedDB):
         handler = self.request()
         response = yield handler.get()
 
-        self._handler.validate_message(json.dumps(response), requests.PublicResourcesDesc)
+        self._handler.validate_message(response.data, requests.PublicResourcesDesc)
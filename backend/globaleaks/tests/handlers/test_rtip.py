@@ -4,12 +4,18 @@ from twisted.internet.defer import inlineCallbacks
 from globaleaks import models
 from globaleaks.handlers import rtip
 from globaleaks.jobs.delivery_sched import DeliverySchedule
+from globaleaks.orm import transact
 from globaleaks.rest import errors
 from globaleaks.settings import GLSettings
 from globaleaks.tests import helpers
 from globaleaks.utils.utility import datetime_now, ISO8601_to_datetime
 
 
+@transact
+def get_rfile_downloads(store, rfile_id):
+    return store.find(models.ReceiverFile, models.ReceiverFile.id == rfile_id).one().downloads
+
+
 class TestRTipInstance(helpers.TestHandlerWithPopulatedDB):
     _handler = rtip.RTipInstance
 
@@ -265,6 +271,24 @@ class TestReceiverFileDownload(helpers.TestHandlerWithPopulatedDB):
                 yield handler.get(rfile_desc['id'])
                 self.assertNotEqual(handler.request.getResponseBody(), '')
 
+    @inlineCallbacks
+    def test_get_range(self):
+        yield self.perform_minimal_submission()
+        yield DeliverySchedule().run()
+
+        rtip_descs = yield self.get_rtips()
+        for rtip_desc in rtip_descs:
+            rfiles_desc = yield self.get_rfiles(rtip_desc['id'])
+            for rfile_desc in rfiles_desc:
+                # an interrupted download resumed with a range is accounted once
+                for headers in [{'Range': 'bytes=0-9'}, {'Range': 'bytes=10-'}]:
+                    handler = self.request(role='receiver', user_id=rtip_desc['receiver_id'], headers=headers)
+                    yield handler.get(rfile_desc['id'])
+                    self.assertEqual(handler.request.responseCode, 206)
+
+                downloads = yield get_rfile_downloads(rfile_desc['id'])
+                self.assertEqual(downloads, 1)
+
 
 class TestIdentityAccessRequestsCollection(helpers.TestHandlerWithPopulatedDB):
     _handler = rtip.IdentityAccessRequestsCollection
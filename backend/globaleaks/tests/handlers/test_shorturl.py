@@ -15,8 +15,16 @@ class TestShortUrlInstance(helpers.TestHandlerWithPopulatedDB):
 
         handler = self.request(role='admin')
         yield handler.get(shorturl_desc['shorturl'])
+        self.assertEqual(handler.request.responseHeaders.getRawHeaders(b'location')[0], shorturl_desc['longurl'])
+
+        yield admin_shorturl.delete_shorturl(shorturl_desc['id'])
+
+        handler = self.request(role='admin')
+        yield handler.get(shorturl_desc['shorturl'])
+        self.assertEqual(handler.request.responseHeaders.getRawHeaders(b'location')[0], '/')
 
     @inlineCallbacks
     def test_get_nonexistent_shorturl(self):
         handler = self.request(role='admin')
         yield handler.get(u'/s/nonexistent')
+        self.assertEqual(handler.request.responseHeaders.getRawHeaders(b'location')[0], '/')
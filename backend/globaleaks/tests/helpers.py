@@ -11,7 +11,7 @@ sys.setdefaultencoding('utf8')
 from globaleaks import db, models, security, event, jobs, __version__
 from globaleaks.anomaly import Alarm
 from globaleaks.db.appdata import load_appdata
-from globaleaks.orm import transact
+from globaleaks.orm import store_pool, transact
 from globaleaks.handlers import rtip, wbtip
 from globaleaks.handlers.authentication import db_get_wbtip_by_receipt
 from globaleaks.handlers.base import BaseHandler, GLSessions, new_session, \
@@ -23,6 +23,7 @@ from globaleaks.handlers.admin.questionnaire import get_questionnaire, db_get_qu
 from globaleaks.handlers.admin.user import create_admin_user, create_custodian_user, create_receiver_user
 from globaleaks.handlers.submission import create_submission
 from globaleaks.rest.apicache import GLApiCache
+from globaleaks.rest.staticcache import GLStaticCache
 from globaleaks.rest import errors
 from globaleaks.settings import GLSettings
 from globaleaks.security import GLSecureTemporaryFile
@@ -109,7 +110,10 @@ def init_glsettings_for_unit_tests():
     GLSettings.remove_directories()
     GLSettings.create_directories()
 
+    store_pool.reset()
+
     GLSettings.orm_tp = FakeThreadPool()
+    GLSettings.orm_ro_tp = FakeThreadPool()
 
     GLSettings.memory_copy.hostname = 'localhost'
 
@@ -208,9 +212,11 @@ def get_dummy_file(filename=None, content_type=None, content=None):
         'submission': False
     }
 
-def get_file_upload(self):
+def get_file_upload(self, owner=None):
     return get_dummy_file()
 
+# the tests of the uploads in chunks use the original implementation
+get_file_upload_chunks = BaseHandler.get_file_upload
 BaseHandler.get_file_upload = get_file_upload
 
 
@@ -735,8 +741,9 @@ class TestHandler(TestGLWithPopulatedDB):
         # we need to reset settings.session to keep each test independent
         GLSessions.clear()
 
-        # we need to reset GLApiCache to keep each test independent
+        # we need to reset the caches to keep each test independent
         GLApiCache.invalidate()
+        GLStaticCache.invalidate()
 
     def request(self, body='', uri='https://www.globaleaks.org/',
                 user_id=None,  role=None, multilang=False, headers=None,
@@ -760,11 +767,11 @@ class TestHandler(TestGLWithPopulatedDB):
         x = api.APIResourceWrapper()
         x.preprocess(request)
 
-        if not getattr(handler_cls, 'decorated', False):
+        if not getattr(handler_cls, '_decorated', False):
+            handler_cls._decorated = True
             for method in ['get', 'post', 'put', 'delete']:
                 if getattr(handler_cls, method, None) is not None:
                     api.decorate_method(handler_cls, method)
-                    handler_cls.decorated = True
 
         handler = handler_cls(request, **kwargs)
 
@@ -82,6 +82,27 @@ class TestCleaningSched(helpers.TestGLWithPopulatedDB):
         self.db_test_model_count(store, models.Mail, self.population_of_recipients)
         self.db_test_model_count(store, models.SecureFileDelete, 0)
 
+    @transact
+    def mark_file_for_secure_deletion(self, store, filepath, pass_number, pass_offset):
+        secure_file_delete = models.SecureFileDelete()
+        secure_file_delete.filepath = filepath
+        secure_file_delete.pass_number = pass_number
+        secure_file_delete.pass_offset = pass_offset
+        store.add(secure_file_delete)
+
+    @inlineCallbacks
+    def test_secure_deletion_resumed(self):
+        filepath = os.path.join(GLSettings.submission_path, 'antani')
+        with open(filepath, 'wb') as f:
+            f.write(b'x' * 1000)
+
+        # deletion interrupted during the last pass
+        yield self.mark_file_for_secure_deletion(filepath, 2, 500)
+
+        yield cleaning_sched.CleaningSchedule().run()
+
+        self.assertFalse(os.path.exists(filepath))
+        yield self.test_model_count(models.SecureFileDelete, 0)
 
     @inlineCallbacks
     def test_submission_life(self):
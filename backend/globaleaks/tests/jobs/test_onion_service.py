@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from globaleaks.jobs import onion_service
+from globaleaks.models.config import NodeFactory
+from globaleaks.orm import transact
+from globaleaks.rest.apicache import GLApiCache
+from globaleaks.tests import helpers
+from twisted.internet.defer import inlineCallbacks
+from twisted.python.threadable import isInIOThread
+
+
+class TestOnionService(helpers.TestGL):
+    @transact
+    def get_onion_service(self, store):
+        return NodeFactory(store).get_val(u'onionservice')
+
+    @inlineCallbacks
+    def test_update_onion_service_info(self):
+        invalidated = []
+
+        def invalidate(*tags):
+            invalidated.append((tags, isInIOThread(), self.get_onion_service()))
+
+        self.patch(GLApiCache, 'invalidate', staticmethod(invalidate))
+
+        yield onion_service.update_onion_service_info(u'antani.onion', u'key')
+
+        # the cache is invalidated only once the new onion service is committed
+        self.assertEqual(len(invalidated), 1)
+        tags, in_io_thread, d = invalidated[0]
+        self.assertEqual(tags, ('node',))
+        self.assertTrue(in_io_thread)
+        onionservice = yield d
+        self.assertEqual(onionservice, u'antani.onion')
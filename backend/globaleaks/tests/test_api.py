@@ -1,7 +1,11 @@
 # -*- encoding: utf-8 -*-
+import re
+import zlib
+
 from twisted.internet.address import IPv4Address
 from twisted.internet.defer import inlineCallbacks
 
+from globaleaks.handlers.base import new_session
 from globaleaks.settings import GLSettings
 from globaleaks.tests.helpers import TestGL, forge_request
 
@@ -36,6 +40,44 @@ class TestAPI(TestGL):
                                               'custodian'], check_roles)
             self.assertTrue(len(rest) == 0)
 
+    def test_routing(self):
+        from globaleaks.rest import api
+
+        uuid = '3a4e6f1b-6d2c-4e5a-9a0e-6f2c9f6a1b2c'
+        paths = [
+            '/', '/index.html', '/js/scripts.min.js', '/data/logo.png',
+            '/public', '/authentication', '/receiptauth', '/session', '/preferences',
+            '/token', '/token/' + 'a' * 42, '/s/antani', '/s/antani.txt',
+            '/submission/' + 'a' * 42, '/submission/' + 'a' * 42 + '/file',
+            '/rtip/' + uuid, '/rtip/' + uuid + '/comments', '/rtip/rfile/' + uuid,
+            '/rtip/operations', '/wbtip', '/wbtip/comments', '/wbtip/messages/' + uuid,
+            '/receiver/tips', '/custodian/identityaccessrequest/' + uuid,
+            '/admin/node', '/admin/users/' + uuid + '/img', '/admin/questionnaires/default',
+            '/admin/stats/1', '/admin/staticfiles', '/admin/staticfiles/antani.txt',
+            '/admin/l10n/en', '/admin/config/tls/files/cert', '/admin/antani',
+            '/wizard', '/.well-known/acme-challenge/' + 'a' * 43,
+            '/robots.txt', '/sitemap.xml', '/l10n/en', '/l10n/antani', '/antani/',
+            '/antani?', 'antani', ''
+        ]
+
+        for path in paths:
+            expected = None, None
+            for spec in api.api_spec:
+                pattern = spec[0]
+                if not pattern.startswith("^"):
+                    pattern = "^" + pattern
+
+                if not pattern.endswith("$"):
+                    pattern += "$"
+
+                match = re.match(pattern, path)
+                if match:
+                    expected = match.groups(), spec[1]
+                    break
+
+            match, handler, _ = self.api.route(path)
+            self.assertEqual((match.groups() if match else None, handler), expected, path)
+
     def test_get_with_no_language_header(self):
         request = forge_request()
         self.assertEqual(self.api.detect_language(request), 'en')
@@ -78,6 +120,22 @@ class TestAPI(TestGL):
             self.api.render(request)
             self.assertEqual(request.responseCode, status_code)
 
+    def test_server_timing(self):
+        self.patch(GLSettings, 'tracing', True)
+
+        session = new_session(u'antani', 'admin', 'enabled')
+        request = forge_request('https://www.globaleaks.org/robots.txt', headers={'x-session': session.id})
+        self.api.render(request)
+
+        server_timing = request.responseHeaders.getRawHeaders(b'server-timing')[0]
+        self.assertTrue(server_timing.startswith('handler;dur='))
+        self.assertIn('serialize;dur=', server_timing)
+
+        request = forge_request('https://www.globaleaks.org/robots.txt')
+        self.api.render(request)
+
+        self.assertFalse(request.responseHeaders.hasHeader(b'server-timing'))
+
     def test_request_state(self):
         url = "https://www.globaleaks.org/"
         request = forge_request(url)
@@ -147,3 +205,40 @@ class TestAPI(TestGL):
         self.assertEqual(request.responseCode, 301)
         location = request.responseHeaders.getRawHeaders(b'location')[0]
         self.assertEqual('https://www.globaleaks.org/public', location)
+
+    def test_write_cache_entry(self):
+        from globaleaks.handlers.admin.node import NodeInstance
+        from globaleaks.handlers.public import PublicResource
+        from globaleaks.rest.apicache import GLApiCacheEntry
+
+        entry = GLApiCacheEntry({'antani': 'sbiriguda' * 100})
+
+        def write(handler_cls, headers):
+            request = forge_request(uri='https://www.globaleaks.org/public', headers=headers)
+            self.api.preprocess(request)
+            request.setResponseCode(200)
+            self.api.write_cache_entry(request, handler_cls, entry)
+            return request
+
+        request = write(PublicResource, {})
+        self.assertEqual(request.responseCode, 200)
+        self.assertEqual(request.getResponseBody(), entry.data)
+        self.assertEqual(request.responseHeaders.getRawHeaders(b'etag'), [entry.etag])
+        self.assertEqual(request.responseHeaders.getRawHeaders(b'cache-control')[-1], b'no-cache')
+
+        request = write(PublicResource, {'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual(request.responseHeaders.getRawHeaders(b'content-encoding'), [b'gzip'])
+        self.assertEqual(zlib.decompress(request.getResponseBody(), 16 + zlib.MAX_WBITS), entry.data)
+
+        for if_none_match in [entry.etag, '"xxx", ' + entry.etag, 'W/' + entry.etag, '*']:
+            request = write(PublicResource, {'If-None-Match': if_none_match})
+            self.assertEqual(request.responseCode, 304)
+            self.assertEqual(request.getResponseBody(), '')
+
+        request = write(PublicResource, {'If-None-Match': '"xxx"'})
+        self.assertEqual(request.responseCode, 200)
+        self.assertEqual(request.getResponseBody(), entry.data)
+
+        # private resources must not be stored by the client
+        request = write(NodeInstance, {})
+        self.assertNotEqual(request.responseHeaders.getRawHeaders(b'cache-control')[-1], b'no-cache')
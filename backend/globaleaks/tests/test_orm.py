@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 from globaleaks.models import Counter
-from globaleaks.orm import get_store, transact
+from globaleaks.orm import get_store, store_pool, transact, transact_ro
 from globaleaks.tests import helpers
 from twisted.internet.defer import inlineCallbacks
 
@@ -18,6 +18,7 @@ class TestORM(helpers.TestGL):
         self.assertEqual(store.execute("PRAGMA foreign_keys").get_one()[0], 1)  # ON
         self.assertEqual(store.execute("PRAGMA secure_delete").get_one()[0], 1) # ON
         self.assertEqual(store.execute("PRAGMA auto_vacuum").get_one()[0], 1)   # FULL
+        self.assertEqual(store.execute("PRAGMA journal_mode").get_one()[0], u'wal')
 
     def db_add_config(self, store):
         store.add(Counter({'key': 'antani', 'number': 31337}))
@@ -31,6 +32,23 @@ class TestORM(helpers.TestGL):
         self.db_add_config(store)
         raise Exception("antani")
 
+    @transact_ro
+    def _transact_ro_with_read(self, store):
+        return store.find(Counter).count()
+
+    @transact_ro
+    def _transact_ro_with_write(self, store):
+        self.db_add_config(store)
+
+    @transact
+    def _transact_return_store(self, store):
+        return store
+
+    @transact
+    def _transact_return_store_with_exception(self, store):
+        self.failed_store = store
+        raise Exception("antani")
+
     def test_transaction_pragmas(self):
         return self._transaction_pragmas()
 
@@ -59,3 +77,76 @@ class TestORM(helpers.TestGL):
             self.assertTrue(getattr(store, 'find'))
 
         return transaction()
+
+    @inlineCallbacks
+    def test_transact_ro(self):
+        count = yield self._transact_ro_with_read()
+        self.assertEqual(count, get_store().find(Counter).count())
+
+    @inlineCallbacks
+    def test_transact_ro_with_write(self):
+        store = get_store()
+        count1 = store.find(Counter).count()
+
+        yield self.assertFailure(self._transact_ro_with_write(), Exception)
+
+        count2 = store.find(Counter).count()
+
+        self.assertEqual(count1, count2)
+
+    @inlineCallbacks
+    def test_transact_store_reuse(self):
+        store1 = yield self._transact_return_store()
+        store2 = yield self._transact_return_store()
+        self.assertIs(store1, store2)
+
+        yield self.assertFailure(self._transact_return_store_with_exception(), Exception)
+        self.assertIs(self.failed_store, store2)
+
+        store3 = yield self._transact_return_store()
+        self.assertIsNot(store3, store2)
+
+        ro_store = yield transact_ro(lambda store: store)()
+        self.assertIsNot(ro_store, store3)
+
+    def test_store_pool_nested_acquire(self):
+        outer_store = store_pool.acquire(False)
+        inner_store = store_pool.acquire(False)
+        self.assertIsNot(outer_store, inner_store)
+
+        store_pool.release(inner_store, False)
+        store_pool.release(outer_store, False)
+
+        self.assertIs(store_pool.acquire(False), outer_store)
+        store_pool.release(outer_store, False)
+
+
+class TestIndexes(helpers.TestGL):
+    queries = [
+        ("SELECT * FROM receivertip WHERE receiver_id = 'x'", 'receivertip__receiver_id'),
+        ("SELECT * FROM receivertip WHERE internaltip_id = 'x'", 'receivertip__internaltip_id'),
+        ("SELECT * FROM fieldanswer WHERE internaltip_id = 'x'", 'fieldanswer__internaltip_id'),
+        ("SELECT * FROM fieldanswergroup WHERE fieldanswer_id = 'x'", 'fieldanswergroup__fieldanswer_id'),
+        ("SELECT * FROM internalfile WHERE internaltip_id = 'x'", 'internalfile__internaltip_id'),
+        ("SELECT * FROM receiverfile WHERE internalfile_id = 'x'", 'receiverfile__internalfile_id'),
+        ("SELECT * FROM comment WHERE internaltip_id = 'x'", 'comment__internaltip_id'),
+        ("SELECT * FROM message WHERE receivertip_id = 'x'", 'message__receivertip_id'),
+        ("SELECT * FROM whistleblowertip WHERE receipt_hash = 'x'", 'whistleblowertip__receipt_hash'),
+        ("SELECT * FROM receivertip WHERE receivertip.new = 1", 'receivertip__new'),
+        ("SELECT * FROM comment WHERE comment.new = 1", 'comment__new'),
+        ("SELECT * FROM message WHERE message.new = 1", 'message__new'),
+        ("SELECT * FROM internalfile WHERE internalfile.new = 1", 'internalfile__new'),
+        ("SELECT * FROM receiverfile WHERE receiverfile.new = 1", 'receiverfile__new')
+    ]
+
+    @transact
+    def _explain_query_plan(self, store, query):
+        return [row[-1] for row in store.execute("EXPLAIN QUERY PLAN " + query)]
+
+    @inlineCallbacks
+    def test_queries_use_indexes(self):
+        for query, index in self.queries:
+            plan = yield self._explain_query_plan(query)
+            self.assertTrue(any(('USING INDEX %s' % index) in x or
+                                ('USING COVERING INDEX %s' % index) in x for x in plan),
+                            "%s: %s" % (query, plan))
@@ -1,12 +1,18 @@
+import base64
 import binascii
+import io
+import json
 import os
 import scrypt
+import threading
 from datetime import datetime
 
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
 from globaleaks.rest import errors
 from globaleaks.security import generateRandomSalt, hash_password, check_password, change_password, \
     directory_traversal_check, GLSecureTemporaryFile, GLSecureFile, \
-    GLBPGP
+    GLBPGP, crypto_backend, migrate_encrypted_file
 from globaleaks.settings import GLSettings
 from globaleaks.tests import helpers
 from twisted.trial import unittest
@@ -94,6 +100,47 @@ class TestGLSecureFiles(helpers.TestGL):
         self.assertRaises(Exception, a.write, antani)
         a.close()
 
+    def test_temporary_file_write_at(self):
+        a = GLSecureTemporaryFile(GLSettings.tmp_upload_path)
+        antani = "0123456789" * 10000
+
+        # portions not aligned to the blocks of the cipher written out of order
+        for offset in [50005, 17, 0, 33333, 1000]:
+            a.write_at(offset, io.BytesIO(antani[offset:]))
+
+        self.assertTrue(antani == a.read())
+        a.close()
+
+    def test_temporary_file_concurrent_write_at(self):
+        a = GLSecureTemporaryFile(GLSettings.tmp_upload_path)
+        chunk_size = a.cipher.chunk_size
+        antani = os.urandom(chunk_size * 3)
+        split = chunk_size + chunk_size / 2
+
+        paused, resumed = threading.Event(), threading.Event()
+
+        class PausedChunk(io.BytesIO):
+            def read(self, size=-1):
+                data = io.BytesIO.read(self, size)
+                if not data:
+                    paused.set()
+                    resumed.wait(10)
+
+                return data
+
+        # the second portion updates the chunk of the cipher shared with the
+        # first one while the write of the first one is still in progress
+        first = threading.Thread(target=a.write_at, args=(0, PausedChunk(antani[:split])))
+        first.start()
+
+        paused.wait(10)
+        a.write_at(split, io.BytesIO(antani[split:]))
+        resumed.set()
+        first.join()
+
+        self.assertTrue(antani == a.read())
+        a.close()
+
     def test_temporary_file_avoid_delete(self):
         a = GLSecureTemporaryFile(GLSettings.tmp_upload_path)
         a.avoid_delete()
@@ -116,6 +163,69 @@ class TestGLSecureFiles(helpers.TestGL):
         self.assertRaises(IOError, GLSecureFile, a.filepath)
         a.close()
 
+    def test_secure_file_read_at(self):
+        a = GLSecureTemporaryFile(GLSettings.tmp_upload_path)
+        a.avoid_delete()
+        antani = os.urandom(GLSettings.AES_file_chunk_size * 5 + 1000)
+        a.write(antani)
+        a.close()
+
+        b = GLSecureFile(a.filepath)
+        for offset, length in [(0, 10), (65530, 10), (100000, 300000), (len(antani) - 5, 100)]:
+            self.assertEqual(b.read_at(offset, length), antani[offset:offset + length])
+            self.assertEqual(b.read_at(offset, length, 4), antani[offset:offset + length])
+
+        b.seek(200000)
+        self.assertEqual(b.read(1000), antani[200000:201000])
+        b.close()
+
+    def test_secure_file_tampered(self):
+        a = GLSecureTemporaryFile(GLSettings.tmp_upload_path)
+        a.avoid_delete()
+        a.write(b'\0' * (GLSettings.AES_file_chunk_size * 2))
+        a.close()
+
+        with open(a.filepath, 'r+b') as f:
+            f.seek(a.cipher.get_offset(0) + 100)
+            f.write(b'\1')
+
+        b = GLSecureFile(a.filepath)
+        self.assertEqual(b.read_at(GLSettings.AES_file_chunk_size, 100), b'\0' * 100)
+        self.assertRaises(IOError, b.read_at, 0, 100)
+        b.close()
+
+    def test_secure_file_truncated(self):
+        a = GLSecureTemporaryFile(GLSettings.tmp_upload_path)
+        a.avoid_delete()
+        a.write(b'\0' * (GLSettings.AES_file_chunk_size * 2))
+        a.close()
+
+        # truncation at the boundary of a chunk
+        with open(a.filepath, 'r+b') as f:
+            f.truncate(a.cipher.get_offset(1))
+
+        b = GLSecureFile(a.filepath)
+        self.assertRaises(IOError, b.read)
+        b.close()
+
+    def test_migrate_encrypted_file(self):
+        key, nonce = os.urandom(32), os.urandom(16)
+        antani = os.urandom(GLSettings.AES_file_chunk_size * 3)
+
+        filepath = os.path.join(GLSettings.submission_path, 'antani.aes')
+        with open(filepath, 'wb') as f:
+            f.write(Cipher(algorithms.AES(key), modes.CTR(nonce), backend=crypto_backend).encryptor().update(antani))
+
+        with open(os.path.join(GLSettings.ramdisk_path, '%santani' % GLSettings.AES_keyfile_prefix), 'w') as kf:
+            json.dump({'key': base64.b64encode(key), 'key_counter_nonce': base64.b64encode(nonce)}, kf)
+
+        self.assertTrue(migrate_encrypted_file(filepath))
+        self.assertFalse(migrate_encrypted_file(filepath))
+
+        b = GLSecureFile(filepath)
+        self.assertEqual(b.read(), antani)
+        b.close()
+
 
 class TestPGP(helpers.TestGL):
     secret_content = helpers.PGPKEYS['VALID_PGP_KEY1_PRV']
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+import zlib
+
+from twisted.internet import defer, reactor, task
+from twisted.internet.defer import inlineCallbacks
+from twisted.trial import unittest
+from twisted.web import resource, server
+from twisted.web.client import Agent, HTTPConnectionPool, readBody
+from twisted.web.http_headers import Headers
+
+from globaleaks.utils.httpsproxy import HTTPStreamFactory
+
+
+class Backend(resource.Resource):
+    isLeaf = True
+
+    def render_GET(self, request):
+        if request.path == b'/json':
+            request.setHeader(b'content-type', b'application/json; charset=utf-8')
+            return b'["antani"]' * 1024
+
+        if request.path == b'/export':
+            request.setHeader(b'content-type', b'application/octet-stream')
+            return b'antani' * 1024
+
+        if request.path == b'/gzip':
+            request.setHeader(b'content-type', b'text/plain')
+            request.setHeader(b'content-encoding', b'gzip')
+            return zlib.compress(b'antani' * 1024)
+
+        return b'antani'
+
+
+class CountingSite(server.Site):
+    def __init__(self, *args, **kwargs):
+        server.Site.__init__(self, *args, **kwargs)
+        self.connections = 0
+        self.active_connections = 0
+
+    def buildProtocol(self, addr):
+        proto = server.Site.buildProtocol(self, addr)
+        _connectionLost = proto.connectionLost
+
+        def connectionLost(*args):
+            self.active_connections -= 1
+            return _connectionLost(*args)
+
+        proto.connectionLost = connectionLost
+
+        self.connections += 1
+        self.active_connections += 1
+
+        return proto
+
+
+@inlineCallbacks
+def wait_until(condition):
+    while not condition():
+        yield task.deferLater(reactor, 0.01, lambda: None)
+
+
+class TestHTTPStreamFactory(unittest.TestCase):
+    @inlineCallbacks
+    def test_compression(self):
+        backend_port = reactor.listenTCP(0, server.Site(Backend()), interface='127.0.0.1')
+
+        proxy_factory = HTTPStreamFactory('http://127.0.0.1:%d' % backend_port.getHost().port)
+        proxy_port = reactor.listenTCP(0, proxy_factory, interface='127.0.0.1')
+
+        client_pool = HTTPConnectionPool(reactor, persistent=False)
+        agent = Agent(reactor, pool=client_pool)
+        headers = Headers({b'accept-encoding': [b'gzip']})
+
+        def request(path):
+            return agent.request(b'GET', b'http://127.0.0.1:%d%s' % (proxy_port.getHost().port, path), headers)
+
+        try:
+            # the textual bodies are compressed
+            response = yield request(b'/json')
+            body = yield readBody(response)
+            self.assertEqual(response.headers.getRawHeaders(b'content-encoding'), [b'gzip'])
+            self.assertIn(b'Accept-Encoding', response.headers.getRawHeaders(b'vary'))
+            self.assertEqual(zlib.decompress(body, 16 + zlib.MAX_WBITS), b'["antani"]' * 1024)
+
+            # the binary bodies are forwarded as they are with their length
+            response = yield request(b'/export')
+            body = yield readBody(response)
+            self.assertFalse(response.headers.hasHeader(b'content-encoding'))
+            self.assertEqual(response.length, 6 * 1024)
+            self.assertEqual(body, b'antani' * 1024)
+
+            # the small bodies are not compressed
+            response = yield request(b'/')
+            body = yield readBody(response)
+            self.assertFalse(response.headers.hasHeader(b'content-encoding'))
+            self.assertEqual(body, b'antani')
+
+            # the bodies already encoded by the backend are not encoded again
+            response = yield request(b'/gzip')
+            body = yield readBody(response)
+            self.assertEqual(response.headers.getRawHeaders(b'content-encoding'), [b'gzip'])
+            self.assertEqual(zlib.decompress(body), b'antani' * 1024)
+        finally:
+            yield defer.DeferredList([client_pool.closeCachedConnections(),
+                                      proxy_factory.pool.closeCachedConnections()])
+            yield wait_until(lambda: proxy_factory.active_connections == 0)
+            yield defer.DeferredList([proxy_port.stopListening(), backend_port.stopListening()])
+
+    @inlineCallbacks
+    def test_persistent_connections_to_the_backend(self):
+        site = CountingSite(Backend())
+        backend_port = reactor.listenTCP(0, site, interface='127.0.0.1')
+
+        proxy_factory = HTTPStreamFactory('http://127.0.0.1:%d' % backend_port.getHost().port)
+        proxy_port = reactor.listenTCP(0, proxy_factory, interface='127.0.0.1')
+
+        # the client opens a new connection for every request
+        client_pool = HTTPConnectionPool(reactor, persistent=False)
+        agent = Agent(reactor, pool=client_pool)
+        url = b'http://127.0.0.1:%d/' % proxy_port.getHost().port
+
+        try:
+            for _ in range(3):
+                response = yield agent.request(b'GET', url)
+                body = yield readBody(response)
+                self.assertEqual(body, b'antani')
+                self.assertFalse(response.headers.hasHeader(b'keep-alive'))
+
+            self.assertEqual(site.connections, 1)
+        finally:
+            yield defer.DeferredList([client_pool.closeCachedConnections(),
+                                      proxy_factory.pool.closeCachedConnections()])
+            yield wait_until(lambda: proxy_factory.active_connections == 0 and site.active_connections == 0)
+            yield defer.DeferredList([proxy_port.stopListening(), backend_port.stopListening()])
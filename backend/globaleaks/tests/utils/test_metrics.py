@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+from twisted.trial import unittest
+
+from globaleaks.utils.metrics import Counter, Gauge, Histogram, MetricsRegistry
+
+
+class TestMetrics(unittest.TestCase):
+    def test_counter(self):
+        counter = Counter('antani_total', 'Antani', ('code',))
+        counter.inc((200,))
+        counter.inc((200,))
+        counter.inc((404,), 3)
+
+        self.assertEqual(counter.render(), '# HELP antani_total Antani\n'
+                                           '# TYPE antani_total counter\n'
+                                           'antani_total{code="200"} 2.0\n'
+                                           'antani_total{code="404"} 3.0')
+
+    def test_gauge(self):
+        gauge = Gauge('antani', 'Antani', ('name',), lambda: {('a"\\\n',): 1})
+
+        self.assertEqual(gauge.render().split('\n')[-1], 'antani{name="a\\"\\\\\\n"} 1.0')
+
+    def test_histogram(self):
+        histogram = Histogram('antani_seconds', 'Antani', buckets=[1, 10])
+        for value in [0.5, 1, 5, 100]:
+            histogram.observe(value)
+
+        self.assertEqual(histogram.render().split('\n')[2:], ['antani_seconds_bucket{le="1.0"} 2.0',
+                                                              'antani_seconds_bucket{le="10.0"} 3.0',
+                                                              'antani_seconds_bucket{le="+Inf"} 4.0',
+                                                              'antani_seconds_sum 106.5',
+                                                              'antani_seconds_count 4.0'])
+
+    def test_registry(self):
+        registry = MetricsRegistry()
+        counter = registry.register(Counter('antani_total', 'Antani'))
+        counter.inc()
+
+        self.assertTrue(registry.render().endswith('antani_total 1.0\n'))
+
+        registry.clear()
+
+        self.assertTrue(registry.render().endswith('# TYPE antani_total counter\n'))
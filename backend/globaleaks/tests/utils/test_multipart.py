@@ -0,0 +1,117 @@
+# -*- encoding: utf-8 -*-
+import os
+
+from twisted.internet import defer
+from twisted.internet.defer import inlineCallbacks
+
+from globaleaks.rest import errors
+from globaleaks.tests import helpers
+from globaleaks.utils.multipart import MultipartStream
+
+BOUNDARY = b'----antani'
+
+
+def get_rss():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def part(name, value=None, filename=None):
+    disposition = b'form-data; name="%s"' % name
+    if filename is not None:
+        disposition += b'; filename="%s"' % filename
+
+    ret = b'--%s\r\nContent-Disposition: %s\r\n' % (BOUNDARY, disposition)
+    if filename is not None:
+        ret += b'Content-Type: application/octet-stream\r\n'
+
+    return ret + b'\r\n' + (value if value is not None else b'')
+
+
+class FakeTransport(object):
+    def __init__(self):
+        self.paused = None
+
+    def pauseProducing(self):
+        self.paused = defer.Deferred()
+
+    def resumeProducing(self):
+        paused, self.paused = self.paused, None
+        paused.callback(None)
+
+
+class TestMultipartStream(helpers.TestGL):
+    def get_stream(self, max_file_size=1024 * 1024):
+        self.transport = FakeTransport()
+        return MultipartStream(self.transport, BOUNDARY, max_file_size)
+
+    @inlineCallbacks
+    def test_parse(self):
+        content = os.urandom(100000) + b'\r\n--' + BOUNDARY[:-1]
+
+        body = b'preamble\r\n' + \
+               part(b'flowChunkNumber', b'1') + b'\r\n' + \
+               part(b'flowFilename', b'antani.txt') + b'\r\n' + \
+               part(b'file', content, b'antani.txt') + b'\r\n' + \
+               b'--%s--\r\n' % BOUNDARY
+
+        stream = self.get_stream()
+
+        # the body is received in pieces not aligned to the parts
+        for i in range(0, len(body), 1000):
+            stream.write(body[i:i + 1000])
+
+        yield stream.flush()
+
+        self.assertEqual(stream.fields, {'flowChunkNumber': [b'1'], 'flowFilename': [b'antani.txt']})
+        self.assertEqual(stream.filename, 'antani.txt')
+        self.assertEqual(stream.file_size, len(content))
+
+        f = stream.take_file()
+        self.assertEqual(f.read(), content)
+        f.close()
+
+    @inlineCallbacks
+    def test_incomplete_body(self):
+        stream = self.get_stream()
+        stream.write(part(b'file', b'antani', b'antani.txt'))
+
+        yield self.assertFailure(stream.flush(), errors.InvalidInputFormat)
+        self.assertIsNone(stream.take_file())
+
+    @inlineCallbacks
+    def test_file_too_big(self):
+        stream = self.get_stream(max_file_size=10)
+        stream.write(part(b'file', b'0123456789' * 2, b'antani.txt') + b'\r\n--%s--\r\n' % BOUNDARY)
+
+        yield self.assertFailure(stream.flush(), errors.FileTooBig)
+        self.assertIsNone(stream.take_file())
+
+    @inlineCallbacks
+    def test_upload_with_bounded_memory(self):
+        size = 200 * 1024 * 1024
+        data = os.urandom(64 * 1024)
+
+        stream = self.get_stream(max_file_size=size)
+
+        start_rss = max_rss = get_rss()
+
+        stream.write(part(b'flowFilename', b'antani.bin') + b'\r\n' + part(b'file', filename=b'antani.bin'))
+
+        for _ in range(size / len(data)):
+            stream.write(data)
+
+            while self.transport.paused is not None:
+                yield self.transport.paused
+
+            max_rss = max(max_rss, get_rss())
+
+        stream.write(b'\r\n--%s--\r\n' % BOUNDARY)
+
+        yield stream.flush()
+
+        f = stream.take_file()
+        f.close()
+
+        self.assertEqual(stream.file_size, size)
+        self.assertTrue(max_rss - start_rss < 32 * 1024 * 1024)
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+import os
+
+from twisted.trial import unittest
+
+from globaleaks.settings import GLSettings
+from globaleaks.tests import helpers
+from globaleaks.utils import shredder
+from globaleaks.utils.shredder import Bandwidth, Shredder, shred_file
+
+FILE_SIZE = 10 * 1024 + 100
+
+
+class Interrupted(Exception):
+    pass
+
+
+class FakeTime(object):
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = 0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept += seconds
+        self.now += seconds
+
+
+class TestShredder(helpers.TestGL):
+    def setUp(self):
+        self.patch(GLSettings, 'shredder_buffer_size', 1024)
+        self.patch(GLSettings, 'shredder_checkpoint_size', 4096)
+
+        return helpers.TestGL.setUp(self)
+
+    def create_file(self, name='antani'):
+        path = os.path.join(GLSettings.submission_path, name)
+        with open(path, 'wb') as f:
+            f.write(b'x' * FILE_SIZE)
+
+        return path
+
+    def test_shred_file(self):
+        path = self.create_file()
+
+        checkpoints = []
+        shred_file(path, checkpoint=lambda p, o: checkpoints.append((p, o)))
+
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(checkpoints, [(0, 4096), (0, 8192), (1, 0),
+                                       (1, 4096), (1, 8192), (2, 0),
+                                       (2, 4096), (2, 8192), (3, 0)])
+
+    def test_shred_file_resume(self):
+        path = self.create_file()
+
+        def checkpoint(pass_number, offset):
+            if (pass_number, offset) == (1, 8192):
+                raise Interrupted
+
+        self.assertRaises(Interrupted, shred_file, path, checkpoint=checkpoint)
+
+        # the file is overwritten in place up to the checkpoint
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        self.assertEqual(data, b'\xff' * 8192 + b'\0' * (FILE_SIZE - 8192))
+
+        checkpoints = []
+        shred_file(path, 1, 8192, checkpoint=lambda p, o: checkpoints.append((p, o)))
+
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(checkpoints[0], (2, 0))
+
+    def test_shredder(self):
+        paths = [self.create_file('antani-%d' % i) for i in range(5)]
+
+        checkpoints = []
+        done = []
+        Shredder(workers=2, bandwidth=0).shred([(path, 0, 0) for path in paths],
+                                               lambda path, p, o: checkpoints.append((path, p, o)),
+                                               done.append)
+
+        self.assertEqual(sorted(done), sorted(paths))
+        for path in paths:
+            self.assertFalse(os.path.exists(path))
+            self.assertIn((path, 3, 0), checkpoints)
+
+    def test_shredder_missing_file(self):
+        path = os.path.join(GLSettings.submission_path, 'missing')
+
+        done = []
+        Shredder(workers=2, bandwidth=0).shred([(path, 0, 0)], None, done.append)
+
+        self.assertEqual(done, [path])
+
+
+class TestBandwidth(unittest.TestCase):
+    def test_consume(self):
+        fake_time = FakeTime()
+        self.patch(shredder, 'time', fake_time)
+
+        bandwidth = Bandwidth(1024 * 1024)
+        for _ in range(4):
+            bandwidth.consume(1024 * 1024)
+
+        self.assertEqual(fake_time.slept, 3)
+
+    def test_unlimited(self):
+        fake_time = FakeTime()
+        self.patch(shredder, 'time', fake_time)
+
+        bandwidth = Bandwidth(0)
+        for _ in range(4):
+            bandwidth.consume(1024 * 1024)
+
+        self.assertEqual(fake_time.slept, 0)
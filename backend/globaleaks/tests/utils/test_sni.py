@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+import os
+
+from OpenSSL import crypto
+from OpenSSL.crypto import FILETYPE_PEM
+from twisted.internet import defer, protocol, reactor, ssl
+from twisted.internet.defer import inlineCallbacks
+from twisted.protocols.tls import TLSMemoryBIOFactory
+from twisted.trial import unittest
+from twisted.web import resource, server
+
+from globaleaks.tests import helpers
+from globaleaks.tests.utils.test_httpsproxy import wait_until
+from globaleaks.utils import tls
+from globaleaks.utils.httpsproxy import HTTPStreamFactory
+from globaleaks.utils.sni import SNIMap
+
+UPLOAD_SIZE = 1024 * 1024
+
+
+def load_test_file(path):
+    with open(os.path.join(helpers.DATA_DIR, 'https', path), 'r') as f:
+        return f.read()
+
+
+class ContextFactory(ssl.ContextFactory):
+    def __init__(self, certificate):
+        self.certificate = crypto.load_certificate(FILETYPE_PEM, certificate)
+
+        self.ctx = tls.new_tls_server_context()
+        self.ctx.use_certificate(self.certificate)
+        self.ctx.use_privatekey(crypto.load_privatekey(FILETYPE_PEM, load_test_file('valid/priv_key.pem')))
+
+    def getContext(self):
+        return self.ctx
+
+
+class Backend(resource.Resource):
+    isLeaf = True
+
+    def render_POST(self, request):
+        return b'%d' % len(request.content.read())
+
+
+class UploadClient(protocol.Protocol):
+    def __init__(self):
+        self.response = b''
+        self.finished = defer.Deferred()
+
+    def send_headers(self):
+        self.transport.write(b'POST / HTTP/1.1\r\n'
+                             b'Host: 127.0.0.1\r\n'
+                             b'Content-Length: %d\r\n'
+                             b'Connection: close\r\n\r\n' % UPLOAD_SIZE)
+
+    def dataReceived(self, data):
+        self.response += data
+
+    def connectionLost(self, reason):
+        self.finished.callback(self.response)
+
+
+class TestSNIMap(unittest.TestCase):
+    @inlineCallbacks
+    def connect(self, port):
+        client = UploadClient()
+        endpoint = protocol.ClientCreator(reactor, lambda: client)
+        yield endpoint.connectSSL('127.0.0.1', port, ssl.ClientContextFactory())
+
+        client.send_headers()
+        yield wait_until(lambda: client.transport.getPeerCertificate() is not None)
+
+        defer.returnValue(client)
+
+    @inlineCallbacks
+    def test_certificate_swap_during_upload(self):
+        old_cert = load_test_file('valid/cert.pem')
+        new_cert = load_test_file('invalid/expired_cert_with_valid_prv.pem')
+
+        backend_port = reactor.listenTCP(0, server.Site(Backend()), interface='127.0.0.1')
+
+        snimap = SNIMap({'DEFAULT': ContextFactory(old_cert)})
+        proxy_factory = HTTPStreamFactory('http://127.0.0.1:%d' % backend_port.getHost().port)
+        proxy_port = reactor.listenTCP(0, TLSMemoryBIOFactory(snimap, False, proxy_factory), interface='127.0.0.1')
+
+        try:
+            upload = yield self.connect(proxy_port.getHost().port)
+            upload.transport.write(b'x' * (UPLOAD_SIZE / 2))
+
+            snimap.set_mapping({'DEFAULT': ContextFactory(new_cert)})
+
+            # the new connections use the new certificate
+            client = yield self.connect(proxy_port.getHost().port)
+            self.assertEqual(client.transport.getPeerCertificate().digest('sha256'),
+                             crypto.load_certificate(FILETYPE_PEM, new_cert).digest('sha256'))
+            client.transport.loseConnection()
+
+            # while the upload in progress completes on the previous one
+            upload.transport.write(b'x' * (UPLOAD_SIZE / 2))
+            response = yield upload.finished
+
+            self.assertEqual(upload.transport.getPeerCertificate().digest('sha256'),
+                             crypto.load_certificate(FILETYPE_PEM, old_cert).digest('sha256'))
+            self.assertTrue(response.startswith(b'HTTP/1.1 200'))
+            self.assertTrue(response.endswith(b'\r\n\r\n%d' % UPLOAD_SIZE))
+        finally:
+            yield proxy_factory.pool.closeCachedConnections()
+            yield wait_until(lambda: proxy_factory.active_connections == 0)
+            yield defer.DeferredList([proxy_port.stopListening(), backend_port.stopListening()])
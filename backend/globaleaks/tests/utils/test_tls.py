@@ -1,9 +1,10 @@
 # -*- encoding: utf-8 -*-
 import os
 
-from OpenSSL import crypto
+from OpenSSL import crypto, SSL
+from OpenSSL._util import lib as _lib
 from OpenSSL.crypto import FILETYPE_PEM
-from twisted.trial.unittest import TestCase
+from twisted.trial.unittest import SkipTest, TestCase
 
 from globaleaks.models.config import PrivateFactory, NodeFactory
 from globaleaks.orm import transact
@@ -242,3 +243,102 @@ class TestObjectValidators(TestCase):
             if chain_path == 'invalid/cert_and_chain.pem':
                 self.assertEqual(self.valid_setup['cert'], chain[0])
                 self.assertEqual(self.valid_setup['chain'], chain[1])
+
+
+def handshake(server_ctx, session=None):
+    """
+    Perform a handshake in memory returning the client connection
+    """
+    client = SSL.Connection(tls.new_tls_client_context(), None)
+    client.set_connect_state()
+    if session is not None:
+        client.set_session(session)
+
+    server = SSL.Connection(server_ctx, None)
+    server.set_accept_state()
+
+    # the session tickets of TLS 1.3 are sent after the handshake
+    data = b''
+    while not data:
+        for conn in (client, server):
+            try:
+                conn.do_handshake()
+            except SSL.WantReadError:
+                pass
+
+        for src, dst in ((client, server), (server, client)):
+            try:
+                dst.bio_write(src.bio_read(65536))
+            except SSL.WantReadError:
+                pass
+
+        try:
+            server.send(b'x')
+            data = client.recv(1)
+        except SSL.WantReadError:
+            pass
+
+    # the sessions of the connections not shut down are removed from the cache
+    server.shutdown()
+
+    return client
+
+
+def session_reused(conn):
+    return _lib.SSL_session_reused(conn._ssl) == 1
+
+
+def tickets_enabled(ctx):
+    return not _lib.SSL_CTX_get_options(ctx._context) & SSL.OP_NO_TICKET
+
+
+class TestSessionTickets(TestCase):
+    def get_context(self):
+        cfg = get_valid_setup()
+
+        ctx = tls.new_tls_server_context()
+        ctx.use_certificate(crypto.load_certificate(FILETYPE_PEM, cfg['cert']))
+        ctx.use_privatekey(crypto.load_privatekey(FILETYPE_PEM, cfg['key']))
+
+        return ctx
+
+    def test_session_resumption(self):
+        ctx = self.get_context()
+
+        client = handshake(ctx)
+        self.assertFalse(session_reused(client))
+
+        client = handshake(ctx, client.get_session())
+        self.assertTrue(session_reused(client))
+
+    def test_session_resumption_across_workers(self):
+        if tls.get_libssl() is None:
+            raise SkipTest("the bindings of pyOpenSSL are linked statically to openssl")
+
+        keys = os.urandom(tls.TLS_TICKET_KEYS_LENGTH)
+
+        contexts = [self.get_context() for _ in range(3)]
+        for ctx in contexts[:2]:
+            self.assertTrue(tls.set_tls_ticket_keys(ctx, keys))
+            self.assertTrue(tickets_enabled(ctx))
+
+        self.assertTrue(tls.set_tls_ticket_keys(contexts[2], os.urandom(tls.TLS_TICKET_KEYS_LENGTH)))
+
+        client = handshake(contexts[0])
+        session = client.get_session()
+
+        client = handshake(contexts[1], session)
+        self.assertTrue(session_reused(client))
+
+        # a worker with different keys performs a full handshake
+        client = handshake(contexts[2], session)
+        self.assertFalse(session_reused(client))
+
+    def test_session_tickets_disabled_without_shared_keys(self):
+        self.patch(tls, 'get_libssl', lambda: None)
+
+        ctx = self.get_context()
+        self.assertFalse(tickets_enabled(ctx))
+
+        self.assertFalse(tls.set_tls_ticket_keys(ctx, os.urandom(tls.TLS_TICKET_KEYS_LENGTH)))
+        self.assertFalse(tickets_enabled(ctx))
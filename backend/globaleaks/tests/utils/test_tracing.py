@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+
+from twisted.internet import defer
+from twisted.internet.defer import inlineCallbacks
+
+from globaleaks import models
+from globaleaks.orm import transact_ro
+from globaleaks.settings import GLSettings
+from globaleaks.tests import helpers
+from globaleaks.utils.tracing import Trace, call_with_trace, get_current_trace, propagate_trace, save_trace
+
+
+@transact_ro
+def count_users(store):
+    return store.find(models.User).count()
+
+
+class TestTracing(helpers.TestGL):
+    def test_server_timing(self):
+        trace = Trace('antani', 'GET')
+        trace.add_span('sql', trace.start, 0.002, 'a')
+        trace.add_span('handler', trace.start, 0.010)
+        trace.add_span('sql', trace.start, 0.003, 'b')
+
+        server_timing = trace.get_server_timing().split(', ')
+
+        self.assertEqual(server_timing[:2], ['sql;dur=5.0', 'handler;dur=10.0'])
+        self.assertTrue(server_timing[2].startswith('total;dur='))
+
+    def test_propagate_trace(self):
+        trace = Trace('antani', 'GET')
+
+        d = defer.Deferred()
+        ret = call_with_trace(trace, propagate_trace, d, trace)
+        ret.addCallback(lambda _: get_current_trace())
+
+        # the deferred fires outside of the context of the trace
+        self.assertIsNone(get_current_trace())
+        d.callback(None)
+
+        self.assertIs(self.successResultOf(ret), trace)
+
+    @inlineCallbacks
+    def test_transactions_are_traced(self):
+        trace = Trace('antani', 'GET')
+
+        @inlineCallbacks
+        def handler():
+            yield count_users()
+            yield count_users()
+
+        yield call_with_trace(trace, handler)
+
+        spans = [(name, description) for name, _, _, description in trace.spans]
+        self.assertEqual(spans.count(('transaction', 'count_users')), 2)
+        self.assertEqual(spans.count(('sql', 'count_users')), 2)
+
+    def test_save_trace(self):
+        self.patch(GLSettings, 'tracefile', os.path.join(GLSettings.working_path, 'trace.log'))
+
+        trace = Trace('antani', 'GET')
+        trace.add_span('handler', trace.start, 0.010)
+
+        self.patch(GLSettings, 'trace_sample_rate', 0.0)
+        save_trace(trace, 200)
+        self.assertFalse(os.path.exists(GLSettings.tracefile))
+
+        self.patch(GLSettings, 'trace_sample_rate', 1.0)
+        save_trace(trace, 200)
+
+        with open(GLSettings.tracefile) as f:
+            saved = json.loads(f.read())
+
+        self.assertEqual(saved['handler'], 'antani')
+        self.assertEqual(saved['code'], 200)
+        self.assertEqual(saved['spans'][0]['name'], 'handler')
@@ -1,19 +1,31 @@
 import gzip
 import json
+import os
 import ssl
 import tempfile
 import urllib2
 from StringIO import StringIO
 
+from OpenSSL import crypto
+from OpenSSL._util import lib as _lib
+from OpenSSL.crypto import FILETYPE_PEM
+
 from globaleaks.models.config import PrivateFactory, load_tls_dict_list
 from globaleaks.orm import transact
+from globaleaks.security import generateRandomSalt, hash_password
+from globaleaks.settings import GLSettings
 from globaleaks.tests import helpers
 from globaleaks.tests.utils import test_tls
+from globaleaks.utils import tls
 from globaleaks.utils.sock import reserve_port_for_ip
 from globaleaks.workers import supervisor
+from globaleaks.workers.process import HTTPSProcProtocol
 from globaleaks.workers.worker_https import HTTPSProcess
 from twisted.internet import threads, reactor
-from twisted.internet.defer import inlineCallbacks
+from twisted.internet.defer import fail, inlineCallbacks, succeed
+from twisted.internet.error import ProcessTerminated
+from twisted.python.threadable import isInIOThread
+from twisted.trial import unittest
 
 
 @transact
@@ -63,6 +75,241 @@ class TestProcessSupervisor(helpers.TestGL):
         self.assertFalse(p_s.shutting_down)
         self.assertFalse(p_s.is_running())
 
+    @inlineCallbacks
+    def test_reload_launches_missing_workers(self):
+        yield toggle_https(enabled=True)
+        sock, fail = reserve_port_for_ip('localhost', 43434)
+        self.assertIsNone(fail)
+
+        ip, port = '127.0.0.1', 43435
+
+        p_s = supervisor.ProcessSupervisor([sock], ip, port)
+        yield p_s.maybe_reload_https_workers()
+
+        self.assertTrue(p_s.is_running())
+        self.assertEqual(len(p_s.tls_cfg['site_cfgs']), 1)
+
+        yield p_s.shutdown()
+
+        self.assertFalse(p_s.is_running())
+
+    @inlineCallbacks
+    def test_load_site_cfgs_in_running_worker(self):
+        if not hasattr(_lib, 'NID_X9_62_prime256v1'):
+            raise unittest.SkipTest("the bindings of pyOpenSSL lack the curves needed by the https workers")
+
+        yield toggle_https(enabled=True)
+        sock, fail = reserve_port_for_ip('127.0.0.1', 43434)
+        self.assertIsNone(fail)
+
+        p_s = supervisor.ProcessSupervisor([sock], '127.0.0.1', 43435)
+        yield p_s.maybe_launch_https_workers()
+
+        def get_served_certificate():
+            cert = ssl.get_server_certificate(('127.0.0.1', 43434))
+            return crypto.load_certificate(FILETYPE_PEM, cert).digest('sha256')
+
+        with open(os.path.join(helpers.DATA_DIR, 'https', 'invalid', 'expired_cert_with_valid_prv.pem')) as f:
+            new_cert = f.read()
+
+        try:
+            pp = p_s.tls_process_pool[0]
+            site_cfg = dict(p_s.tls_cfg['site_cfgs'][0], ssl_cert=new_cert)
+
+            # the configuration pushed is swapped by the running worker
+            response = yield pp.load_site_cfgs([site_cfg])
+            self.assertNotIn('error', response)
+
+            digest = yield threads.deferToThread(get_served_certificate)
+            self.assertEqual(digest, crypto.load_certificate(FILETYPE_PEM, new_cert).digest('sha256'))
+
+            # while an invalid one is reported and the previous one is kept
+            yield self.assertFailure(pp.load_site_cfgs([dict(site_cfg, ssl_key=u'')]), Exception)
+
+            digest = yield threads.deferToThread(get_served_certificate)
+            self.assertEqual(digest, crypto.load_certificate(FILETYPE_PEM, new_cert).digest('sha256'))
+        finally:
+            yield p_s.shutdown()
+
+
+class FakeWorker(object):
+    def __init__(self, active_connections=0, handshake_rate=0):
+        self.stats = {
+            'active_connections': active_connections,
+            'handshake_rate': handshake_rate
+        }
+
+        self.ticket_keys = None
+
+    def set_ticket_keys(self, ticket_keys):
+        self.ticket_keys = ticket_keys
+        return succeed(None)
+
+
+class TestHTTPSWorkersScaling(unittest.TestCase):
+    def setUp(self):
+        self.patch(GLSettings, 'https_workers_min', 1)
+        self.patch(GLSettings, 'https_workers_max', 4)
+        self.patch(GLSettings, 'https_worker_target_connections', 100)
+        self.patch(GLSettings, 'https_worker_target_handshake_rate', 50)
+
+        self.p_s = supervisor.ProcessSupervisor([], '127.0.0.1', 43435)
+        self.p_s.tls_process_pool = [FakeWorker()]
+
+        def launch_worker():
+            self.p_s.tls_process_pool.append(FakeWorker())
+
+        self.p_s.launch_worker = launch_worker
+        self.p_s.retire_worker = self.p_s.tls_process_retiring.append
+
+    def set_load(self, active_connections, handshake_rate):
+        for pp in self.p_s.tls_process_pool:
+            pp.stats = {
+                'active_connections': active_connections / len(self.p_s.tls_process_pool),
+                'handshake_rate': handshake_rate / len(self.p_s.tls_process_pool)
+            }
+
+    def test_scale_up_and_down(self):
+        self.set_load(250, 0)
+        self.p_s.scale_https_workers()
+        self.assertEqual(len(self.p_s.get_active_workers()), 3)
+
+        # the workers are capped to the maximum
+        self.set_load(0, 1000)
+        self.p_s.scale_https_workers()
+        self.assertEqual(len(self.p_s.get_active_workers()), 4)
+
+        status = self.p_s.get_status()
+        self.assertEqual(status['workers']['target'], 4)
+        self.assertIn('from 3 to 4', status['last_scaling']['msg'])
+
+        # the workers are retired one at a time down to the minimum
+        self.set_load(0, 0)
+        for i in range(3, 0, -1):
+            self.p_s.scale_https_workers()
+            self.assertEqual(len(self.p_s.get_active_workers()), i)
+
+        self.p_s.scale_https_workers()
+        self.assertEqual(len(self.p_s.get_active_workers()), 1)
+        self.assertEqual(len(self.p_s.tls_process_retiring), 3)
+
+    def test_retired_worker_is_not_respawned(self):
+        pp = FakeWorker()
+        self.p_s.tls_process_pool.append(pp)
+        self.p_s.tls_process_retiring.append(pp)
+
+        self.p_s.handle_worker_death(pp, None)
+
+        self.assertEqual(len(self.p_s.tls_process_pool), 1)
+        self.assertEqual(self.p_s.tls_process_retiring, [])
+        self.assertEqual(self.p_s.process_state['deaths'], 0)
+
+    @inlineCallbacks
+    def test_rotate_ticket_keys(self):
+        self.p_s.tls_process_pool.append(FakeWorker())
+
+        ticket_keys = self.p_s.tls_cfg['ticket_keys']
+
+        yield self.p_s.rotate_ticket_keys()
+
+        # the workers running and the ones to be launched get the same new keys
+        self.assertNotEqual(self.p_s.tls_cfg['ticket_keys'], ticket_keys)
+        self.assertEqual(len(self.p_s.tls_cfg['ticket_keys']), tls.TLS_TICKET_KEYS_LENGTH * 2)
+        for pp in self.p_s.tls_process_pool:
+            self.assertEqual(pp.ticket_keys, self.p_s.tls_cfg['ticket_keys'])
+
+    def test_stats_message(self):
+        pp = HTTPSProcProtocol(self.p_s, {'tls_socket_fds': []})
+
+        pp.childDataReceived(pp.response_fd, json.dumps({
+            'stats': {
+                'active_connections': 7,
+                'handshake_rate': 1.5
+            }
+        }) + '\n')
+
+        self.assertEqual(pp.stats['active_connections'], 7)
+        self.assertEqual(pp.stats['handshake_rate'], 1.5)
+
+
+class TestKDFPool(helpers.TestGL):
+    @inlineCallbacks
+    def test_hash_password(self):
+        kdf_pool = supervisor.KDFPool()
+
+        yield kdf_pool.start(2)
+        self.assertTrue(kdf_pool.is_running())
+
+        salt = generateRandomSalt()
+
+        password_hash = yield kdf_pool.hash_password(u'antani', salt)
+        self.assertEqual(password_hash, hash_password(u'antani', salt))
+
+        valid = yield kdf_pool.check_password(u'antani', salt, password_hash)
+        self.assertTrue(valid)
+
+        valid = yield kdf_pool.check_password(u'focaccina', salt, password_hash)
+        self.assertFalse(valid)
+
+        yield self.assertFailure(kdf_pool.hash_password(None, salt), Exception)
+
+        yield kdf_pool.shutdown()
+        self.assertFalse(kdf_pool.is_running())
+
+    @inlineCallbacks
+    def test_hash_password_not_running(self):
+        in_io_thread = []
+
+        def _hash_password(password, salt):
+            in_io_thread.append(isInIOThread())
+            return hash_password(password, salt)
+
+        self.patch(supervisor, 'hash_password', _hash_password)
+
+        salt = generateRandomSalt()
+
+        # the hashes are never computed on the thread of the reactor
+        password_hash = yield supervisor.KDFPool().hash_password(u'antani', salt)
+        self.assertEqual(password_hash, hash_password(u'antani', salt))
+        self.assertEqual(in_io_thread, [False])
+
+    @inlineCallbacks
+    def test_hash_password_worker_died(self):
+        class DeadWorker(object):
+            pending = {}
+
+            def hash_password(self, password, salt):
+                return fail(ProcessTerminated(signal=9))
+
+        kdf_pool = supervisor.KDFPool()
+        kdf_pool.process_pool.append(DeadWorker())
+
+        salt = generateRandomSalt()
+
+        # the hashes pending on a worker that died are computed in a thread
+        password_hash = yield kdf_pool.hash_password(u'antani', salt)
+        self.assertEqual(password_hash, hash_password(u'antani', salt))
+
+    def test_handle_worker_death(self):
+        kdf_pool = supervisor.KDFPool()
+        kdf_pool.process_state['target_proc_num'] = 1
+
+        launched = []
+
+        def launch_worker():
+            launched.append(object())
+            kdf_pool.process_pool.append(launched[-1])
+
+        self.patch(kdf_pool, 'launch_worker', launch_worker)
+
+        launch_worker()
+        while kdf_pool.process_pool:
+            kdf_pool.handle_worker_death(kdf_pool.process_pool[0], None)
+
+        # a worker dying at startup is not relaunched forever
+        self.assertEqual(len(launched), 3)
+        self.assertEqual(kdf_pool.process_state['deaths'], 3)
+
 
 @transact
 def wrap_db_tx(store, f, *args, **kwargs):
@@ -89,6 +336,8 @@ class TestSubprocessRun(helpers.TestGL):
             'proxy_port': 43434,
             'tls_socket_fds': [sock.fileno() for sock in self.https_socks],
             'debug': False,
+            'ticket_keys': os.urandom(tls.TLS_TICKET_KEYS_LENGTH).encode('hex'),
+            'ticket_key_lifetime': 3600,
         }
         valid_cfg['site_cfgs'] = yield wrap_db_tx(load_tls_dict_list)
 
@@ -5,11 +5,31 @@ import zlib
 from twisted.internet import reactor, protocol, defer
 from twisted.internet.protocol import connectionDone
 from twisted.web import http
-from twisted.web.client import Agent
+from twisted.web.client import Agent, HTTPConnectionPool
 from twisted.web.iweb import IBodyProducer
 from twisted.web.server import NOT_DONE_YET
 from zope.interface import implements
 
+from globaleaks.utils.utility import is_compressible
+
+
+# headers meaningful only for a single connection that are not forwarded
+HOP_BY_HOP_HEADERS = [
+    b'connection',
+    b'keep-alive',
+    b'proxy-authenticate',
+    b'proxy-authorization',
+    b'te',
+    b'trailer',
+    b'transfer-encoding',
+    b'upgrade'
+]
+
+
+def remove_hop_by_hop_headers(headers):
+    for name in HOP_BY_HOP_HEADERS:
+        headers.removeHeader(name)
+
 
 class BodyStreamer(protocol.Protocol):
     def __init__(self, streamfunction, finished):
@@ -26,9 +46,9 @@ class BodyStreamer(protocol.Protocol):
 
 
 class BodyGzipStreamer(BodyStreamer):
-    def __init__(self, streamfunction, finished):
+    def __init__(self, streamfunction, finished, level=6):
         BodyStreamer.__init__(self, streamfunction, finished)
-        self.encoderGzip = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        self.encoderGzip = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
 
     def dataReceived(self, data):
         data = self.encoderGzip.compress(data)
@@ -88,8 +108,12 @@ class BodyProducer(object):
 
 
 class HTTPStreamProxyRequest(http.Request):
+    accept_gzip = False
     gzip = False
 
+    # the smaller bodies are not worth compressing
+    min_compression_size = 1024
+
     def __init__(self, *args, **kwargs):
         http.Request.__init__(self, *args, **kwargs)
 
@@ -111,9 +135,12 @@ class HTTPStreamProxyRequest(http.Request):
         hdrs = self.requestHeaders
         hdrs.setRawHeaders('GL-Forwarded-For', [self.getClientIP()])
 
+        # the connections to the backend are kept alive whatever the client requests
+        remove_hop_by_hop_headers(hdrs)
+
         accept_encoding = self.getHeader('Accept-Encoding')
         if accept_encoding is not None and 'gzip' in accept_encoding:
-            self.gzip = True
+            self.accept_gzip = True
 
         prod = None
         content_length = self.getHeader('Content-Length')
@@ -134,10 +161,35 @@ class HTTPStreamProxyRequest(http.Request):
 
         return NOT_DONE_YET
 
+    def should_compress(self, response):
+        """
+        Return True if the body of the response is worth compressing
+        according to its type and its size and it is not already encoded
+        """
+        if not self.accept_gzip or \
+           not self.channel.compression_level or \
+           self.method == b'HEAD' or \
+           response.code in (204, 304) or \
+           response.headers.hasHeader(b'content-encoding'):
+            return False
+
+        if isinstance(response.length, (int, long)) and response.length < self.min_compression_size:
+            return False
+
+        content_type = response.headers.getRawHeaders(b'content-type', [b''])[0]
+
+        return is_compressible(content_type.split(b';')[0].strip().lower())
+
     def proxySuccess(self, response):
         self.responseHeaders = response.headers
+        remove_hop_by_hop_headers(self.responseHeaders)
+
+        self.gzip = self.should_compress(response)
         if self.gzip:
             self.responseHeaders.setRawHeaders(b'content-encoding', [b'gzip'])
+            self.responseHeaders.addRawHeader(b'vary', b'Accept-Encoding')
+        elif isinstance(response.length, (int, long)) and self.method != b'HEAD':
+            self.responseHeaders.setRawHeaders(b'content-length', [b'%d' % response.length])
 
         self.responseHeaders.setRawHeaders('Strict-Transport-Security', ['max-age=31536000'])
 
@@ -146,7 +198,7 @@ class HTTPStreamProxyRequest(http.Request):
         d_forward = defer.Deferred()
 
         if self.gzip:
-            response.deliverBody(BodyGzipStreamer(self.write, d_forward))
+            response.deliverBody(BodyGzipStreamer(self.write, d_forward, self.channel.compression_level))
         else:
             response.deliverBody(BodyStreamer(self.write, d_forward))
 
@@ -170,26 +222,42 @@ class HTTPStreamProxyRequest(http.Request):
 class HTTPStreamChannel(http.HTTPChannel):
     requestFactory = HTTPStreamProxyRequest
 
-    def __init__(self, proxy_url, *args, **kwargs):
+    def __init__(self, proxy_url, http_agent, compression_level, *args, **kwargs):
         http.HTTPChannel.__init__(self, *args, **kwargs)
 
         self.proxy_url = proxy_url
-        self.http_agent = Agent(reactor, connectTimeout=30)
+        self.http_agent = http_agent
+        self.compression_level = compression_level
 
 
 class HTTPStreamFactory(http.HTTPFactory):
-    def __init__(self, proxy_url, *args, **kwargs):
+    """
+    Factory of the channels proxying the requests to the backend through a
+    pool of persistent connections shared by all the channels
+    """
+    maxPersistentConnections = 16
+    cachedConnectionTimeout = 60
+
+    def __init__(self, proxy_url, compression_level=6, *args, **kwargs):
         http.HTTPFactory.__init__(self, *args, **kwargs)
         self.proxy_url = proxy_url
+        self.compression_level = compression_level
         self.active_connections = 0
+        self.accepted_connections = 0
+
+        self.pool = HTTPConnectionPool(reactor, persistent=True)
+        self.pool.maxPersistentPerHost = self.maxPersistentConnections
+        self.pool.cachedConnectionTimeout = self.cachedConnectionTimeout
+        self.http_agent = Agent(reactor, connectTimeout=30, pool=self.pool)
 
     def buildProtocol(self, addr):
-        proto = HTTPStreamChannel(self.proxy_url)
+        proto = HTTPStreamChannel(self.proxy_url, self.http_agent, self.compression_level)
         _connectionMade = proto.connectionMade
         _connectionLost = proto.connectionLost
 
         def connectionMade(*args):
             self.active_connections += 1
+            self.accepted_connections += 1
             return _connectionMade(*args)
 
         def connectionLost(*args):
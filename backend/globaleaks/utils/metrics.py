@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+#
+#   metrics
+#   *******
+#
+# Metrics of the application exported by the /metrics handler in the text
+# format of Prometheus:
+#
+#   https://prometheus.io/docs/instrumenting/exposition_formats/
+#
+# The metrics are updated by the reactor and by the threads executing the
+# transactions so that every update is protected by the lock of the metric.
+import threading
+from collections import OrderedDict
+
+from datetime import datetime
+
+DURATION_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+SIZE_BUCKETS = [100, 1000, 10000, 100000, 1000000, 10000000, 100000000]
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+
+    return repr(float(value))
+
+
+def format_labels(labelnames, labelvalues):
+    if not labelnames:
+        return ''
+
+    return '{%s}' % ','.join('%s="%s"' % (name, unicode(value).replace('\\', '\\\\')
+                                                               .replace('\n', '\\n')
+                                                               .replace('"', '\\"'))
+                             for name, value in zip(labelnames, labelvalues))
+
+
+class Metric(object):
+    type = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def clear(self):
+        with self.lock: # pylint: disable=not-context-manager
+            self.values = {}
+
+    def samples(self):
+        """
+        Return the list of the samples of the metric as tuples of
+        (suffix, labelnames, labelvalues, value)
+        """
+        with self.lock: # pylint: disable=not-context-manager
+            return [('', self.labelnames, labelvalues, value) for labelvalues, value in sorted(self.values.items())]
+
+    def render(self):
+        lines = [
+            '# HELP %s %s' % (self.name, self.documentation),
+            '# TYPE %s %s' % (self.name, self.type)
+        ]
+
+        for suffix, labelnames, labelvalues, value in self.samples():
+            lines.append('%s%s%s %s' % (self.name, suffix, format_labels(labelnames, labelvalues), format_value(value)))
+
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, labelvalues=(), amount=1):
+        with self.lock: # pylint: disable=not-context-manager
+            self.values[labelvalues] = self.values.get(labelvalues, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    Gauge whose value is set explicitly or computed when the metrics are
+    collected by a function returning the value or a dictionary of the
+    values indexed by the tuples of the label values.
+    """
+    type = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        Metric.__init__(self, name, documentation, labelnames)
+        self.function = function
+
+    def set(self, value, labelvalues=()):
+        with self.lock: # pylint: disable=not-context-manager
+            self.values[labelvalues] = value
+
+    def samples(self):
+        if self.function is None:
+            return Metric.samples(self)
+
+        values = self.function()
+        if not isinstance(values, dict):
+            values = {(): values}
+
+        return [('', self.labelnames, labelvalues, value) for labelvalues, value in sorted(values.items())]
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+        Metric.__init__(self, name, documentation, labelnames)
+        self.buckets = list(buckets) + [float('inf')]
+
+    def observe(self, value, labelvalues=()):
+        with self.lock: # pylint: disable=not-context-manager
+            if labelvalues not in self.values:
+                self.values[labelvalues] = [[0] * len(self.buckets), 0.0]
+
+            counts = self.values[labelvalues][0]
+
+            i = 0
+            while value > self.buckets[i]:
+                i += 1
+
+            counts[i] += 1
+            self.values[labelvalues][1] += value
+
+    def samples(self):
+        with self.lock: # pylint: disable=not-context-manager
+            values = [(labelvalues, list(x[0]), x[1]) for labelvalues, x in sorted(self.values.items())]
+
+        ret = []
+        for labelvalues, counts, total in values:
+            count = 0
+            for bucket, bucket_count in zip(self.buckets, counts):
+                count += bucket_count
+                ret.append(('_bucket', self.labelnames + ('le',), labelvalues + (format_value(bucket),), count))
+
+            ret.append(('_sum', self.labelnames, labelvalues, total))
+            ret.append(('_count', self.labelnames, labelvalues, count))
+
+        return ret
+
+
+class MetricsRegistry(object):
+    def __init__(self):
+        self.metrics = OrderedDict()
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def clear(self):
+        for metric in self.metrics.values():
+            metric.clear()
+
+    def render(self):
+        return '\n'.join(metric.render() for metric in self.metrics.values()) + '\n'
+
+
+registry = MetricsRegistry()
+
+http_request_duration = registry.register(
+    Histogram('globaleaks_http_request_duration_seconds',
+              'Time spent serving the requests',
+              ('handler', 'method')))
+
+http_response_size = registry.register(
+    Histogram('globaleaks_http_response_size_bytes',
+              'Size of the bodies of the responses',
+              ('handler', 'method'),
+              SIZE_BUCKETS))
+
+http_responses = registry.register(
+    Counter('globaleaks_http_responses_total',
+            'Responses by status code',
+            ('handler', 'method', 'code')))
+
+transaction_queue_time = registry.register(
+    Histogram('globaleaks_transaction_queue_seconds',
+              'Time spent by the transactions waiting for a thread of their pool',
+              ('pool',)))
+
+transaction_lock_wait = registry.register(
+    Histogram('globaleaks_transaction_lock_wait_seconds',
+              'Time spent by the read-write transactions waiting for the transact_lock'))
+
+transaction_duration = registry.register(
+    Histogram('globaleaks_transaction_duration_seconds',
+              'Execution time of the transactions',
+              ('pool',)))
+
+job_duration = registry.register(
+    Histogram('globaleaks_job_duration_seconds',
+              'Execution time of the scheduled jobs',
+              ('job',)))
+
+
+def track_request(handler):
+    """
+    Record the metrics of a request once its response has been sent
+    """
+    request = handler.request
+    labelvalues = (handler.name, request.method)
+
+    http_request_duration.observe((datetime.now() - request.start_time).total_seconds(), labelvalues)
+    http_response_size.observe(getattr(request, 'sentLength', 0), labelvalues)
+    http_responses.inc(labelvalues + (request.code,))
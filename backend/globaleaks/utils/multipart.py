@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+#
+#  multipart
+#  *********
+#
+# Streaming parser of the multipart/form-data requests.
+#
+# The body of an upload is parsed while it is received: the values of the
+# form fields are collected in memory while the content of the file is
+# encrypted and written to disk by a worker thread; the transport is paused
+# while the data waiting to be written exceeds max_buffered_size so that the
+# memory used by an upload is bounded whatever the size of the file.
+import cgi
+
+from twisted.internet import defer, threads
+from twisted.web.server import Request
+
+from globaleaks.rest import errors
+from globaleaks.security import GLSecureTemporaryFile
+from globaleaks.settings import GLSettings
+from globaleaks.utils.utility import log
+
+
+class MultipartStream(object):
+    """
+    File-like object used as the content of the multipart/form-data
+    requests in place of the in-memory buffer of twisted.
+    """
+    max_fields_size = 64 * 1024
+    max_headers_size = 16 * 1024
+    max_buffered_size = 1024 * 1024
+
+    def __init__(self, transport, boundary, max_file_size):
+        self.transport = transport
+        self.delimiter = b'\r\n--' + boundary
+        self.max_file_size = max_file_size
+
+        self.fields = {}
+        self.fields_size = 0
+        self.field = None
+
+        self.file = None
+        self.file_size = 0
+        self.filename = None
+        self.in_file = False
+
+        # the first boundary is not preceded by a CRLF
+        self.buf = b'\r\n'
+        self.state = 'preamble'
+        self.error = None
+
+        self.pending = []
+        self.pending_size = 0
+        self.writing = False
+        self.paused = False
+        self.waiting = []
+        self.closed = False
+
+    def write(self, data):
+        if self.error is not None or self.state == 'end':
+            return
+
+        self.buf += data
+
+        try:
+            self.parse()
+        except errors.GLException as e:
+            self.fail(e)
+
+    def parse(self):
+        while True:
+            if self.state in ('preamble', 'body'):
+                idx = self.buf.find(self.delimiter)
+                if idx == -1:
+                    # the tail of the buffer may be the beginning of the delimiter
+                    keep = len(self.delimiter) - 1
+                    if len(self.buf) > keep:
+                        self.emit(self.buf[:-keep])
+                        self.buf = self.buf[-keep:]
+                    return
+
+                self.emit(self.buf[:idx])
+                self.buf = self.buf[idx + len(self.delimiter):]
+                self.field, self.in_file = None, False
+                self.state = 'delimiter'
+
+            if self.state == 'delimiter':
+                if self.buf.startswith(b'--'):
+                    self.buf = b''
+                    self.state = 'end'
+                    return
+
+                idx = self.buf.find(b'\r\n')
+                if idx == -1:
+                    if len(self.buf) > self.max_headers_size:
+                        raise errors.InvalidInputFormat("invalid multipart boundary")
+                    return
+
+                self.buf = self.buf[idx + 2:]
+                self.state = 'headers'
+
+            if self.state == 'headers':
+                idx = self.buf.find(b'\r\n\r\n')
+                if idx == -1:
+                    if len(self.buf) > self.max_headers_size:
+                        raise errors.InvalidInputFormat("multipart headers too large")
+                    return
+
+                self.start_part(self.buf[:idx])
+                self.buf = self.buf[idx + 4:]
+                self.state = 'body'
+
+    def start_part(self, headers):
+        params = {}
+        for line in headers.split(b'\r\n'):
+            name, _, value = line.partition(b':')
+            if name.strip().lower() == b'content-disposition':
+                _, params = cgi.parse_header(value.strip())
+
+        if 'name' not in params:
+            raise errors.InvalidInputFormat("multipart part without name")
+
+        if 'filename' not in params:
+            self.field = params['name']
+            self.fields.setdefault(self.field, []).append(b'')
+            return
+
+        if self.file is not None:
+            raise errors.InvalidInputFormat("multipart body with more than one file")
+
+        self.filename = params['filename']
+        self.file = GLSecureTemporaryFile(GLSettings.tmp_upload_path)
+        self.in_file = True
+
+    def emit(self, data):
+        if not data or self.state != 'body':
+            return
+
+        if not self.in_file:
+            self.fields_size += len(data)
+            if self.fields_size > self.max_fields_size:
+                raise errors.InvalidInputFormat("multipart fields too large")
+
+            self.fields[self.field][-1] += data
+            return
+
+        self.file_size += len(data)
+        if self.file_size > self.max_file_size:
+            log.err("File upload request rejected: file too big")
+            raise errors.FileTooBig(self.max_file_size / (1024 * 1024))
+
+        self.pending.append(data)
+        self.pending_size += len(data)
+
+        if self.pending_size > self.max_buffered_size and not self.paused:
+            self.paused = True
+            self.transport.pauseProducing()
+
+        self.write_pending()
+
+    def write_pending(self):
+        if self.writing or not self.pending:
+            return
+
+        data = b''.join(self.pending)
+        self.pending = []
+        self.writing = True
+
+        d = threads.deferToThread(self.file.write, data)
+        d.addCallbacks(self.written, self.write_failed, callbackArgs=(len(data),))
+
+    def written(self, _, size):
+        self.writing = False
+        self.pending_size -= size
+
+        if self.error is not None or self.closed:
+            self.close()
+            self.notify()
+            return
+
+        if self.paused and self.pending_size <= self.max_buffered_size / 2:
+            self.paused = False
+            self.transport.resumeProducing()
+
+        self.write_pending()
+        self.notify()
+
+    def write_failed(self, failure):
+        self.writing = False
+        log.err("Unable to write the uploaded file: %s", failure.getErrorMessage())
+        self.fail(errors.InternalServerError("Unable to write the uploaded file"))
+
+    def fail(self, error):
+        self.error = error
+        self.pending = []
+        self.pending_size = 0
+
+        # the rest of the body is consumed and discarded
+        if self.paused:
+            self.paused = False
+            self.transport.resumeProducing()
+
+        self.close()
+        self.notify()
+
+    def flush(self):
+        """
+        Return a deferred firing when all the body has been parsed and the
+        file has been written
+        """
+        if self.error is None and self.state != 'end':
+            self.fail(errors.InvalidInputFormat("incomplete multipart body"))
+
+        d = defer.Deferred()
+        self.waiting.append(d)
+        self.notify()
+        return d
+
+    def notify(self):
+        if self.writing or (self.pending and self.error is None):
+            return
+
+        waiting, self.waiting = self.waiting, []
+        for d in waiting:
+            if self.error is not None:
+                d.errback(self.error)
+            else:
+                d.callback(None)
+
+    def take_file(self):
+        """
+        Return the uploaded file that from now on is not closed by the stream
+        """
+        f, self.file = self.file, None
+        return f
+
+    def close(self):
+        self.closed = True
+
+        if self.file is not None and not self.writing:
+            self.file.close()
+            self.file = None
+
+    def seek(self, offset, whence=0):
+        pass
+
+    def read(self, size=-1):
+        return b''
+
+    def readline(self, size=-1):
+        return b''
+
+
+class MultipartRequest(Request):
+    """
+    Request streaming the body of the multipart/form-data requests into a
+    MultipartStream
+    """
+    def gotLength(self, length):
+        content_type = self.requestHeaders.getRawHeaders(b'content-type', [b''])[0]
+        key, pdict = cgi.parse_header(content_type)
+
+        if self.channel is not None and key == 'multipart/form-data' and pdict.get('boundary'):
+            self.content = MultipartStream(self.channel.transport,
+                                           pdict['boundary'],
+                                           GLSettings.memory_copy.maximum_filesize * 1024 * 1024)
+        else:
+            Request.gotLength(self, length)
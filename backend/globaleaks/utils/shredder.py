@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+#
+#   shredder
+#   ********
+#
+# Secure deletion of the files.
+#
+# The files are overwritten in place by a pass of zeros, a pass of ones and a
+# pass of random data, each one written in large buffers and synced to the
+# disk before the next one, and are then removed.
+#
+# The progress of the deletion of each file is reported at regular
+# checkpoints so that a deletion interrupted by a restart can be resumed
+# where it stopped; the files are shredded by a bounded number of threads
+# sharing the same budget of I/O bandwidth so that the deletion of large
+# files does not starve the rest of the system.
+import os
+import threading
+import time
+from Queue import Queue, Empty
+
+from globaleaks.settings import GLSettings
+from globaleaks.utils.utility import log
+
+PASSES = 3
+
+fdatasync = getattr(os, 'fdatasync', os.fsync)
+
+
+def get_pattern(pass_number, size):
+    if pass_number == 0:
+        return b'\0' * size
+    elif pass_number == 1:
+        return b'\xff' * size
+
+    return os.urandom(size)
+
+
+class Bandwidth(object):
+    """
+    Budget of bytes per second shared by the threads writing to the disk;
+    a rate of 0 disables the limit.
+    """
+    def __init__(self, rate):
+        self.rate = rate
+        self.lock = threading.Lock()
+        self.available_time = 0
+
+    def consume(self, size):
+        """
+        Wait until the budget allows to write the given number of bytes
+        """
+        if not self.rate:
+            return
+
+        with self.lock:
+            now = time.time()
+            start = max(now, self.available_time)
+            self.available_time = start + float(size) / self.rate
+
+        if start > now:
+            time.sleep(start - now)
+
+
+def shred_file(path, pass_number=0, offset=0, bandwidth=None, checkpoint=None):
+    """
+    Overwrite the file starting from the given pass and offset and remove it
+
+    @param checkpoint: a function called with the pass and the offset
+                       reached every GLSettings.shredder_checkpoint_size
+                       bytes synced to the disk and at the end of each pass
+    """
+    buffer_size = GLSettings.shredder_buffer_size
+    size = os.path.getsize(path)
+
+    with open(path, 'r+b', 0) as f:
+        while pass_number < PASSES:
+            pattern = get_pattern(pass_number, buffer_size)
+            written = 0
+
+            f.seek(offset)
+            while offset < size:
+                length = min(buffer_size, size - offset)
+                if bandwidth is not None:
+                    bandwidth.consume(length)
+
+                f.write(pattern if length == buffer_size else pattern[:length])
+                offset += length
+                written += length
+
+                if checkpoint is not None and written >= GLSettings.shredder_checkpoint_size and offset < size:
+                    fdatasync(f.fileno())
+                    checkpoint(pass_number, offset)
+                    written = 0
+
+            fdatasync(f.fileno())
+
+            pass_number, offset = pass_number + 1, 0
+            if checkpoint is not None:
+                checkpoint(pass_number, offset)
+
+    os.remove(path)
+
+
+class Shredder(object):
+    """
+    Shred files with a bounded number of threads sharing the same bandwidth
+    """
+    def __init__(self, workers=None, bandwidth=None):
+        self.workers = workers if workers is not None else GLSettings.shredder_workers
+        self.bandwidth = Bandwidth(bandwidth if bandwidth is not None else GLSettings.shredder_bandwidth)
+
+    def shred(self, files, checkpoint=None, done=None):
+        """
+        Shred the files and return when all of them have been processed
+
+        @param files: a list of tuples (path, pass_number, offset)
+        @param checkpoint: a function called with the path, the pass and the
+                           offset reached at each checkpoint of a file
+        @param done: a function called with the path of each file processed
+        """
+        queue = Queue()
+        for f in files:
+            queue.put(f)
+
+        def worker():
+            while True:
+                try:
+                    path, pass_number, offset = queue.get_nowait()
+                except Empty:
+                    return
+
+                try:
+                    self.shred_file(path, pass_number, offset, checkpoint, done)
+                except Exception as excep:
+                    log.err("Unable to complete the secure deletion of file %s: %s", path, excep)
+
+        threads = [threading.Thread(target=worker) for _ in range(min(self.workers, len(files)))]
+        for t in threads:
+            t.start()
+
+        for t in threads:
+            t.join()
+
+    def shred_file(self, path, pass_number=0, offset=0, checkpoint=None, done=None):
+        log.debug("Starting secure deletion of file %s", path)
+
+        try:
+            shred_file(path, pass_number, offset, self.bandwidth,
+                       None if checkpoint is None else lambda p, o: checkpoint(path, p, o))
+        except Exception as excep:
+            log.err("Unable to perform secure overwrite for file %s: %s", path, excep)
+
+            try:
+                if os.path.exists(path):
+                    os.remove(path)
+            except OSError as excep:
+                log.err("Unable to perform unlink operation on file %s: %s", path, excep)
+
+        log.debug("Performed deletion of file: %s", path)
+
+        if done is not None:
+            done(path)
@@ -115,17 +115,26 @@ class _ConnectionProxy(object):
 @implementer(IOpenSSLServerConnectionCreator)
 class SNIMap(object):
     def __init__(self, mapping):
-        self.mapping = mapping
         self._negotiationDataForContext = collections.defaultdict(
             _NegotiationData
         )
 
-        self.context = self.mapping['DEFAULT'].getContext()
+        self.set_mapping(mapping)
+
+    def set_mapping(self, mapping):
+        """
+        Replace the contexts used by the new connections; the established
+        connections keep using the contexts they have been created with.
+        """
+        context = mapping['DEFAULT'].getContext()
 
-        self.context.set_tlsext_servername_callback(
+        context.set_tlsext_servername_callback(
             self.selectContext
         )
 
+        self.mapping = mapping
+        self.context = context
+
     def selectContext(self, connection):
         common_name = connection.get_servername()
 
@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
 
+import ctypes
 import re
 
+from cryptography.hazmat.bindings._openssl import lib as _raw_lib
 from OpenSSL import crypto, SSL
 from OpenSSL._util import lib as _lib, ffi as _ffi
 from OpenSSL.crypto import load_certificate, load_privatekey, FILETYPE_PEM, TYPE_RSA, PKey, dump_certificate_request, \
@@ -9,6 +11,14 @@ from OpenSSL.crypto import load_certificate, load_privatekey, FILETYPE_PEM, TYPE
 from twisted.internet import ssl
 
 
+# SSL_CTX_set_tlsext_ticket_keys is a macro of SSL_CTX_ctrl
+SSL_CTRL_SET_TLSEXT_TICKET_KEYS = 59
+
+# key name of 16 bytes followed by the HMAC and the AES keys of 16 bytes
+# each up to openssl 1.0.2 and of 32 bytes each since openssl 1.1.0
+TLS_TICKET_KEYS_LENGTH = 80 if SSL.OPENSSL_VERSION_NUMBER >= 0x10100000 else 48
+
+
 class ValidationException(Exception):
     pass
 
@@ -145,6 +155,69 @@ def new_tls_server_context():
     return ctx
 
 
+_libssl = []
+
+
+def get_libssl():
+    """
+    Return the libssl loaded by the bindings of pyOpenSSL as a ctypes library
+    giving access to the functions not exposed by the bindings, or None if
+    the bindings are linked statically to their own copy of openssl.
+    """
+    if _libssl:
+        return _libssl[0]
+
+    _libssl.append(None)
+
+    address = int(_ffi.cast('uintptr_t', _ffi.addressof(_raw_lib, 'SSL_CTX_new')))
+
+    try:
+        with open('/proc/self/maps', 'r') as f:
+            paths = set(line.split()[-1] for line in f if '/libssl.so' in line)
+    except IOError:
+        paths = set()
+
+    for path in paths:
+        try:
+            libssl = ctypes.CDLL(path)
+        except OSError:
+            continue
+
+        if ctypes.cast(libssl.SSL_CTX_new, ctypes.c_void_p).value == address:
+            libssl.SSL_CTX_ctrl.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_long, ctypes.c_void_p]
+            libssl.SSL_CTX_ctrl.restype = ctypes.c_long
+            _libssl[0] = libssl
+            break
+
+    return _libssl[0]
+
+
+def set_tls_ticket_keys(ctx, keys):
+    """
+    Set the keys used to encrypt the session tickets in place of the random
+    ones generated by openssl for every context.
+
+    The session tickets are enabled only on the contexts whose keys have
+    been set, as these keys are rotated; otherwise they stay disabled so
+    that they are not encrypted for the whole life of the worker with the
+    random keys of openssl.
+
+    :return: True if the keys have been set
+    """
+    libssl = get_libssl()
+    if libssl is not None and len(keys) == TLS_TICKET_KEYS_LENGTH:
+        buf = ctypes.create_string_buffer(keys, len(keys))
+        ctx_ptr = int(_ffi.cast('uintptr_t', ctx._context))
+
+        if libssl.SSL_CTX_ctrl(ctx_ptr, SSL_CTRL_SET_TLSEXT_TICKET_KEYS, len(keys), buf) == 1:
+            _lib.SSL_CTX_clear_options(ctx._context, SSL.OP_NO_TICKET)
+            return True
+
+    ctx.set_options(SSL.OP_NO_TICKET)
+
+    return False
+
+
 class TLSClientContextFactory(ssl.ClientContextFactory):
     def getContext(self):
         return new_tls_client_context()
@@ -176,6 +249,14 @@ class TLSServerContextFactory(ssl.ContextFactory):
         ecdh = _ffi.gc(ecdh, _lib.EC_KEY_free)
         _lib.SSL_CTX_set_tmp_ecdh(self.ctx._context, ecdh)
 
+    def set_ticket_keys(self, keys, lifetime):
+        """
+        Set the keys of the session tickets valid for the lifetime specified
+        """
+        self.ctx.set_timeout(lifetime)
+
+        return set_tls_ticket_keys(self.ctx, keys)
+
     def getContext(self):
         return self.ctx
 
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+#
+#   tracing
+#   *******
+#
+# Opt-in tracing of the requests enabled by --tracing.
+#
+# The spans of a request are recorded in the Trace attached to the request.
+# The trace is propagated to the transactions started by the handler through
+# the context of twisted (twisted.python.context) so that the time spent by
+# each transaction waiting for its thread pool, for the transact_lock and for
+# the database is attributed to the request.
+import json
+import random
+import time
+from collections import OrderedDict
+
+from twisted.internet import defer
+from twisted.python import context
+
+from globaleaks.settings import GLSettings
+from globaleaks.utils.utility import log
+
+
+class Trace(object):
+    def __init__(self, name, method):
+        self.name = name
+        self.method = method
+        self.start = time.time()
+        self.spans = []
+
+    def add_span(self, name, start, duration, description=''):
+        self.spans.append((name, start - self.start, duration, description))
+
+    def get_server_timing(self):
+        """
+        Return the value of the Server-Timing header summing the durations
+        of the spans with the same name
+        """
+        durations = OrderedDict()
+        for name, _, duration, _ in self.spans:
+            durations[name] = durations.get(name, 0) + duration
+
+        durations['total'] = time.time() - self.start
+
+        return ', '.join('%s;dur=%.1f' % (name, duration * 1000) for name, duration in durations.items())
+
+    def serialize(self, code):
+        return {
+            'handler': self.name,
+            'method': self.method,
+            'code': code,
+            'start': self.start,
+            'duration': time.time() - self.start,
+            'spans': [{
+                'name': name,
+                'start': start,
+                'duration': duration,
+                'description': description
+            } for name, start, duration, description in self.spans]
+        }
+
+
+def get_current_trace():
+    return context.get(Trace)
+
+
+def call_with_trace(trace, f, *args, **kwargs):
+    return context.call({Trace: trace}, f, *args, **kwargs)
+
+
+def propagate_trace(d, trace):
+    """
+    Return a deferred firing with the result of the deferred specified and
+    executing its callbacks in the context of the trace
+    """
+    ret = defer.Deferred()
+    d.addBoth(lambda result: call_with_trace(trace, ret.callback, result))
+    return ret
+
+
+def save_trace(trace, code):
+    """
+    Append to the tracefile a sample of the traces
+    """
+    if random.random() >= GLSettings.trace_sample_rate:
+        return
+
+    try:
+        with open(GLSettings.tracefile, 'a') as f:
+            f.write(json.dumps(trace.serialize(code)) + '\n')
+    except IOError as excep:
+        log.err("Unable to write the trace of the request: %s", excep)
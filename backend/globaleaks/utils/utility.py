@@ -372,3 +372,22 @@ def bytes_to_pretty_str(b):
         return "%dMB" % int(b / 1000000)
 
     return "%dKB" % int(b / 1000)
+
+
+COMPRESSIBLE_TYPES = [
+    'application/javascript',
+    'application/json',
+    'application/x-javascript',
+    'application/xml',
+    'image/svg+xml',
+    'image/x-icon'
+]
+
+
+def is_compressible(content_type):
+    """
+    Return True if the content of the type specified is worth compressing;
+    the images, the fonts and the archives are already compressed while the
+    files of unknown type may be encrypted.
+    """
+    return content_type.startswith('text/') or content_type in COMPRESSIBLE_TYPES
@@ -89,9 +89,104 @@ class CfgFDProcProtocol(ProcessProtocol):
         return "<%s: %s:%s>" % (self.__class__.__name__, id(self), self.transport)
 
 
-class HTTPSProcProtocol(CfgFDProcProtocol):
+class RequestFDProcProtocol(CfgFDProcProtocol):
+    """
+    Protocol sending to the child process requests serialized as lines of
+    JSON over request_fd and receiving the responses over response_fd
+    """
+    request_fd = 43
+    response_fd = 44
+
     def __init__(self, supervisor, cfg, cfg_fd=42):
         CfgFDProcProtocol.__init__(self, supervisor, cfg, cfg_fd)
 
+        self.fd_map[self.request_fd] = 'w'
+        self.fd_map[self.response_fd] = 'r'
+
+        self.buffer = ''
+        self.counter = 0
+        self.pending = {}
+
+    def send_request(self, request):
+        self.counter += 1
+
+        request['id'] = self.counter
+
+        d = self.pending[self.counter] = defer.Deferred()
+
+        self.transport.writeToChild(self.request_fd, json.dumps(request) + '\n')
+
+        return d
+
+    def childDataReceived(self, childFD, data):
+        if childFD != self.response_fd:
+            return CfgFDProcProtocol.childDataReceived(self, childFD, data)
+
+        self.buffer += data
+        while '\n' in self.buffer:
+            line, self.buffer = self.buffer.split('\n', 1)
+
+            response = json.loads(line)
+
+            # the messages sent by the child on its own initiative have no id
+            if 'id' not in response:
+                self.messageReceived(response)
+                continue
+
+            d = self.pending.pop(response['id'])
+            if 'error' in response:
+                d.errback(Exception(response['error']))
+            else:
+                d.callback(response)
+
+    def messageReceived(self, message):
+        pass
+
+    def processEnded(self, reason):
+        pending, self.pending = self.pending, {}
+        for d in pending.values():
+            d.errback(reason)
+
+        CfgFDProcProtocol.processEnded(self, reason)
+
+
+class HTTPSProcProtocol(RequestFDProcProtocol):
+    def __init__(self, supervisor, cfg, cfg_fd=42):
+        RequestFDProcProtocol.__init__(self, supervisor, cfg, cfg_fd)
+
         for tls_socket_fd in cfg['tls_socket_fds']:
             self.fd_map[tls_socket_fd] = tls_socket_fd
+
+        self.stats = {
+            'active_connections': 0,
+            'handshake_rate': 0
+        }
+
+    def messageReceived(self, message):
+        if 'stats' in message:
+            self.stats = message['stats']
+
+    def load_site_cfgs(self, site_cfgs):
+        """
+        Push to the worker the TLS configurations of the sites to be used
+        by the new connections
+        """
+        return self.send_request({'site_cfgs': site_cfgs})
+
+    def set_ticket_keys(self, ticket_keys):
+        """
+        Push to the worker the new keys of the session tickets
+        """
+        return self.send_request({'ticket_keys': ticket_keys})
+
+
+class KDFProcProtocol(RequestFDProcProtocol):
+    def hash_password(self, password, salt):
+        d = self.send_request({
+            'password': password,
+            'salt': salt
+        })
+
+        d.addCallback(lambda response: str(response['hash']))
+
+        return d
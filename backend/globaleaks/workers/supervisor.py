@@ -1,37 +1,90 @@
 # -*- encoding: utf-8 -*-
 import logging
-import multiprocessing
+import math
 import os
 import signal
 from sys import executable
 
+from cryptography.hazmat.primitives import constant_time
+
 from globaleaks.models.config import PrivateFactory, load_tls_dict_list
 from globaleaks.orm import transact
+from globaleaks.security import hash_password
+from globaleaks.settings import GLSettings
 from globaleaks.utils import tls
 from globaleaks.utils.utility import log, datetime_now, datetime_to_ISO8601
-from globaleaks.workers.process import HTTPSProcProtocol
-from twisted.internet import defer, reactor
+from globaleaks.workers.process import HTTPSProcProtocol, KDFProcProtocol
+from twisted.internet import defer, error, reactor, threads
+from twisted.internet.task import LoopingCall
 
 
-class ProcessSupervisor(object):
+class WorkerSupervisor(object):
     """
-    A supervisor for all subprocesses that the main globaleaks process can launch
+    Accounting of the deaths of the workers of a pool deciding whether the
+    workers that died are to be respawned
     """
     MAX_MORTALITY_RATE = 0.2
 
+    shutting_down = False
+
+    def __init__(self, target_proc_num):
+        self.start_time = datetime_now()
+        self.process_state = {
+            'deaths': 0,
+            'last_death': datetime_now(),
+            'target_proc_num': target_proc_num,
+        }
+
+    def get_active_workers(self):
+        raise NotImplementedError
+
+    def should_spawn_child(self, mort_rate):
+        # TODO add logging based on condition hit
+
+        if self.shutting_down:
+            return False
+
+        nrml_deaths = 3 * self.process_state['target_proc_num']
+
+        # TODO hitting this condition means something is really wrong. Log it.
+        max_deaths = nrml_deaths * 150
+
+        num_deaths = self.process_state['deaths']
+
+        return len(self.get_active_workers()) < self.process_state['target_proc_num'] and \
+               num_deaths < max_deaths and \
+               (mort_rate < self.MAX_MORTALITY_RATE or num_deaths < nrml_deaths)
+
+    def calc_mort_rate(self):
+        d = self.process_state['deaths']
+        window = (datetime_now() - self.start_time).total_seconds()
+        return d / (window / 60.0) # deaths per minute
+
+    def account_death(self):
+        self.process_state['deaths'] += 1
+        r = self.calc_mort_rate()
+        log.debug('process death accountant: r=%3f, d=%2f', r, self.process_state['deaths'])
+        return r
+
+
+class ProcessSupervisor(WorkerSupervisor):
+    """
+    A supervisor for all subprocesses that the main globaleaks process can launch
+    """
     def __init__(self, net_sockets, proxy_ip, proxy_port):
         log.info("Starting process monitor")
 
+        WorkerSupervisor.__init__(self, GLSettings.https_workers_min)
+
         self.shutting_down = False
         self.shutdown_d = defer.Deferred()
 
-        self.start_time = datetime_now()
         self.tls_process_pool = []
-        self.tls_process_state = {
-            'deaths': 0,
-            'last_death': datetime_now(),
-            'target_proc_num': multiprocessing.cpu_count(),
-        }
+        self.tls_process_retiring = []
+        self.process_state['last_scaling'] = None
+
+        self.scaling = LoopingCall(self.scale_https_workers)
+        self.ticket_keys_rotation = LoopingCall(self.rotate_ticket_keys)
 
         self.worker_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'worker_https.py')
 
@@ -39,6 +92,10 @@ class ProcessSupervisor(object):
           'proxy_ip': proxy_ip,
           'proxy_port': proxy_port,
           'debug': log.loglevel <= logging.DEBUG,
+          'compression_level': GLSettings.https_compression_level,
+          'ticket_keys': os.urandom(tls.TLS_TICKET_KEYS_LENGTH).encode('hex'),
+          'ticket_key_lifetime': GLSettings.https_ticket_key_lifetime,
+          'stats_interval': GLSettings.https_workers_scaling_interval,
           'site_cfgs': [],
         }
 
@@ -47,14 +104,13 @@ class ProcessSupervisor(object):
 
         self.tls_cfg['tls_socket_fds'] = [ns.fileno() for ns in net_sockets]
 
-    def db_maybe_launch_https_workers(self, store):
-        privFact = PrivateFactory(store)
-
-        on = privFact.get_val(u'https_enabled')
-        if not on:
-            log.info("Not launching workers")
-            return defer.succeed(None)
+    def db_load_site_cfgs(self, store):
+        """
+        Load in the configuration passed to the workers the TLS configurations
+        of the sites that are valid
 
+        :return: None or the error of the last configuration found invalid
+        """
         site_cfgs = load_tls_dict_list(store)
 
         valid_cfgs, err = [], None
@@ -67,10 +123,25 @@ class ProcessSupervisor(object):
 
         self.tls_cfg['site_cfgs'] = valid_cfgs
 
-        if not valid_cfgs:
+        return err
+
+    def db_maybe_launch_https_workers(self, store):
+        privFact = PrivateFactory(store)
+
+        on = privFact.get_val(u'https_enabled')
+        if not on:
+            log.info("Not launching workers")
+            return defer.succeed(None)
+
+        err = self.db_load_site_cfgs(store)
+
+        if not self.tls_cfg['site_cfgs']:
             log.info("Not launching https workers due to %s", err)
             return defer.fail(err)
 
+        if tls.get_libssl() is None:
+            log.info("The keys of the TLS session tickets cannot be shared by the https workers; session tickets disabled")
+
         log.info("Decided to launch https workers")
         return self.launch_https_workers()
 
@@ -78,14 +149,66 @@ class ProcessSupervisor(object):
     def maybe_launch_https_workers(self, store):
         self.db_maybe_launch_https_workers(store)
 
+    @transact
+    def load_site_cfgs(self, store):
+        return self.db_load_site_cfgs(store)
+
+    @defer.inlineCallbacks
+    def maybe_reload_https_workers(self):
+        """
+        Push the current TLS configurations of the sites to the running
+        workers, that swap them for the new connections without dropping the
+        established ones; if no worker is running they are launched.
+        """
+        if not self.is_running() or self.shutting_down:
+            yield self.maybe_launch_https_workers()
+            return
+
+        err = yield self.load_site_cfgs()
+
+        if not self.tls_cfg['site_cfgs']:
+            log.err("Not reloading the https workers due to %s", err)
+            raise err
+
+        results = yield defer.DeferredList([pp.load_site_cfgs(self.tls_cfg['site_cfgs'])
+                                            for pp in self.tls_process_pool], consumeErrors=True)
+
+        for ok, result in results:
+            if not ok:
+                log.err("Failed to reload the configuration of an https worker: %s", result.getErrorMessage())
+
     def launch_https_workers(self):
-        self.tls_process_state['deaths'] = 0
-        self.tls_process_state['last_death'] = datetime_now()
+        self.process_state['deaths'] = 0
+        self.process_state['last_death'] = datetime_now()
+        self.process_state['target_proc_num'] = GLSettings.https_workers_min
 
-        d_lst = [self.launch_worker() for _ in range(self.tls_process_state['target_proc_num'])]
+        d_lst = [self.launch_worker() for _ in range(self.process_state['target_proc_num'])]
+
+        if not self.scaling.running:
+            self.scaling.start(GLSettings.https_workers_scaling_interval, now=False)
+
+        if not self.ticket_keys_rotation.running:
+            self.ticket_keys_rotation.start(GLSettings.https_ticket_key_lifetime, now=False)
 
         return defer.DeferredList(d_lst)
 
+    @defer.inlineCallbacks
+    def rotate_ticket_keys(self):
+        """
+        Push new random keys of the session tickets to the workers, which
+        discard the previous ones; the keys are never derived from a secret
+        living longer than them so that the tickets issued before a rotation
+        cannot be decrypted even if the current keys are compromised.
+        """
+        self.tls_cfg['ticket_keys'] = os.urandom(tls.TLS_TICKET_KEYS_LENGTH).encode('hex')
+
+        results = yield defer.DeferredList([pp.set_ticket_keys(self.tls_cfg['ticket_keys'])
+                                            for pp in self.tls_process_pool], consumeErrors=True)
+
+        for ok, result in results:
+            if not ok:
+                log.err("Failed to rotate the keys of the session tickets of an https worker: %s", result.getErrorMessage())
+
     def launch_worker(self):
         pp = HTTPSProcProtocol(self, self.tls_cfg)
         reactor.spawnProcess(pp, executable, [executable, self.worker_path], childFDs=pp.fd_map, env=os.environ)
@@ -93,6 +216,64 @@ class ProcessSupervisor(object):
         log.info('Launched: %s', pp)
         return pp.startup_promise
 
+    def retire_worker(self, pp):
+        """
+        Stop a worker letting it complete the connections in progress
+        """
+        self.tls_process_retiring.append(pp)
+
+        try:
+            pp.transport.signalProcess(signal.SIGUSR1)
+        except OSError as e:
+            log.debug('Tried to signal: %d got: %s', pp.transport.pid, e)
+
+    def get_active_workers(self):
+        return [pp for pp in self.tls_process_pool if pp not in self.tls_process_retiring]
+
+    def scale_https_workers(self):
+        """
+        Scale the workers between https_workers_min and https_workers_max
+        according to the load they report; the workers are added all at once
+        when the load increases while they are retired one at a time when it
+        decreases.
+        """
+        workers = self.get_active_workers()
+        if self.shutting_down or not workers:
+            return
+
+        connections = sum(pp.stats['active_connections'] for pp in workers)
+        handshake_rate = sum(pp.stats['handshake_rate'] for pp in workers)
+
+        needed = max(int(math.ceil(float(connections) / GLSettings.https_worker_target_connections)),
+                     int(math.ceil(float(handshake_rate) / GLSettings.https_worker_target_handshake_rate)))
+
+        needed = max(GLSettings.https_workers_min, min(GLSettings.https_workers_max, needed))
+
+        current = self.process_state['target_proc_num']
+        if needed > current:
+            target = needed
+        elif needed < current:
+            target = current - 1
+        else:
+            return
+
+        msg = "Scaled the https workers from %d to %d (connections: %d, handshakes/s: %.1f)" % \
+              (current, target, connections, handshake_rate)
+
+        log.info(msg)
+
+        self.process_state['target_proc_num'] = target
+        self.process_state['last_scaling'] = {
+            'msg': msg,
+            'timestamp': datetime_to_ISO8601(datetime_now())
+        }
+
+        for _ in range(target - len(workers)):
+            self.launch_worker()
+
+        for pp in workers[target:]:
+            self.retire_worker(pp)
+
     def handle_worker_death(self, pp, reason):
         """
         handle_worker_death accounts the worker's death and creates a new process
@@ -100,11 +281,21 @@ class ProcessSupervisor(object):
         restarted the child an unreasonable number of times.
         """
         log.debug("Subprocess: %s exited with: %s", pp, reason)
-        mortatility_rate = self.account_death()
         self.tls_process_pool.pop(self.tls_process_pool.index(pp))
+
+        if pp in self.tls_process_retiring:
+            self.tls_process_retiring.remove(pp)
+            mortatility_rate = self.calc_mort_rate()
+            retired = not self.shutting_down
+        else:
+            mortatility_rate = self.account_death()
+            retired = False
+
         del pp
 
-        if self.should_spawn_child(mortatility_rate):
+        if retired:
+            log.debug('Retired a child')
+        elif self.should_spawn_child(mortatility_rate):
             log.debug('Decided to respawn a child')
             self.launch_worker()
         elif self.last_one_out():
@@ -115,23 +306,6 @@ class ProcessSupervisor(object):
         else:
             log.err("Not relaunching child process")
 
-    def should_spawn_child(self, mort_rate):
-        # TODO add logging based on condition hit
-
-        if self.shutting_down:
-            return False
-
-        nrml_deaths = 3 * self.tls_process_state['target_proc_num']
-
-        # TODO hitting this condition means something is really wrong. Log it.
-        max_deaths = nrml_deaths * 150
-
-        num_deaths = self.tls_process_state['deaths']
-
-        return len(self.tls_process_pool) < self.tls_process_state['target_proc_num'] and \
-               num_deaths < max_deaths and \
-               (mort_rate < self.MAX_MORTALITY_RATE or num_deaths < nrml_deaths)
-
     def last_one_out(self):
         """
         last_one_out captures the condition of the last shutdown process before
@@ -139,17 +313,6 @@ class ProcessSupervisor(object):
         """
         return self.shutting_down and len(self.tls_process_pool) == 0
 
-    def calc_mort_rate(self):
-        d = self.tls_process_state['deaths']
-        window = (datetime_now() - self.start_time).total_seconds()
-        return d / (window / 60.0) # deaths per minute
-
-    def account_death(self):
-        self.tls_process_state['deaths'] += 1
-        r = self.calc_mort_rate()
-        log.debug('process death accountant: r=%3f, d=%2f', r, self.tls_process_state['deaths'])
-        return r
-
     def is_running(self):
         return len(self.tls_process_pool) > 0
 
@@ -174,11 +337,27 @@ class ProcessSupervisor(object):
 
         s['msg'] = m
 
+        s['workers'] = {
+            'running': len(self.get_active_workers()),
+            'retiring': len(self.tls_process_retiring),
+            'target': self.process_state['target_proc_num'],
+            'min': GLSettings.https_workers_min,
+            'max': GLSettings.https_workers_max
+        }
+
+        s['last_scaling'] = self.process_state['last_scaling']
+
         return s
 
     def shutdown(self):
         log.debug('Starting shutdown of %d children', len(self.tls_process_pool))
 
+        if self.scaling.running:
+            self.scaling.stop()
+
+        if self.ticket_keys_rotation.running:
+            self.ticket_keys_rotation.stop()
+
         # Handle condition where shutdown is called with no active children
         if not self.is_running():
             return defer.succeed(None)
@@ -192,3 +371,98 @@ class ProcessSupervisor(object):
                 log.debug('Tried to signal: %d got: %s', pp.transport.pid, e)
 
         return self.shutdown_d
+
+
+class KDFPool(WorkerSupervisor):
+    """
+    A pool of worker processes computing the scrypt hashes.
+
+    The hashes are computed in parallel on all the cores and before entering
+    the transactions, so that they do not keep busy the transact_lock and
+    the thread pool of the ORM; while the pool is not running, and for the
+    hashes pending on a worker that died, the hashes are computed in the
+    thread pool of the reactor.
+    """
+    def __init__(self):
+        WorkerSupervisor.__init__(self, 0)
+
+        self.shutting_down = False
+        self.shutdown_d = None
+        self.process_pool = []
+
+        self.worker_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'worker_kdf.py')
+
+        self.cfg = {
+          'debug': log.loglevel <= logging.DEBUG
+        }
+
+    def start(self, processes):
+        self.shutting_down = False
+
+        self.process_state['deaths'] = 0
+        self.process_state['last_death'] = datetime_now()
+        self.process_state['target_proc_num'] = processes
+
+        return defer.DeferredList([self.launch_worker() for _ in range(processes)])
+
+    def launch_worker(self):
+        pp = KDFProcProtocol(self, self.cfg)
+        reactor.spawnProcess(pp, executable, [executable, self.worker_path], childFDs=pp.fd_map, env=os.environ)
+        self.process_pool.append(pp)
+        return pp.startup_promise
+
+    def handle_worker_death(self, pp, reason):
+        log.debug("Subprocess: %s exited with: %s", pp, reason)
+        self.process_pool.remove(pp)
+
+        if self.shutting_down:
+            if not self.is_running():
+                self.shutting_down = False
+                self.shutdown_d.callback(None)
+        elif self.should_spawn_child(self.account_death()):
+            log.err("KDF worker died unexpectedly; relaunching it")
+            self.launch_worker()
+        else:
+            log.err("KDF worker died unexpectedly; not relaunching it")
+
+    def get_active_workers(self):
+        return self.process_pool
+
+    def is_running(self):
+        return len(self.process_pool) > 0
+
+    def hash_password(self, password, salt):
+        if not self.is_running():
+            return threads.deferToThread(hash_password, password, salt)
+
+        def worker_died(failure):
+            failure.trap(error.ProcessDone, error.ProcessTerminated)
+            return threads.deferToThread(hash_password, password, salt)
+
+        pp = min(self.process_pool, key=lambda pp: len(pp.pending))
+
+        return pp.hash_password(password, salt).addErrback(worker_died)
+
+    @defer.inlineCallbacks
+    def check_password(self, guessed_password, salt, password_hash):
+        guessed_password_hash = yield self.hash_password(guessed_password, salt)
+
+        defer.returnValue(constant_time.bytes_eq(guessed_password_hash, bytes(password_hash)))
+
+    def shutdown(self):
+        if not self.is_running():
+            return defer.succeed(None)
+
+        self.shutting_down = True
+        self.shutdown_d = defer.Deferred()
+
+        for pp in self.process_pool:
+            try:
+                pp.transport.signalProcess(signal.SIGTERM)
+            except OSError as e:
+                log.debug('Tried to signal: %d got: %s', pp.transport.pid, e)
+
+        return self.shutdown_d
+
+
+kdf_pool = KDFPool()
@@ -1,4 +1,5 @@
 # -*- encoding: utf-8 -*-
+import json
 import os
 import sys
 
@@ -6,10 +7,11 @@ if os.path.dirname(__file__) != '/usr/lib/python2.7/dist-packages/globaleaks/wor
     sys.path.insert(1, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 
 from datetime import timedelta
-from twisted.internet import reactor
+from twisted.internet import reactor, stdio
 from twisted.internet.task import LoopingCall
+from twisted.protocols.basic import LineReceiver
 
-from globaleaks.workers.process import Process
+from globaleaks.workers.process import Process, HTTPSProcProtocol
 from globaleaks.utils.sock import listen_tls_on_sock
 from globaleaks.utils.sni import SNIMap
 from globaleaks.utils.tls import TLSServerContextFactory, ChainValidator
@@ -24,6 +26,34 @@ def make_TLSContextFactory(site_cfg):
                                    site_cfg['ssl_dh'])
 
 
+class HTTPSControlProtocol(LineReceiver):
+    """
+    Protocol receiving from the supervisor the new TLS configurations of the
+    sites and the new keys of the session tickets to be loaded without
+    restarting the worker
+    """
+    delimiter = '\n'
+
+    def __init__(self, process):
+        self.process = process
+
+    def lineReceived(self, line):
+        request = json.loads(line)
+
+        response = {'id': request['id']}
+
+        try:
+            if 'site_cfgs' in request:
+                self.process.load_site_cfgs(request['site_cfgs'])
+
+            if 'ticket_keys' in request:
+                self.process.set_ticket_keys(request['ticket_keys'])
+        except Exception as excep:
+            response['error'] = str(excep)
+
+        self.sendLine(json.dumps(response))
+
+
 class HTTPSProcess(Process):
     name = 'gl-https-proxy'
     ports = []
@@ -33,21 +63,11 @@ class HTTPSProcess(Process):
 
         proxy_url = 'http://' + self.cfg['proxy_ip'] + ':' + str(self.cfg['proxy_port'])
 
-        self.http_proxy_factory = HTTPStreamFactory(proxy_url)
-
-        for site_cfg in self.cfg['site_cfgs']:
-            cv = ChainValidator()
-            ok, err = cv.validate(site_cfg, must_be_disabled=False, check_expiration=False)
-            if not ok or not err is None:
-                raise err
-
-        default_site = self.cfg['site_cfgs'].pop(0)
-        sni_dict = {'DEFAULT': make_TLSContextFactory(default_site)}
+        self.http_proxy_factory = HTTPStreamFactory(proxy_url, self.cfg.get('compression_level', 6))
 
-        for site_cfg in self.cfg['site_cfgs']:
-            sni_dict[site_cfg['hostname']] = make_TLSContextFactory(site_cfg)
+        self.ticket_keys = self.cfg['ticket_keys'].decode('hex')
 
-        self.snimap = SNIMap(sni_dict)
+        self.snimap = SNIMap(self.make_sni_dict(self.cfg['site_cfgs']))
 
         for socket_fd in self.cfg['tls_socket_fds']:
             self.log("Opening socket: %d : %s" % (socket_fd, os.fstat(socket_fd)))
@@ -60,6 +80,80 @@ class HTTPSProcess(Process):
             self.ports.append(port)
             self.log("HTTPS proxy listening on %s" % port)
 
+    def start(self):
+        self.control = HTTPSControlProtocol(self)
+
+        stdio.StandardIO(self.control,
+                         stdin=HTTPSProcProtocol.request_fd,
+                         stdout=HTTPSProcProtocol.response_fd)
+
+        self.accepted_connections = 0
+        LoopingCall(self.report_stats).start(self.cfg['stats_interval'], now=False)
+
+        Process.start(self)
+
+    def report_stats(self):
+        """
+        Report the load of the worker to the supervisor scaling the workers;
+        every new connection performs a TLS handshake.
+        """
+        accepted_connections = self.http_proxy_factory.accepted_connections
+
+        self.control.sendLine(json.dumps({
+            'stats': {
+                'active_connections': self.http_proxy_factory.active_connections,
+                'handshake_rate': float(accepted_connections - self.accepted_connections) / self.cfg['stats_interval']
+            }
+        }))
+
+        self.accepted_connections = accepted_connections
+
+    def make_sni_dict(self, site_cfgs):
+        for site_cfg in site_cfgs:
+            cv = ChainValidator()
+            ok, err = cv.validate(site_cfg, must_be_disabled=False, check_expiration=False)
+            if not ok or not err is None:
+                raise err
+
+        sni_dict = {'DEFAULT': make_TLSContextFactory(site_cfgs[0])}
+
+        for site_cfg in site_cfgs[1:]:
+            sni_dict[site_cfg['hostname']] = make_TLSContextFactory(site_cfg)
+
+        self.apply_ticket_keys(sni_dict)
+
+        return sni_dict
+
+    def load_site_cfgs(self, site_cfgs):
+        """
+        Swap the TLS configurations of the sites used by the new connections
+        while the established ones, and so the uploads and the downloads in
+        progress, continue with the previous ones
+        """
+        self.snimap.set_mapping(self.make_sni_dict(site_cfgs))
+
+        self.log("Loaded the TLS configuration of %d sites" % len(site_cfgs))
+
+    def apply_ticket_keys(self, sni_dict):
+        lifetime = self.cfg['ticket_key_lifetime']
+
+        results = [context_factory.set_ticket_keys(self.ticket_keys, lifetime) for context_factory in sni_dict.values()]
+        if not all(results):
+            self.log("Unable to share the keys of the session tickets with the other workers; session tickets disabled")
+
+    def set_ticket_keys(self, ticket_keys):
+        """
+        Replace the keys of the session tickets with the random ones pushed
+        by the supervisor to all the workers at every rotation, so that a
+        session can be resumed on any worker while the tickets issued before
+        the rotation cannot be decrypted anymore.
+        """
+        self.ticket_keys = ticket_keys.decode('hex')
+
+        self.apply_ticket_keys(self.snimap.mapping)
+
+        self.log("Rotated the keys of the session tickets")
+
     def sigusr1(self):
         def _sigusr1():
             self.shutdown()
@@ -88,6 +182,8 @@ class HTTPSProcess(Process):
 
         #self.http_proxy_factory.stopFactory()
 
+        self.http_proxy_factory.pool.closeCachedConnections()
+
         Process.shutdown(self)
 
 
@@ -0,0 +1,44 @@
+# -*- encoding: utf-8 -*-
+import json
+import os
+import sys
+
+if os.path.dirname(__file__) != '/usr/lib/python2.7/dist-packages/globaleaks/workers':
+    sys.path.insert(1, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from twisted.internet import stdio
+from twisted.protocols.basic import LineReceiver
+
+from globaleaks.security import hash_password
+from globaleaks.workers.process import Process, KDFProcProtocol
+
+
+class KDFProtocol(LineReceiver):
+    delimiter = '\n'
+
+    def lineReceived(self, line):
+        request = json.loads(line)
+
+        response = {'id': request['id']}
+
+        try:
+            response['hash'] = hash_password(request['password'], request['salt'])
+        except Exception as excep:
+            response['error'] = str(excep)
+
+        self.sendLine(json.dumps(response))
+
+
+class KDFProcess(Process):
+    name = 'gl-kdf'
+
+    def __init__(self, *args, **kwargs):
+        super(KDFProcess, self).__init__(*args, **kwargs)
+
+        stdio.StandardIO(KDFProtocol(),
+                         stdin=KDFProcProtocol.request_fd,
+                         stdout=KDFProcProtocol.response_fd)
+
+
+if __name__ == '__main__':
+    KDFProcess().start()
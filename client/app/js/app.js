@@ -456,7 +456,7 @@ var GLClient = angular.module('GLClient', [
         chunkSize: 1000 * 1024,
         forceChunkSize: true,
         testChunks: false,
-        simultaneousUploads: 1,
+        simultaneousUploads: 3,
         generateUniqueIdentifier: function () {
           return Math.random() * 1000000 + 1000000;
         },